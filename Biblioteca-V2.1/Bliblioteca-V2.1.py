@@ -4,12 +4,46 @@
 Sistema de Gestión Bibliotecaria con CRUD Completo
 Autor: Marcos Soto Z. / MCode-DevOps93
 Descripción: Sistema completo para gestionar libros, usuarios y préstamos
-con funcionalidades CRUD completas y persistencia en archivos .txt
+con funcionalidades CRUD completas y persistencia intercambiable
+(archivos .txt o un único archivo SQLite)
 """
 
 
-from datetime import datetime
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import atexit
+import bisect
+import collections
+import collections.abc
+import contextlib
+import cProfile
+import csv
+import functools
+import gzip
+import heapq
+import http.client
+import inspect
+import itertools
+import json
+import math
+import operator
 import os
+import pickle
+import random
+import re
+import shutil
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+import unicodedata
+import zlib
 
 # ==================== CONFIGURACIÓN GLOBAL ====================
 # Directorios para almacenar datos
@@ -19,18 +53,201 @@ CARPETA_PRESTAMOS = 'biblioteca/prestamos/'
 CARPETA_SAVE = 'SAVE/'
 EXTENSION = '.txt'
 
+# Distribución en fragmentos (subcarpetas) para colecciones muy grandes:
+# préstamos en prestamos/AAAA/MM/ y libros/usuarios en FRAGMENTOS_HASH
+# subcarpetas según el hash de su ID. Cada carpeta anota la suya en
+# ARCHIVO_DISTRIBUCION (sin ese archivo la carpeta es plana, como siempre)
+FRAGMENTOS_HASH = 256
+PRESTAMOS_POR_MES = 'mensual'
+ARCHIVO_DISTRIBUCION = '.distribucion'
+PREFIJO_BORRADO = '.borrando-'
+
+# Motor de almacenamiento por defecto ('texto' = un .txt por registro, 'sqlite' = un único archivo,
+# 'instantanea' = instantánea binaria + diario)
+MOTOR_ALMACENAMIENTO = 'texto'
+MOTORES = ('texto', 'sqlite', 'instantanea')
+ARCHIVO_SQLITE = 'biblioteca/biblioteca.db'
+# Motor 'instantanea': instantánea binaria versionada + diario de mutaciones
+ARCHIVO_INSTANTANEA = 'biblioteca/instantanea.bin'
+ARCHIVO_DIARIO = 'biblioteca/diario.bin'
+CABECERA_INSTANTANEA = b'BIBLIO-SNAP'
+VERSION_INSTANTANEA = 1
+
+# Si es True, al iniciar solo se cargan los préstamos activos y el historial
+# de devueltos se lee bajo demanda desde el almacenamiento
+HISTORIAL_DIFERIDO = False
+# Índice de los préstamos abiertos (un archivo por línea) dentro de la carpeta
+# de préstamos: con historial diferido el motor .txt abre solo esos archivos
+ARCHIVO_ACTIVOS = '.activos'
+
+# Si es True, los préstamos devueltos se guardan en memoria por columnas
+# (arrays de enteros) en lugar de un objeto Prestamo por registro
+HISTORIAL_COLUMNAR = False
+
+# Hilos de lectura para la carga inicial (1 = carga secuencial) y cantidad
+# de archivos que procesa cada tarea del lector paralelo
+HILOS_CARGA = 1
+TAMANO_BLOQUE_CARGA = 256
+
+# Durabilidad de las escrituras: 'completa' sincroniza con el disco (fsync)
+# cada commit; 'rapida' mantiene la atomicidad pero sin fsync (cargas masivas)
+DURABILIDAD = 'completa'
+DURABILIDADES = ('completa', 'rapida')
+SUFIJO_TEMPORAL = '.tmp'
+ARCHIVO_TRANSACCION = 'biblioteca/transaccion.pendiente'
+FIN_TRANSACCION = 'FIN'
+
+# Escritura diferida (write-behind): las mutaciones se encolan y un hilo las
+# vacía en una sola transacción al juntar MAX_PENDIENTES_ESCRITURA registros
+# o al pasar INTERVALO_VACIADO segundos desde la más antigua
+ESCRITURA_DIFERIDA = False
+MAX_PENDIENTES_ESCRITURA = 500
+INTERVALO_VACIADO = 1.0
+
+# Recarga en caliente: en el menú, antes de cada opción se revisan las
+# carpetas del motor de texto y se aplican los archivos editados por fuera
+VIGILAR_ARCHIVOS = False
+# Cada cuántos segundos se revisan también los archivos de carpetas sin
+# cambios (un archivo editado en su lugar no altera el mtime de su carpeta)
+INTERVALO_REVISION_COMPLETA = 60
+
+# Registros por página en los listados (catálogo, usuarios, historial)
+TAMANO_PAGINA = 20
+
+# Búsqueda de texto libre en el catálogo: resultados por consulta, peso de
+# cada campo en el puntaje, palabras que completa un prefijo y errores de
+# tipeo tolerados según el largo de la palabra (hasta 3 letras, de 4 a 7, 8 o más)
+RESULTADOS_BUSQUEDA = 20
+PESOS_BUSQUEDA = {'titulo': 3, 'autor': 2, 'editorial': 1}
+PALABRAS_POR_PREFIJO = 50
+ERRORES_TOLERADOS = (0, 1, 2)
+CANDIDATOS_BUSQUEDA = 1000
+
+# Reservas: archivo (JSON Lines de solo anexado, se compacta al cargar) y
+# días que un ejemplar devuelto queda apartado para el siguiente de la lista
+ARCHIVO_RESERVAS = 'biblioteca/reservas.jsonl'
+DIAS_RETENCION_RESERVA = 3
+
+# Plazos y multas: días de préstamo (el vencimiento se calcula desde la fecha
+# del préstamo con el plazo vigente), multa por día de atraso (CLP) y días de
+# anticipación con que se listan los préstamos por vencer
+DIAS_PRESTAMO = 14
+MULTA_POR_DIA = 500
+DIAS_AVISO_VENCIMIENTO = 3
+SEGUNDOS_POR_DIA = 86400
+
+# Estadísticas de circulación: puestos de los rankings y tramo (segundos) en
+# que se agrupan las fechas antes de pasarlas a hora local (15 minutos
+# respetan cualquier huso horario y cambio de horario)
+TOP_ESTADISTICAS = 10
+SEGUNDOS_POR_TRAMO = 900
+
+# Registros que se confirman juntos en cada lote de una importación masiva
+TAMANO_LOTE_IMPORTACION = 1000
+
+# Exportación: filas por escritura en bloque, tamaño del buffer de archivo
+# y formato columnar propio
+FILAS_POR_BLOQUE_EXPORTACION = 10000
+BUFFER_EXPORTACION = 1024 * 1024
+FORMATOS_EXPORTACION = ('csv', 'jsonl', 'columnar')
+FORMATOS_POR_EXTENSION = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.col': 'columnar'}
+CABECERA_COLUMNAR = b'BIBLIO-COL'
+VERSION_COLUMNAR = 1
+
+# Copias incrementales del historial: manifiesto que encadena las copias
+# (una línea JSON por copia) y extensión de cada copia comprimida
+ARCHIVO_MANIFIESTO = os.path.join(CARPETA_SAVE, 'manifiesto_historial.jsonl')
+EXTENSION_INCREMENTAL = '.jsonl.gz'
+
+# Modo servidor (varios mostradores sobre una misma biblioteca) y generador
+# de carga: dirección por defecto, clientes a probar y préstamos por cliente
+HOST_SERVIDOR = '127.0.0.1'
+PUERTO_SERVIDOR = 8765
+CLIENTES_CARGA = (1, 2, 4, 8, 16)
+OPERACIONES_POR_CLIENTE = 200
+
+# Registros sintéticos por tipo para la medición de memoria (bytes por registro)
+REGISTROS_MEMORIA = 100000
+
+# Benchmark: tamaños de los conjuntos sintéticos (libros y préstamos), proporción
+# de préstamos activos, préstamos/devoluciones medidos, repeticiones de cada
+# informe y carpeta donde se generan los conjuntos
+TAMANOS_BENCHMARK = (1000, 10000, 100000)
+PROPORCION_ACTIVOS = 0.1
+OPERACIONES_BENCHMARK = 1000
+REPETICIONES_INFORME = 3
+CARPETA_BENCHMARK = 'benchmark/'
+
+
+# ==================== EXCEPCIONES ====================
+class ErrorBiblioteca(Exception):
+    """
+    Error base de las operaciones de la biblioteca (el icono lo usa la consola)
+    """
+    icono = "❌"
+
+
+class LibroNoEncontrado(ErrorBiblioteca):
+    def __init__(self, id_libro):
+        super().__init__("Libro no encontrado.")
+        self.id_libro = id_libro
+
+
+class UsuarioNoEncontrado(ErrorBiblioteca):
+    def __init__(self, id_usuario):
+        super().__init__("Usuario no encontrado.")
+        self.id_usuario = id_usuario
+
+
+class IdDuplicado(ErrorBiblioteca):
+    pass
+
+
+class LibroPrestado(ErrorBiblioteca):
+    icono = "⚠️"
+
+
+class LibroNoPrestado(ErrorBiblioteca):
+    icono = "⚠️"
+
+
+class UsuarioConPrestamos(ErrorBiblioteca):
+    icono = "⚠️"
+
+
+class SinPrestamos(ErrorBiblioteca):
+    pass
+
+
+class ErrorAlmacenamiento(ErrorBiblioteca):
+    icono = "⚠️"
+
+
+class ReservaInvalida(ErrorBiblioteca):
+    icono = "⚠️"
+
+
+class ReservaNoEncontrada(ErrorBiblioteca):
+    def __init__(self, clave):
+        super().__init__("Reserva no encontrada.")
+        self.clave = clave
+
 
 # ==================== CLASE LIBRO ====================
 class Libro:
     """
     Clase que representa un libro de la biblioteca
     """
+    # Sin __dict__ por instancia; autor, editorial y fecha se repiten entre
+    # libros, así que se internan para compartir una sola copia de cada texto
+    __slots__ = ('id_libro', 'titulo', 'autor', 'editorial', 'fecha_publicacion', 'isbn', 'disponible')
+
     def __init__(self, id_libro, titulo, autor, editorial, fecha_publicacion, isbn):
         self.id_libro = id_libro
         self.titulo = titulo
-        self.autor = autor
-        self.editorial = editorial
-        self.fecha_publicacion = fecha_publicacion
+        self.autor = internar(autor)
+        self.editorial = internar(editorial)
+        self.fecha_publicacion = internar(fecha_publicacion)
         self.isbn = isbn
         self.disponible = True
 
@@ -39,11 +256,62 @@ class Libro:
         return f"[{self.id_libro}] {self.titulo} - {self.autor} - {self.editorial} ({self.fecha_publicacion}) [{estado}]"
 
 
+# ==================== CLASE TÍTULO ====================
+class Titulo:
+    """
+    Un título con sus ejemplares: cada Libro es un ejemplar físico y los de
+    un mismo ISBN se agrupan aquí. libres es la lista de ejemplares
+    disponibles, así que asignar o liberar uno y saber cuántos quedan es O(1)
+    """
+    __slots__ = ('isbn', 'ejemplares', 'libres')
+
+    def __init__(self, isbn):
+        self.isbn = isbn
+        self.ejemplares = set()
+        self.libres = set()
+
+    def agregar(self, libro):
+        self.ejemplares.add(libro)
+        if libro.disponible:
+            self.libres.add(libro)
+
+    def quitar(self, libro):
+        self.ejemplares.discard(libro)
+        self.libres.discard(libro)
+
+    def asignar(self):
+        """Saca de la lista de libres un ejemplar cualquiera (None si no queda ninguno)"""
+        try:
+            return self.libres.pop()
+        except KeyError:
+            return None
+
+    def liberar(self, libro):
+        """Devuelve un ejemplar a la lista de libres"""
+        if libro in self.ejemplares and libro.disponible:
+            self.libres.add(libro)
+
+    @property
+    def disponibles(self):
+        return len(self.libres)
+
+    @property
+    def total(self):
+        return len(self.ejemplares)
+
+
+def clave_titulo(libro):
+    """ISBN normalizado del título de un libro (sin ISBN, el libro es su propio título)"""
+    return normalizar_isbn(libro.isbn) or f"#{libro.id_libro}"
+
+
 # ==================== CLASE USUARIO ====================
 class Usuario:
     """
     Clase que representa un usuario de la biblioteca
     """
+    __slots__ = ('id_usuario', 'nombre', 'rut', 'correo', 'telefono', 'direccion', 'fecha_registro', 'prestamos')
+
     def __init__(self, id_usuario, nombre, rut, correo, telefono, direccion):
         self.id_usuario = id_usuario
         self.nombre = nombre
@@ -51,23 +319,96 @@ class Usuario:
         self.correo = correo
         self.telefono = telefono
         self.direccion = direccion
-        self.prestamos = []
+        self.fecha_registro = datetime.now().strftime("%d/%m/%Y %H:%M")
+        # Préstamos abiertos del usuario (conjunto: alta y baja en O(1))
+        self.prestamos = set()
 
     def __str__(self):
         return f"[{self.id_usuario}] {self.nombre} - RUT: {self.rut} - Tel: {self.telefono} - Préstamos: {len(self.prestamos)}"
 
 
 # ==================== CLASE PRESTAMO ====================
+def internar(texto):
+    """Devuelve la copia compartida de un texto repetido (None se mantiene)"""
+    return sys.intern(texto) if type(texto) is str else texto
+
+
+def fecha_a_epoca(fecha):
+    """datetime -> segundos desde la época (int); None se mantiene"""
+    return int(fecha.timestamp()) if fecha else None
+
+
+def epoca_a_fecha(segundos):
+    """Segundos desde la época -> datetime local; None se mantiene"""
+    return datetime.fromtimestamp(segundos) if segundos is not None else None
+
+
+def epoca_al_minuto(segundos):
+    """Trunca segundos desde la época al minuto (la precisión del motor .txt); None se mantiene"""
+    return segundos - segundos % 60 if segundos is not None else None
+
+
+def dias_de_atraso(vencimiento, hasta):
+    """Días de atraso (un día empezado cuenta entero) entre dos fechas en segundos desde la época"""
+    return max(0, -(-(hasta - vencimiento) // SEGUNDOS_POR_DIA))
+
+
+def fecha_de_clave(clave):
+    """Fecha en que se creó un préstamo, tomada del final de su clave (None si la clave no la trae)"""
+    try:
+        return datetime.strptime(clave.rsplit('_', 1)[-1], "%Y%m%d%H%M%S%f")
+    except ValueError:
+        return None
+
+
 class Prestamo:
     """
     Clase que representa un préstamo de libro
     """
-    def __init__(self, usuario, libro):
+    # Las fechas se guardan como enteros (segundos desde la época) y se
+    # exponen como datetime a través de propiedades
+    __slots__ = ('usuario', 'libro', '_fecha_prestamo', '_fecha_devolucion', '_estado_devolucion',
+                 '_fecha_vencimiento', 'clave')
+
+    def __init__(self, usuario, libro, fecha_prestamo=None, clave=None, dias=DIAS_PRESTAMO):
+        fecha_prestamo = fecha_prestamo or datetime.now()
         self.usuario = usuario
         self.libro = libro
-        self.fecha_prestamo = datetime.now()
-        self.fecha_devolucion = None
-        self.estado_devolucion = None
+        self.fecha_prestamo = fecha_prestamo
+        self._fecha_vencimiento = self._fecha_prestamo + dias * SEGUNDOS_POR_DIA
+        self._fecha_devolucion = None
+        self._estado_devolucion = None
+        # Identificador estable del préstamo (nombre del archivo en el motor de texto);
+        # incluye microsegundos para no repetirse si el libro se presta varias veces por segundo
+        self.clave = clave or f'{usuario.id_usuario}_{libro.id_libro}_{fecha_prestamo.strftime("%Y%m%d%H%M%S%f")}'
+
+    @property
+    def fecha_prestamo(self):
+        return epoca_a_fecha(self._fecha_prestamo)
+
+    @fecha_prestamo.setter
+    def fecha_prestamo(self, fecha):
+        self._fecha_prestamo = fecha_a_epoca(fecha)
+
+    @property
+    def fecha_devolucion(self):
+        return epoca_a_fecha(self._fecha_devolucion)
+
+    @fecha_devolucion.setter
+    def fecha_devolucion(self, fecha):
+        self._fecha_devolucion = fecha_a_epoca(fecha)
+
+    @property
+    def fecha_vencimiento(self):
+        return epoca_a_fecha(self._fecha_vencimiento)
+
+    @property
+    def estado_devolucion(self):
+        return self._estado_devolucion
+
+    @estado_devolucion.setter
+    def estado_devolucion(self, estado):
+        self._estado_devolucion = internar(estado)
 
     def __str__(self):
         fecha_p = self.fecha_prestamo.strftime("%d/%m/%Y %H:%M")
@@ -77,647 +418,4860 @@ class Prestamo:
             if self.estado_devolucion:
                 estado_texto += f" | Estado: {self.estado_devolucion}"
         else:
-            estado_texto = "📖 Activo"
+            estado_texto = f"📖 Activo | Vence: {self.fecha_vencimiento.strftime('%d/%m/%Y')}"
         return f"{self.usuario.nombre} → {self.libro.titulo} | Préstamo: {fecha_p} | {estado_texto}"
 
 
-# ==================== CLASE BIBLIOTECA ====================
-class Biblioteca:
+class HistorialColumnar:
     """
-    Clase principal que gestiona la biblioteca completa
+    Préstamos devueltos guardados por columnas en arrays de enteros en lugar
+    de un objeto Prestamo por registro. Usuarios, libros y estados se guardan
+    como códigos de una tabla de textos compartida y las claves van
+    concatenadas en un único bytearray
     """
     def __init__(self):
-        self.libros = {}
-        self.usuarios = {}
-        self.prestamos = []
-        self.cargar_datos()
+        self._claves = bytearray()
+        self._fin_claves = array('q')
+        self.usuarios = array('l')
+        self.libros = array('l')
+        self.fechas_prestamo = array('q')
+        self.fechas_devolucion = array('q')
+        self.estados = array('l')
+        self._textos = []
+        self._codigos = {}
+        # Las columnas deben crecer juntas aunque varios hilos devuelvan libros
+        self._bloqueo = threading.Lock()
 
-    # ==================== CRUD DE LIBROS ====================
+    def __len__(self):
+        return len(self._fin_claves)
 
-    def agregar_libro(self, id_libro, titulo, autor, editorial, fecha_publicacion, isbn):
+    def _codificar(self, texto):
+        codigo = self._codigos.get(texto)
+        if codigo is None:
+            codigo = self._codigos[texto] = len(self._textos)
+            self._textos.append(texto)
+        return codigo
+
+    def agregar(self, clave, id_usuario, id_libro, fecha_prestamo, fecha_devolucion, estado_devolucion):
+        """Agrega un préstamo devuelto (fechas en segundos desde la época)"""
+        with self._bloqueo:
+            self._claves += clave.encode('utf-8')
+            self._fin_claves.append(len(self._claves))
+            self.usuarios.append(self._codificar(id_usuario))
+            self.libros.append(self._codificar(id_libro))
+            self.fechas_prestamo.append(fecha_prestamo)
+            self.fechas_devolucion.append(fecha_devolucion)
+            self.estados.append(self._codificar(estado_devolucion))
+
+    def filas(self):
         """
-        Crear - Agrega un nuevo libro a la biblioteca
+        Recorre los registros como (clave, id_usuario, id_libro, fecha_prestamo,
+        fecha_devolucion, estado_devolucion) con las fechas en segundos
         """
-        if id_libro in self.libros:
-            print("❌ El ID del libro ya existe.")
-            return False
+        textos = self._textos
+        inicio = 0
+        for i in range(len(self)):
+            fin = self._fin_claves[i]
+            yield (self._claves[inicio:fin].decode('utf-8'), textos[self.usuarios[i]], textos[self.libros[i]],
+                   self.fechas_prestamo[i], self.fechas_devolucion[i], textos[self.estados[i]])
+            inicio = fin
+
+    def limpiar(self):
+        self.__init__()
+
+
+# ==================== MOTORES DE ALMACENAMIENTO ====================
+# Cada motor expone la misma interfaz:
+#   guardar_libro / eliminar_libro / guardar_usuario / eliminar_usuario
+#   guardar_prestamo / eliminar_prestamos / contar_prestamos / leer_libros
+#   leer_usuarios / leer_prestamos(solo_activos) / transaccion(durabilidad) / cerrar
+# Los métodos leer_* entregan tuplas con los campos de cada registro:
+#   libro    -> (id_libro, titulo, autor, editorial, fecha_publicacion, isbn, disponible)
+#   usuario  -> (id_usuario, nombre, rut, correo, telefono, direccion, fecha_registro)
+#   prestamo -> (clave, id_usuario, id_libro, fecha_prestamo, fecha_devolucion, estado_devolucion)
+
+def recorrer_carpeta(carpeta, relativa=''):
+    """
+    Recorre con os.scandir los .txt de una carpeta y de sus fragmentos
+    (subcarpetas) y entrega pares (ruta relativa, DirEntry). Las
+    subcarpetas ocultas (fragmentos que se están borrando) se saltan
+    """
+    subcarpetas = []
+    try:
+        with os.scandir(carpeta + relativa) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    if not entrada.name.startswith('.'):
+                        subcarpetas.append(entrada.name)
+                elif entrada.name.endswith(EXTENSION):
+                    yield relativa + entrada.name, entrada
+    except FileNotFoundError:
+        return
+    for nombre in subcarpetas:
+        yield from recorrer_carpeta(carpeta, relativa + nombre + '/')
+
+
+def fragmento_hash(identificador, fragmentos):
+    """Subcarpeta ('3f/') de un libro o usuario según el hash de su ID ('' si no hay fragmentos)"""
+    if not fragmentos:
+        return ''
+    return f"{zlib.crc32(identificador.encode('utf-8')) % fragmentos:0{len(f'{fragmentos - 1:x}')}x}/"
+
+
+def leer_distribucion(carpeta):
+    """Distribución anotada en una carpeta ('' = plana)"""
+    try:
+        with open(carpeta + ARCHIVO_DISTRIBUCION, 'r', encoding='utf-8') as archivo:
+            return archivo.read().strip()
+    except FileNotFoundError:
+        return ''
+
+
+class AlmacenamientoTexto:
+    """
+    Motor de almacenamiento original: un archivo .txt por registro.
+    Cada archivo se escribe en un temporal que luego se renombra, de modo
+    que una caída nunca deja un registro a medio escribir. Cada carpeta
+    puede ser plana o estar repartida en fragmentos (ver redistribuir)
+    """
+    # Instrumentacion activa (None = sin medición de escrituras)
+    medidor = None
+
+    def __init__(self, carpeta_libros=CARPETA_LIBROS, carpeta_usuarios=CARPETA_USUARIOS,
+                 carpeta_prestamos=CARPETA_PRESTAMOS, hilos=HILOS_CARGA, durabilidad=DURABILIDAD,
+                 ruta_transaccion=ARCHIVO_TRANSACCION):
+        self.carpeta_libros = carpeta_libros
+        self.carpeta_usuarios = carpeta_usuarios
+        self.carpeta_prestamos = carpeta_prestamos
+        # Fragmentos de libros y usuarios (0 = carpeta plana) y préstamos por mes
+        self.fragmentos_libros = int(leer_distribucion(carpeta_libros) or 0)
+        self.fragmentos_usuarios = int(leer_distribucion(carpeta_usuarios) or 0)
+        self.prestamos_por_mes = leer_distribucion(carpeta_prestamos) == PRESTAMOS_POR_MES
+        # Subcarpetas ya creadas en esta sesión
+        self._subcarpetas = set()
+        # Hilos para leer archivos (y colecciones) en paralelo al iniciar
+        self.hilos = hilos
+        # Solo crece al prestar; cada lectura completa de préstamos lo compacta
+        self.ruta_activos = carpeta_prestamos + ARCHIVO_ACTIVOS
+        # Una lectura que compacta el índice no debe perder lo que otro hilo anota
+        self._bloqueo_activos = threading.Lock()
+        self.durabilidad = durabilidad
+        self.ruta_transaccion = ruta_transaccion
+        # Operaciones de la transacción en curso (None = sin transacción)
+        self._pendientes = None
+        self._durabilidad_transaccion = durabilidad
+        self._recuperar_transaccion()
+
+    # ----- Escritura atómica y transacciones -----
+
+    @staticmethod
+    def _sincronizar_carpeta(carpeta):
+        descriptor = os.open(carpeta, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def _escribir(self, ruta, contenido):
+        """Escribe un archivo completo mediante temporal + (fsync) + rename"""
+        en_transaccion = self._pendientes is not None
+        durable = (self._durabilidad_transaccion if en_transaccion else self.durabilidad) == 'completa'
+        temporal = ruta + SUFIJO_TEMPORAL
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            archivo.write(contenido)
+            if durable:
+                archivo.flush()
+                os.fsync(archivo.fileno())
+        if self.medidor is not None:
+            self.medidor.registrar_escritura(ruta, len(contenido.encode('utf-8')))
+
+        if en_transaccion:
+            self._pendientes.append(('escribir', temporal, ruta))
         else:
-            self.libros[id_libro] = Libro(id_libro, titulo, autor, editorial, fecha_publicacion, isbn)
-            self.guardar_libro(id_libro, titulo, autor, editorial, fecha_publicacion, isbn)
-            print("✅ Libro agregado correctamente.")
-            return True
+            os.replace(temporal, ruta)
+            if durable:
+                self._sincronizar_carpeta(os.path.dirname(ruta) or '.')
 
-    def mostrar_libros(self):
+    def _eliminar(self, ruta):
         """
-        Leer - Muestra todos los libros de la biblioteca
+        Elimina un archivo (al confirmar, si hay una transacción en curso).
+        Si el archivo no existe no hay nada que borrar: la escritura diferida
+        junta un alta y su baja en un solo eliminar_* de algo nunca escrito
         """
-        print("\n" + "="*90)
-        print("📚 CATÁLOGO DE LIBROS")
-        print("="*90)
-        
-        if not self.libros:
-            print("No hay libros registrados.")
+        if not os.path.exists(ruta):
             return
-        
-        for libro in self.libros.values():
-            print(libro)
-            print(f"    ISBN: {libro.isbn}")
-        
-        print("\n" + "="*90)
-        print(f"📊 Total de libros: {len(self.libros)}")
-        print("="*90)
+        if self.medidor is not None:
+            self.medidor.registrar_escritura(ruta, 0)
+        if self._pendientes is not None:
+            self._pendientes.append(('eliminar', None, ruta))
+        else:
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
 
-    def buscar_libro(self, id_libro):
+    @contextlib.contextmanager
+    def transaccion(self, durabilidad=None):
         """
-        Leer - Busca y muestra la información de un libro específico
+        Agrupa varias escrituras en un único commit. Con durabilidad 'completa'
+        se registra un manifiesto de rehacer antes de renombrar, así que tras
+        una caída se aplican todas las operaciones o ninguna. Las transacciones
+        anidadas se unen a la exterior
         """
-        if id_libro in self.libros:
-            libro = self.libros[id_libro]
-            print("\n🔍 Libro encontrado:")
-            print("="*90)
-            print(f"ID: {libro.id_libro}")
-            print(f"Título: {libro.titulo}")
-            print(f"Autor: {libro.autor}")
-            print(f"Editorial: {libro.editorial}")
-            print(f"Fecha de Publicación: {libro.fecha_publicacion}")
-            print(f"ISBN: {libro.isbn}")
-            print(f"Estado: {'Disponible' if libro.disponible else 'Prestado'}")
-            print("="*90)
-            return libro
+        if self._pendientes is not None:
+            yield
+            return
+
+        self._pendientes = []
+        self._durabilidad_transaccion = durabilidad or self.durabilidad
+        try:
+            yield
+        except BaseException:
+            for operacion, temporal, _ in self._pendientes:
+                if operacion == 'escribir' and os.path.exists(temporal):
+                    os.remove(temporal)
+            raise
         else:
-            print("❌ Libro no encontrado.")
+            self._confirmar(self._pendientes, self._durabilidad_transaccion == 'completa')
+        finally:
+            self._pendientes = None
+            self._durabilidad_transaccion = self.durabilidad
+
+    def _confirmar(self, operaciones, durable):
+        if not operaciones:
+            return
+
+        usar_manifiesto = durable and len(operaciones) > 1
+        if usar_manifiesto:
+            manifiesto = json.dumps(operaciones) + '\n' + FIN_TRANSACCION + '\n'
+            with open(self.ruta_transaccion, 'w', encoding='utf-8') as archivo:
+                archivo.write(manifiesto)
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            if self.medidor is not None:
+                self.medidor.registrar_escritura(self.ruta_transaccion, len(manifiesto.encode('utf-8')))
+
+        self._aplicar_operaciones(operaciones)
+
+        if durable:
+            for carpeta in {os.path.dirname(ruta) or '.' for _, _, ruta in operaciones}:
+                self._sincronizar_carpeta(carpeta)
+        if usar_manifiesto:
+            os.remove(self.ruta_transaccion)
+
+    @staticmethod
+    def _aplicar_operaciones(operaciones):
+        for operacion, temporal, ruta in operaciones:
+            if operacion == 'escribir':
+                # Al rehacer tras una caída el rename puede estar ya hecho
+                if os.path.exists(temporal):
+                    os.replace(temporal, ruta)
+            elif os.path.exists(ruta):
+                os.remove(ruta)
+
+    def _recuperar_transaccion(self):
+        """Termina (o descarta) una transacción interrumpida por una caída"""
+        if not os.path.exists(self.ruta_transaccion):
+            return
+
+        with open(self.ruta_transaccion, 'r', encoding='utf-8') as archivo:
+            lineas = archivo.read().splitlines()
+        if len(lineas) >= 2 and lineas[1] == FIN_TRANSACCION:
+            self._aplicar_operaciones(json.loads(lineas[0]))
+        os.remove(self.ruta_transaccion)
+
+    # ----- Índice de préstamos abiertos -----
+
+    def _anotar_activo(self, archivo):
+        """
+        Anexa un préstamo abierto al índice. Si el índice no existe no se crea:
+        la próxima lectura lo reconstruye recorriendo la carpeta completa
+        """
+        with self._bloqueo_activos:
+            try:
+                descriptor = os.open(self.ruta_activos, os.O_WRONLY | os.O_APPEND)
+            except FileNotFoundError:
+                return
+            with open(descriptor, 'w', encoding='utf-8') as indice:
+                indice.write(archivo + '\n')
+                # Debe llegar al disco antes que el préstamo que anota
+                if (self._durabilidad_transaccion if self._pendientes is not None else self.durabilidad) == 'completa':
+                    indice.flush()
+                    os.fsync(indice.fileno())
+
+    def _leer_activos(self):
+        """Archivos anotados en el índice (None si no hay índice)"""
+        try:
+            with open(self.ruta_activos, 'r', encoding='utf-8') as indice:
+                return set(indice.read().splitlines())
+        except FileNotFoundError:
             return None
 
-    def editar_libro(self, id_libro):
+    def _compactar_activos(self, abiertos, revisados):
         """
-        Actualizar - Permite editar los datos de un libro existente
+        Reescribe el índice con los préstamos que se leyeron abiertos. De lo
+        anotado se conserva lo que la lectura no revisó (p. ej. préstamos nuevos)
         """
-        if id_libro not in self.libros:
-            print("❌ Libro no encontrado.")
-            return False
-        
-        libro = self.libros[id_libro]
-        print(f"\n📝 Editando libro: {libro.titulo}")
-        print("(Presiona Enter para mantener el valor actual)")
-        
-        nuevo_titulo = input(f"Título [{libro.titulo}]: ").strip()
-        nuevo_autor = input(f"Autor [{libro.autor}]: ").strip()
-        nuevo_editorial = input(f"Editorial [{libro.editorial}]: ").strip()
-        nueva_fecha_publicacion = input(f"Fecha de Publicación [{libro.fecha_publicacion}]: ").strip()
-        nuevo_isbn = input(f"ISBN [{libro.isbn}]: ").strip()
-        
-        if nuevo_titulo:
-            libro.titulo = nuevo_titulo
-        if nuevo_autor:
-            libro.autor = nuevo_autor
-        if nuevo_editorial:
-            libro.editorial = nuevo_editorial
-        if nueva_fecha_publicacion:
-            libro.fecha_publicacion = nueva_fecha_publicacion
-        if nuevo_isbn:
-            libro.isbn = nuevo_isbn
-        
-        self.actualizar_libro(libro)
-        print("✅ Libro actualizado correctamente.")
-        return True
+        # La lectura termina fuera del candado del servidor, quizá en medio de la
+        # transacción de otro hilo: se escribe directo y no con _escribir
+        with self._bloqueo_activos:
+            anotados = self._leer_activos() or set()
+            temporal = self.ruta_activos + SUFIJO_TEMPORAL
+            with open(temporal, 'w', encoding='utf-8') as indice:
+                indice.writelines(archivo + '\n' for archivo in sorted(abiertos | (anotados - revisados)))
+                if self.durabilidad == 'completa':
+                    indice.flush()
+                    os.fsync(indice.fileno())
+            os.replace(temporal, self.ruta_activos)
 
-    def eliminar_libro(self, id_libro):
+    # ----- Rutas y fragmentos -----
+
+    def _ruta(self, carpeta, subcarpeta, nombre):
+        """Ruta del archivo de un registro, creando su fragmento la primera vez"""
+        if subcarpeta and carpeta + subcarpeta not in self._subcarpetas:
+            os.makedirs(carpeta + subcarpeta, exist_ok=True)
+            if self.durabilidad == 'completa':
+                # La entrada de cada subcarpeta nueva también debe llegar al disco
+                niveles = subcarpeta.rstrip('/').split('/')
+                for i in range(len(niveles)):
+                    self._sincronizar_carpeta(carpeta + ''.join(nivel + '/' for nivel in niveles[:i]))
+            self._subcarpetas.add(carpeta + subcarpeta)
+        return carpeta + subcarpeta + nombre + EXTENSION
+
+    def _ruta_libro(self, id_libro):
+        return self._ruta(self.carpeta_libros, fragmento_hash(id_libro, self.fragmentos_libros), id_libro)
+
+    def _ruta_usuario(self, id_usuario):
+        return self._ruta(self.carpeta_usuarios, fragmento_hash(id_usuario, self.fragmentos_usuarios), id_usuario)
+
+    def _ruta_prestamo(self, clave, fecha_prestamo=None):
+        """El mes sale de la clave (no cambia aunque se edite el archivo) o, si no la trae, de la fecha"""
+        subcarpeta = ''
+        if self.prestamos_por_mes:
+            fecha = fecha_de_clave(clave) or fecha_prestamo
+            subcarpeta = fecha.strftime('%Y/%m/') if fecha else ''
+        return self._ruta(self.carpeta_prestamos, subcarpeta, clave)
+
+    def redistribuir(self, fragmentos=FRAGMENTOS_HASH, prestamos_por_mes=True):
         """
-        Eliminar - Elimina un libro de la biblioteca
+        Migra las carpetas a otra distribución moviendo cada archivo (rename)
+        a su fragmento: préstamos por mes y libros/usuarios en 'fragmentos'
+        subcarpetas por hash (0 y False vuelven a las carpetas planas). La
+        distribución se anota antes de mover, así que las escrituras nuevas
+        ya van a su lugar; si se interrumpe basta con volver a ejecutarla.
+        El índice de préstamos abiertos anota rutas, así que se descarta y la
+        próxima lectura completa lo reconstruye.
+        Devuelve cuántos archivos se movieron por colección
         """
-        if id_libro not in self.libros:
-            print("❌ Libro no encontrado.")
-            return False
-        
-        libro = self.libros[id_libro]
-        
-        if not libro.disponible:
-            print("⚠️ No se puede eliminar un libro que está prestado.")
-            print("   Por favor, espere a que sea devuelto.")
-            return False
-        
-        confirmacion = input(f"¿Está seguro de eliminar '{libro.titulo}'? (s/n): ").strip().lower()
-        
-        if confirmacion == 's':
-            del self.libros[id_libro]
-            try:
-                os.remove(CARPETA_LIBROS + id_libro + EXTENSION)
-                print("✅ Libro eliminado correctamente.")
-                return True
-            except OSError as e:
-                print(f"⚠️ Error al eliminar el archivo: {e}")
-                return False
-        else:
-            print("❌ Eliminación cancelada.")
-            return False
+        self.fragmentos_libros = self.fragmentos_usuarios = fragmentos
+        self.prestamos_por_mes = prestamos_por_mes
+        movidos = {}
+        for coleccion, carpeta, distribucion, destino in (
+                ('libros', self.carpeta_libros, fragmentos, self._ruta_libro),
+                ('usuarios', self.carpeta_usuarios, fragmentos, self._ruta_usuario),
+                ('prestamos', self.carpeta_prestamos, PRESTAMOS_POR_MES if prestamos_por_mes else '',
+                 self._ruta_prestamo)):
+            os.makedirs(carpeta, exist_ok=True)
+            if distribucion:
+                self._escribir(carpeta + ARCHIVO_DISTRIBUCION, f"{distribucion}\n")
+            elif os.path.exists(carpeta + ARCHIVO_DISTRIBUCION):
+                os.remove(carpeta + ARCHIVO_DISTRIBUCION)
+            if coleccion == 'prestamos':
+                with self._bloqueo_activos:
+                    if os.path.exists(self.ruta_activos):
+                        os.remove(self.ruta_activos)
 
-    # ==================== CRUD DE USUARIOS ====================
+            movidos[coleccion] = 0
+            for relativa, _ in list(recorrer_carpeta(carpeta)):
+                nombre = os.path.basename(relativa)[:-len(EXTENSION)]
+                if coleccion == 'prestamos' and prestamos_por_mes and fecha_de_clave(nombre) is None:
+                    fila = self._interpretar_prestamo(relativa)
+                    ruta = destino(nombre, fila[3] if fila else None)
+                else:
+                    ruta = destino(nombre)
+                if carpeta + relativa == ruta:
+                    continue
+                if os.path.exists(ruta):
+                    # Ya se escribió en su nuevo lugar tras una migración interrumpida
+                    os.remove(carpeta + relativa)
+                else:
+                    os.replace(carpeta + relativa, ruta)
+                movidos[coleccion] += 1
 
-    def registrar_usuario(self, id_usuario, nombre, rut, correo, telefono, direccion):
+            # Los fragmentos que quedaron vacíos se quitan
+            for raiz, _, _ in os.walk(carpeta, topdown=False):
+                if os.path.normpath(raiz) != os.path.normpath(carpeta) and not os.listdir(raiz):
+                    os.rmdir(raiz)
+                    self._subcarpetas.discard(raiz + '/')
+        return movidos
+
+    # ----- Registros -----
+
+    def guardar_libro(self, libro):
+        """Guarda (o sobrescribe) un libro en archivo .txt"""
+        self._escribir(self._ruta_libro(libro.id_libro), (
+            f'ID: {libro.id_libro}\n'
+            f'Título: {libro.titulo}\n'
+            f'Autor: {libro.autor}\n'
+            f'Editorial: {libro.editorial}\n'
+            f'Fecha Publicación: {libro.fecha_publicacion}\n'
+            f'ISBN: {libro.isbn}\n'
+            f'Disponible: {libro.disponible}\n'
+        ))
+
+    def eliminar_libro(self, id_libro):
+        """Elimina el archivo .txt de un libro"""
+        self._eliminar(self._ruta_libro(id_libro))
+
+    def guardar_usuario(self, usuario):
+        """Guarda (o sobrescribe) un usuario en archivo .txt"""
+        self._escribir(self._ruta_usuario(usuario.id_usuario), (
+            f'ID: {usuario.id_usuario}\n'
+            f'Nombre: {usuario.nombre}\n'
+            f'RUT: {usuario.rut}\n'
+            f'Correo: {usuario.correo}\n'
+            f'Teléfono: {usuario.telefono}\n'
+            f'Dirección: {usuario.direccion}\n'
+            f'Fecha Registro: {usuario.fecha_registro}\n'
+        ))
+
+    def eliminar_usuario(self, id_usuario):
+        """Elimina el archivo .txt de un usuario"""
+        self._eliminar(self._ruta_usuario(id_usuario))
+
+    def guardar_prestamo(self, prestamo):
+        """Guarda (o sobrescribe) un préstamo en archivo .txt"""
+        ruta = self._ruta_prestamo(prestamo.clave, prestamo.fecha_prestamo)
+        if not prestamo.fecha_devolucion:
+            # Se anota (con su fragmento) antes de escribir: el índice nunca omite un préstamo abierto
+            self._anotar_activo(ruta[len(self.carpeta_prestamos):])
+        contenido = (
+            f'Usuario ID: {prestamo.usuario.id_usuario}\n'
+            f'Usuario Nombre: {prestamo.usuario.nombre}\n'
+            f'Libro ID: {prestamo.libro.id_libro}\n'
+            f'Libro Título: {prestamo.libro.titulo}\n'
+            f'Fecha Préstamo: {prestamo.fecha_prestamo.strftime("%d/%m/%Y %H:%M")}\n'
+        )
+        if prestamo.fecha_devolucion:
+            contenido += f'Fecha Devolución: {prestamo.fecha_devolucion.strftime("%d/%m/%Y %H:%M")}\n'
+        if prestamo.estado_devolucion:
+            contenido += f'Estado Devolución: {prestamo.estado_devolucion}\n'
+        self._escribir(ruta, contenido)
+
+    def eliminar_prestamos(self):
         """
-        Crear - Registra un nuevo usuario en la biblioteca
+        Elimina todos los archivos de préstamos y devuelve cuántos se borraron.
+        Los fragmentos (un año por subcarpeta) se descartan enteros: primero
+        se renombran a una carpeta oculta, que deja de leerse al instante,
+        y luego se borra el árbol completo
         """
-        if id_usuario in self.usuarios:
-            print("❌ El ID del usuario ya existe.")
-            return False
-        else:
-            self.usuarios[id_usuario] = Usuario(id_usuario, nombre, rut, correo, telefono, direccion)
-            self.guardar_usuario(id_usuario, nombre, rut, correo, telefono, direccion)
-            print("✅ Usuario registrado correctamente.")
-            return True
+        eliminados = 0
+        if not os.path.exists(self.carpeta_prestamos):
+            return eliminados
+        with os.scandir(self.carpeta_prestamos) as entradas:
+            entradas = list(entradas)
+        for entrada in entradas:
+            if entrada.is_dir(follow_symlinks=False):
+                if entrada.name.startswith(PREFIJO_BORRADO):
+                    # Restos de un borrado interrumpido
+                    shutil.rmtree(entrada.path)
+                elif not entrada.name.startswith('.'):
+                    eliminados += sum(1 for _ in recorrer_carpeta(entrada.path + '/'))
+                    oculta = self.carpeta_prestamos + PREFIJO_BORRADO + entrada.name
+                    os.replace(entrada.path, oculta)
+                    shutil.rmtree(oculta)
+            elif entrada.name.endswith(EXTENSION):
+                os.remove(entrada.path)
+                eliminados += 1
+        self._subcarpetas = {ruta for ruta in self._subcarpetas if not ruta.startswith(self.carpeta_prestamos)}
+        # Sin préstamos, el índice vacío queda completo
+        self._escribir(self.ruta_activos, '')
+        return eliminados
 
-    def mostrar_usuarios(self):
+    def contar_prestamos(self):
+        """Cuenta los préstamos guardados sin abrir sus archivos"""
+        return sum(1 for _ in recorrer_carpeta(self.carpeta_prestamos))
+
+    def _leer_carpeta(self, carpeta, interpretar, archivos=None):
         """
-        Leer - Muestra todos los usuarios registrados
+        Lee e interpreta los .txt de una carpeta (todos o solo los indicados).
+        Con hilos > 1 los archivos se reparten en bloques que se procesan en paralelo
         """
-        print("\n" + "="*90)
-        print("👥 LISTA DE USUARIOS")
-        print("="*90)
-        
-        if not self.usuarios:
-            print("No hay usuarios registrados.")
+        if archivos is None:
+            archivos = [ruta for ruta, _ in recorrer_carpeta(carpeta)]
+
+        def procesar(bloque):
+            return [fila for fila in map(interpretar, bloque) if fila is not None]
+
+        if self.hilos <= 1:
+            yield from procesar(archivos)
             return
-        
-        for usuario in self.usuarios.values():
-            print(usuario)
-            print(f"    Correo: {usuario.correo} | Dirección: {usuario.direccion}")
-        
-        print("\n" + "="*90)
-        print(f"📊 Total de usuarios: {len(self.usuarios)}")
-        print("="*90)
 
-    def buscar_usuario(self, id_usuario):
+        bloques = [archivos[i:i + TAMANO_BLOQUE_CARGA] for i in range(0, len(archivos), TAMANO_BLOQUE_CARGA)]
+        with ThreadPoolExecutor(max_workers=self.hilos) as ejecutor:
+            for filas in ejecutor.map(procesar, bloques):
+                yield from filas
+
+    def _interpretar_libro(self, archivo):
+        try:
+            with open(self.carpeta_libros + archivo, 'r', encoding='utf-8') as f:
+                lineas = f.readlines()
+            return (
+                lineas[0].split(': ')[1].strip(),
+                lineas[1].split(': ')[1].strip(),
+                lineas[2].split(': ')[1].strip(),
+                lineas[3].split(': ')[1].strip(),
+                lineas[4].split(': ')[1].strip(),
+                lineas[5].split(': ')[1].strip(),
+                lineas[6].split(': ')[1].strip() == 'True',
+            )
+        except Exception as e:
+            print(f"Error cargando libro {archivo}: {e}")
+
+    def _interpretar_usuario(self, archivo):
+        try:
+            with open(self.carpeta_usuarios + archivo, 'r', encoding='utf-8') as f:
+                lineas = f.readlines()
+            fecha_registro = lineas[6].split(': ')[1].strip() if len(lineas) > 6 else ''
+            return (
+                lineas[0].split(': ')[1].strip(),
+                lineas[1].split(': ')[1].strip(),
+                lineas[2].split(': ')[1].strip(),
+                lineas[3].split(': ')[1].strip(),
+                lineas[4].split(': ')[1].strip(),
+                lineas[5].split(': ')[1].strip(),
+                fecha_registro,
+            )
+        except Exception as e:
+            print(f"Error cargando usuario {archivo}: {e}")
+
+    def _interpretar_prestamo(self, archivo, solo_activos=False):
+        try:
+            with open(self.carpeta_prestamos + archivo, 'r', encoding='utf-8') as f:
+                lineas = f.readlines()
+            if solo_activos and len(lineas) > 5 and lineas[5].startswith('Fecha Devolución:'):
+                return None
+            id_usuario = lineas[0].split(': ')[1].strip()
+            id_libro = lineas[2].split(': ')[1].strip()
+            fecha_prestamo = datetime.strptime(lineas[4].split(': ')[1].strip(), "%d/%m/%Y %H:%M")
+            fecha_devolucion = None
+            estado_devolucion = None
+
+            if len(lineas) > 5:
+                if lineas[5].startswith('Fecha Devolución:'):
+                    fecha_devolucion = datetime.strptime(lineas[5].split(': ')[1].strip(), "%d/%m/%Y %H:%M")
+
+            if len(lineas) > 6:
+                if lineas[6].startswith('Estado Devolución:'):
+                    estado_devolucion = lineas[6].split(': ')[1].strip()
+
+            clave = os.path.basename(archivo)[:-len(EXTENSION)]
+            return (clave, id_usuario, id_libro, fecha_prestamo, fecha_devolucion, estado_devolucion)
+        except FileNotFoundError:
+            # Anotado en el índice pero nunca escrito (o ya borrado)
+            return None
+        except Exception as e:
+            print(f"Error cargando préstamo {archivo}: {e}")
+
+    def leer_libros(self):
+        """Lee los libros desde sus archivos"""
+        return self._leer_carpeta(self.carpeta_libros, self._interpretar_libro)
+
+    def carpetas(self):
+        """Carpeta de cada colección (para vigilar cambios externos)"""
+        return {'libros': self.carpeta_libros, 'usuarios': self.carpeta_usuarios,
+                'prestamos': self.carpeta_prestamos}
+
+    def leer_registros(self, coleccion, archivos):
         """
-        Leer - Busca y muestra la información de un usuario específico
+        Interpreta solo los archivos indicados de una colección. Devuelve
+        pares (archivo, fila); la fila es None si el archivo no se pudo leer
         """
-        if id_usuario in self.usuarios:
-            usuario = self.usuarios[id_usuario]
-            print("\n🔍 Usuario encontrado:")
-            print("="*90)
-            print(f"ID: {usuario.id_usuario}")
-            print(f"Nombre: {usuario.nombre}")
-            print(f"RUT: {usuario.rut}")
-            print(f"Correo: {usuario.correo}")
-            print(f"Teléfono: {usuario.telefono}")
-            print(f"Dirección: {usuario.direccion}")
-            print(f"Préstamos activos: {len(usuario.prestamos)}")
-            
-            if usuario.prestamos:
-                print("\nLibros prestados:")
-                for prestamo in usuario.prestamos:
-                    print(f"  - {prestamo.libro.titulo}")
-            
-            print("="*90)
-            return usuario
-        else:
-            print("❌ Usuario no encontrado.")
-            return None
+        interpretar = {'libros': self._interpretar_libro, 'usuarios': self._interpretar_usuario,
+                       'prestamos': self._interpretar_prestamo}[coleccion]
+        return [(archivo, interpretar(archivo)) for archivo in archivos]
 
-    def editar_usuario(self, id_usuario):
+    def leer_usuarios(self):
+        """Lee los usuarios desde sus archivos"""
+        return self._leer_carpeta(self.carpeta_usuarios, self._interpretar_usuario)
+
+    def leer_prestamos(self, solo_activos=False):
         """
-        Actualizar - Permite editar los datos de un usuario existente
+        Lee los préstamos desde sus archivos. Con solo_activos=True se abren
+        solo los archivos del índice de préstamos abiertos (sin índice se
+        recorre la carpeta y los devueltos se descartan antes de interpretar
+        sus fechas). Una lectura que llega al final deja el índice compactado
         """
-        if id_usuario not in self.usuarios:
-            print("❌ Usuario no encontrado.")
-            return False
-        
-        usuario = self.usuarios[id_usuario]
-        print(f"\n📝 Editando usuario: {usuario.nombre}")
-        print("(Presiona Enter para mantener el valor actual)")
-        
-        nuevo_nombre = input(f"Nombre [{usuario.nombre}]: ").strip()
-        nuevo_rut = input(f"RUT [{usuario.rut}]: ").strip()
-        nuevo_correo = input(f"Correo [{usuario.correo}]: ").strip()
-        nuevo_telefono = input(f"Teléfono [{usuario.telefono}]: ").strip()
-        nueva_direccion = input(f"Dirección [{usuario.direccion}]: ").strip()
-        
-        if nuevo_nombre:
-            usuario.nombre = nuevo_nombre
-        if nuevo_rut:
-            usuario.rut = nuevo_rut
-        if nuevo_correo:
-            usuario.correo = nuevo_correo
-        if nuevo_telefono:
-            usuario.telefono = nuevo_telefono
-        if nueva_direccion:
-            usuario.direccion = nueva_direccion
-        
-        self.guardar_usuario(id_usuario, usuario.nombre, usuario.rut, usuario.correo, usuario.telefono, usuario.direccion)
-        print("✅ Usuario actualizado correctamente.")
-        return True
+        if not os.path.exists(self.carpeta_prestamos):
+            return
 
-    def eliminar_usuario(self, id_usuario):
+        anotados = self._leer_activos()
+        archivos = sorted(anotados) if solo_activos and anotados is not None else None
+        abiertos = set()
+        revisados = set()
+
+        def interpretar(archivo):
+            if anotados is not None and archivo in anotados:
+                revisados.add(archivo)
+            fila = self._interpretar_prestamo(archivo, solo_activos)
+            if fila is not None and fila[4] is None:
+                abiertos.add(archivo)
+            return fila
+
+        yield from self._leer_carpeta(self.carpeta_prestamos, interpretar, archivos)
+        self._compactar_activos(abiertos, revisados)
+
+    def cerrar(self):
+        """El motor de texto no mantiene recursos abiertos"""
+        pass
+
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS libros (
+    id_libro TEXT PRIMARY KEY,
+    titulo TEXT, autor TEXT, editorial TEXT, fecha_publicacion TEXT, isbn TEXT,
+    disponible INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usuarios (
+    id_usuario TEXT PRIMARY KEY,
+    nombre TEXT, rut TEXT, correo TEXT, telefono TEXT, direccion TEXT, fecha_registro TEXT
+);
+CREATE TABLE IF NOT EXISTS prestamos (
+    clave TEXT PRIMARY KEY,
+    id_usuario TEXT, nombre_usuario TEXT, id_libro TEXT, titulo_libro TEXT,
+    fecha_prestamo TEXT, fecha_devolucion TEXT, estado_devolucion TEXT
+);
+"""
+
+
+class AlmacenamientoSQLite:
+    """
+    Motor de almacenamiento en un único archivo SQLite: un solo descriptor
+    abierto para toda la sesión en lugar de un archivo por registro
+    """
+    # Nivel de sincronización de SQLite para cada durabilidad
+    SINCRONIZACION = {'completa': 'FULL', 'rapida': 'OFF'}
+    medidor = None
+
+    def __init__(self, ruta=ARCHIVO_SQLITE, durabilidad=DURABILIDAD):
+        self.ruta = ruta
+        # La conexión no se comparte entre hilos: la carga es secuencial
+        self.hilos = 1
+        self.durabilidad = durabilidad
+        self._en_transaccion = False
+        # En modo servidor los hilos la usan de a uno (AlmacenamientoSincronizado)
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.execute('PRAGMA journal_mode=WAL')
+        self.conexion.execute(f'PRAGMA synchronous={self.SINCRONIZACION[durabilidad]}')
+        self.conexion.executescript(ESQUEMA_SQLITE)
+
+    def _ejecutar(self, consulta, parametros=()):
+        """Ejecuta una sentencia y la confirma si no hay una transacción en curso"""
+        if self.medidor is not None:
+            # Aproximación: tamaño de los valores enviados a la base
+            self.medidor.registrar_escritura(
+                self.ruta, sum(len(str(valor)) for valor in parametros if valor is not None))
+        cursor = self.conexion.execute(consulta, parametros)
+        if not self._en_transaccion:
+            self.conexion.commit()
+        return cursor
+
+    @contextlib.contextmanager
+    def transaccion(self, durabilidad=None):
         """
-        Eliminar - Elimina un usuario de la biblioteca
+        Agrupa varias escrituras en un único COMMIT (las anidadas se unen a la exterior)
         """
-        if id_usuario not in self.usuarios:
-            print("❌ Usuario no encontrado.")
-            return False
-        
-        usuario = self.usuarios[id_usuario]
-        
-        if len(usuario.prestamos) > 0:
-            print("⚠️ No se puede eliminar un usuario con préstamos activos.")
-            print(f"   El usuario tiene {len(usuario.prestamos)} libro(s) prestado(s).")
-            return False
-        
-        confirmacion = input(f"¿Está seguro de eliminar a '{usuario.nombre}'? (s/n): ").strip().lower()
-        
-        if confirmacion == 's':
-            del self.usuarios[id_usuario]
-            try:
-                os.remove(CARPETA_USUARIOS + id_usuario + EXTENSION)
-                print("✅ Usuario eliminado correctamente.")
-                return True
-            except OSError as e:
-                print(f"⚠️ Error al eliminar el archivo: {e}")
-                return False
+        if self._en_transaccion:
+            yield
+            return
+
+        nivel = durabilidad or self.durabilidad
+        if nivel != self.durabilidad:
+            self.conexion.execute(f'PRAGMA synchronous={self.SINCRONIZACION[nivel]}')
+        self._en_transaccion = True
+        try:
+            yield
+        except BaseException:
+            self.conexion.rollback()
+            raise
         else:
-            print("❌ Eliminación cancelada.")
-            return False
+            self.conexion.commit()
+        finally:
+            self._en_transaccion = False
+            if nivel != self.durabilidad:
+                self.conexion.execute(f'PRAGMA synchronous={self.SINCRONIZACION[self.durabilidad]}')
+
+    @staticmethod
+    def _fecha_a_texto(fecha):
+        return fecha.isoformat(sep=' ', timespec='seconds') if fecha else None
+
+    @staticmethod
+    def _texto_a_fecha(texto):
+        return datetime.fromisoformat(texto) if texto else None
+
+    def guardar_libro(self, libro):
+        """Guarda (o sobrescribe) un libro"""
+        self._ejecutar(
+            'INSERT OR REPLACE INTO libros VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (libro.id_libro, libro.titulo, libro.autor, libro.editorial,
+             libro.fecha_publicacion, libro.isbn, int(libro.disponible)))
+
+    def eliminar_libro(self, id_libro):
+        """Elimina un libro"""
+        self._ejecutar('DELETE FROM libros WHERE id_libro = ?', (id_libro,))
+
+    def guardar_usuario(self, usuario):
+        """Guarda (o sobrescribe) un usuario"""
+        self._ejecutar(
+            'INSERT OR REPLACE INTO usuarios VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (usuario.id_usuario, usuario.nombre, usuario.rut, usuario.correo,
+             usuario.telefono, usuario.direccion, usuario.fecha_registro))
+
+    def eliminar_usuario(self, id_usuario):
+        """Elimina un usuario"""
+        self._ejecutar('DELETE FROM usuarios WHERE id_usuario = ?', (id_usuario,))
+
+    def guardar_prestamo(self, prestamo):
+        """Guarda (o sobrescribe) un préstamo"""
+        self._ejecutar(
+            'INSERT OR REPLACE INTO prestamos VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (prestamo.clave, prestamo.usuario.id_usuario, prestamo.usuario.nombre,
+             prestamo.libro.id_libro, prestamo.libro.titulo,
+             self._fecha_a_texto(prestamo.fecha_prestamo),
+             self._fecha_a_texto(prestamo.fecha_devolucion),
+             prestamo.estado_devolucion))
+
+    def eliminar_prestamos(self):
+        """Elimina todos los préstamos y devuelve cuántos se borraron"""
+        return self._ejecutar('DELETE FROM prestamos').rowcount
+
+    def contar_prestamos(self):
+        """Cuenta los préstamos guardados"""
+        return self.conexion.execute('SELECT COUNT(*) FROM prestamos').fetchone()[0]
+
+    def leer_libros(self):
+        """Lee todos los libros"""
+        for fila in self.conexion.execute('SELECT * FROM libros'):
+            yield fila[:6] + (bool(fila[6]),)
+
+    def leer_usuarios(self):
+        """Lee todos los usuarios"""
+        yield from self.conexion.execute('SELECT * FROM usuarios')
+
+    def leer_prestamos(self, solo_activos=False):
+        """Lee todos los préstamos (o solo los que siguen abiertos)"""
+        consulta = ('SELECT clave, id_usuario, id_libro, fecha_prestamo, fecha_devolucion, '
+                    'estado_devolucion FROM prestamos')
+        if solo_activos:
+            consulta += ' WHERE fecha_devolucion IS NULL'
+        for clave, id_usuario, id_libro, fecha_p, fecha_d, estado in self.conexion.execute(consulta):
+            yield (clave, id_usuario, id_libro, self._texto_a_fecha(fecha_p),
+                   self._texto_a_fecha(fecha_d), estado)
+
+    def importar(self, libros, usuarios, prestamos):
+        """
+        Inserta en bloque filas con el formato de leer_* (usado por la migración)
+        Los préstamos se reciben como (clave, id_usuario, nombre_usuario, id_libro,
+        titulo_libro, fecha_prestamo, fecha_devolucion, estado_devolucion)
+        """
+        with self.conexion:
+            self.conexion.executemany(
+                'INSERT OR REPLACE INTO libros VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (fila[:6] + (int(fila[6]),) for fila in libros))
+            self.conexion.executemany(
+                'INSERT OR REPLACE INTO usuarios VALUES (?, ?, ?, ?, ?, ?, ?)', usuarios)
+            self.conexion.executemany(
+                'INSERT OR REPLACE INTO prestamos VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (fila[:5] + (self._fecha_a_texto(fila[5]), self._fecha_a_texto(fila[6]), fila[7])
+                 for fila in prestamos))
+
+    def cerrar(self):
+        """Cierra la conexión con la base de datos"""
+        self.conexion.close()
+
+
+class AlmacenamientoInstantanea:
+    """
+    Motor de almacenamiento con instantánea binaria + diario de mutaciones.
+    Al iniciar se lee la instantánea y se reaplica el diario (dos lecturas
+    secuenciales); compactar() vuelca el estado a una instantánea nueva y
+    vacía el diario
+    """
+    # Operaciones del diario: L/U/P guardan un libro, usuario o préstamo;
+    # l/u eliminan un libro o usuario; p elimina todos los préstamos;
+    # T agrupa las operaciones de una transacción en un solo registro
+    medidor = None
+
+    def __init__(self, ruta_instantanea=ARCHIVO_INSTANTANEA, ruta_diario=ARCHIVO_DIARIO,
+                 durabilidad=DURABILIDAD):
+        self.ruta_instantanea = ruta_instantanea
+        self.ruta_diario = ruta_diario
+        self.hilos = 1
+        self.durabilidad = durabilidad
+        self._pendientes = None
+        self.libros = {}
+        self.usuarios = {}
+        self.prestamos = {}
+        self._leer_instantanea()
+        self._reaplicar_diario()
+        self.diario = open(self.ruta_diario, 'ab')
+
+    def _leer_instantanea(self):
+        if not os.path.exists(self.ruta_instantanea):
+            return
+        with open(self.ruta_instantanea, 'rb') as archivo:
+            cabecera = archivo.read(len(CABECERA_INSTANTANEA) + 1)
+            if cabecera[:-1] != CABECERA_INSTANTANEA:
+                raise ValueError(f"{self.ruta_instantanea} no es una instantánea de la biblioteca")
+            if cabecera[-1] != VERSION_INSTANTANEA:
+                raise ValueError(f"Versión de instantánea no soportada: {cabecera[-1]}")
+            self.libros, self.usuarios, self.prestamos = pickle.load(archivo)
+
+    def _reaplicar_diario(self):
+        if not os.path.exists(self.ruta_diario):
+            return
+        valido = 0
+        with open(self.ruta_diario, 'rb') as archivo:
+            while True:
+                encabezado = archivo.read(4)
+                if len(encabezado) < 4:
+                    break
+                (largo,) = struct.unpack('<I', encabezado)
+                datos = archivo.read(largo)
+                if len(datos) < largo:
+                    break
+                self._aplicar(*pickle.loads(datos))
+                valido = archivo.tell()
+        # Un registro cortado (caída a mitad de escritura) se descarta
+        if valido < os.path.getsize(self.ruta_diario):
+            with open(self.ruta_diario, 'r+b') as archivo:
+                archivo.truncate(valido)
+
+    def _aplicar(self, operacion, dato):
+        if operacion == 'L':
+            self.libros[dato[0]] = dato
+        elif operacion == 'l':
+            self.libros.pop(dato, None)
+        elif operacion == 'U':
+            self.usuarios[dato[0]] = dato
+        elif operacion == 'u':
+            self.usuarios.pop(dato, None)
+        elif operacion == 'P':
+            self.prestamos[dato[0]] = dato
+        elif operacion == 'p':
+            self.prestamos.clear()
+        elif operacion == 'T':
+            for operacion_interna, dato_interno in dato:
+                self._aplicar(operacion_interna, dato_interno)
+
+    def _registrar(self, operacion, dato):
+        """Aplica una mutación en memoria y la agrega al diario"""
+        if self._pendientes is not None:
+            self._pendientes.append((operacion, dato))
+            return
+        self._escribir_diario(operacion, dato, self.durabilidad)
+
+    def _escribir_diario(self, operacion, dato, durabilidad):
+        self._aplicar(operacion, dato)
+        datos = pickle.dumps((operacion, dato), pickle.HIGHEST_PROTOCOL)
+        self.diario.write(struct.pack('<I', len(datos)) + datos)
+        if self.medidor is not None:
+            self.medidor.registrar_escritura(self.ruta_diario, 4 + len(datos))
+        self.diario.flush()
+        if durabilidad == 'completa':
+            os.fsync(self.diario.fileno())
+
+    @contextlib.contextmanager
+    def transaccion(self, durabilidad=None):
+        """
+        Agrupa varias mutaciones en un único registro del diario (todo o nada)
+        """
+        if self._pendientes is not None:
+            yield
+            return
+
+        self._pendientes = []
+        try:
+            yield
+            pendientes = self._pendientes
+        finally:
+            self._pendientes = None
+        if pendientes:
+            self._escribir_diario('T', pendientes, durabilidad or self.durabilidad)
+
+    def guardar_libro(self, libro):
+        """Registra un libro nuevo o modificado"""
+        self._registrar('L', (libro.id_libro, libro.titulo, libro.autor, libro.editorial,
+                              libro.fecha_publicacion, libro.isbn, libro.disponible))
+
+    def eliminar_libro(self, id_libro):
+        """Registra la eliminación de un libro"""
+        self._registrar('l', id_libro)
+
+    def guardar_usuario(self, usuario):
+        """Registra un usuario nuevo o modificado"""
+        self._registrar('U', (usuario.id_usuario, usuario.nombre, usuario.rut, usuario.correo,
+                              usuario.telefono, usuario.direccion, usuario.fecha_registro))
+
+    def eliminar_usuario(self, id_usuario):
+        """Registra la eliminación de un usuario"""
+        self._registrar('u', id_usuario)
+
+    def guardar_prestamo(self, prestamo):
+        """Registra un préstamo nuevo o modificado"""
+        self._registrar('P', (prestamo.clave, prestamo.usuario.id_usuario, prestamo.libro.id_libro,
+                              prestamo.fecha_prestamo, prestamo.fecha_devolucion, prestamo.estado_devolucion))
+
+    def eliminar_prestamos(self):
+        """Registra la eliminación de todos los préstamos y devuelve cuántos había"""
+        eliminados = len(self.prestamos)
+        self._registrar('p', None)
+        return eliminados
+
+    def contar_prestamos(self):
+        """Cuenta los préstamos guardados"""
+        return len(self.prestamos)
+
+    def leer_libros(self):
+        """Lee todos los libros"""
+        return iter(list(self.libros.values()))
+
+    def leer_usuarios(self):
+        """Lee todos los usuarios"""
+        return iter(list(self.usuarios.values()))
+
+    def leer_prestamos(self, solo_activos=False):
+        """Lee todos los préstamos (o solo los que siguen abiertos)"""
+        if solo_activos:
+            return iter([fila for fila in self.prestamos.values() if fila[4] is None])
+        return iter(list(self.prestamos.values()))
+
+    def importar(self, libros, usuarios, prestamos):
+        """
+        Carga en bloque filas con el formato de la migración y escribe una instantánea
+        """
+        for fila in libros:
+            self.libros[fila[0]] = tuple(fila)
+        for fila in usuarios:
+            self.usuarios[fila[0]] = tuple(fila)
+        for clave, id_usuario, _, id_libro, _, fecha_p, fecha_d, estado in prestamos:
+            self.prestamos[clave] = (clave, id_usuario, id_libro, fecha_p, fecha_d, estado)
+        self.compactar()
+
+    def compactar(self):
+        """
+        Escribe una instantánea nueva con el estado actual y vacía el diario.
+        Devuelve el tamaño en bytes de la instantánea
+        """
+        temporal = self.ruta_instantanea + '.tmp'
+        with open(temporal, 'wb') as archivo:
+            archivo.write(CABECERA_INSTANTANEA + bytes([VERSION_INSTANTANEA]))
+            pickle.dump((self.libros, self.usuarios, self.prestamos), archivo, pickle.HIGHEST_PROTOCOL)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, self.ruta_instantanea)
+        if self.medidor is not None:
+            self.medidor.registrar_escritura(self.ruta_instantanea, os.path.getsize(self.ruta_instantanea))
+
+        self.diario.close()
+        self.diario = open(self.ruta_diario, 'wb')
+        return os.path.getsize(self.ruta_instantanea)
+
+    def cerrar(self):
+        """Cierra el diario"""
+        self.diario.close()
+
+
+class AlmacenamientoDiferido:
+    """
+    Envoltorio de escritura diferida (write-behind) sobre un motor de
+    almacenamiento. guardar_* y eliminar_libro/usuario solo encolan la
+    operación por registro, así que varias actualizaciones del mismo libro
+    antes del vaciado producen una sola escritura con su estado final.
+    Un hilo de fondo vacía la cola en una transacción del motor al llenarse
+    o al vencer el intervalo; las lecturas, el borrado del historial y
+    cerrar() vacían antes para ver siempre lo último encolado.
+    Se encola una copia de los campos de cada registro (la misma fila que
+    usan los motores), no el objeto: el hilo de vaciado escribe el estado
+    del momento en que se llamó a guardar_*, aunque después otro hilo lo
+    siga modificando
+    """
+    # Muestras de retraso de vaciado que se conservan para los percentiles
+    MUESTRAS_RETRASO = 1000
+
+    def __init__(self, almacenamiento, max_pendientes=MAX_PENDIENTES_ESCRITURA, intervalo=INTERVALO_VACIADO):
+        self._almacenamiento = almacenamiento
+        self.max_pendientes = max_pendientes
+        self.intervalo = intervalo
+        # (tipo, id) -> (método del motor, fila o ID); la última operación gana
+        self._pendientes = {}
+        self._desde = None
+        # Lote que se está escribiendo: (cantidad, momento de su operación más antigua)
+        self._en_vuelo = None
+        self._condicion = threading.Condition()
+        # Un solo vaciado a la vez; las lecturas vacían bajo este mismo
+        # bloqueo, pero recorrer un flujo (leer_prestamos) no lo retiene
+        self._bloqueo_motor = threading.RLock()
+        self._cerrado = False
+        self.error = None
+        # Métricas: operaciones encoladas, escrituras reales, vaciados y
+        # retraso (segundos) entre la operación más antigua y su escritura
+        self.encoladas = 0
+        self.escritas = 0
+        self.vaciados = 0
+        self.retrasos = collections.deque(maxlen=self.MUESTRAS_RETRASO)
+        self._hilo = threading.Thread(target=self._vaciar_en_segundo_plano, name='vaciado-diferido', daemon=True)
+        self._hilo.start()
+        # Si el proceso termina sin pasar por cerrar() la cola igual se vacía
+        atexit.register(self.vaciar)
+
+    def __getattr__(self, nombre):
+        return getattr(self._almacenamiento, nombre)
+
+    @property
+    def medidor(self):
+        return self._almacenamiento.medidor
+
+    @medidor.setter
+    def medidor(self, medidor):
+        self._almacenamiento.medidor = medidor
+
+    # ----- Cola -----
+
+    def _encolar(self, clave, metodo, argumento):
+        with self._condicion:
+            if self._cerrado:
+                raise ErrorAlmacenamiento("El almacenamiento diferido ya está cerrado.")
+            # El hilo se despierta con la primera operación (para medir el
+            # intervalo desde ahí) y al llenarse la cola
+            despertar = not self._pendientes
+            if despertar:
+                self._desde = time.monotonic()
+            self._pendientes[clave] = (metodo, argumento)
+            self.encoladas += 1
+            if despertar or len(self._pendientes) >= self.max_pendientes:
+                self._condicion.notify()
+
+    def _vaciar_en_segundo_plano(self):
+        while True:
+            with self._condicion:
+                while not self._cerrado and (
+                        not self._pendientes or
+                        (len(self._pendientes) < self.max_pendientes and
+                         time.monotonic() - self._desde < self.intervalo)):
+                    espera = self.intervalo - (time.monotonic() - self._desde) if self._pendientes else None
+                    self._condicion.wait(espera)
+                if self._cerrado:
+                    return
+            try:
+                self.vaciar()
+            except Exception as e:
+                # La operación queda en la cola y se reintenta en el próximo vaciado
+                self.error = e
+                time.sleep(self.intervalo)
+
+    def vaciar(self):
+        """
+        Escribe ahora todo lo encolado en una sola transacción del motor.
+        Si falla, las operaciones vuelven a la cola (sin pisar las más nuevas)
+        y el error se propaga. Devuelve cuántas escrituras se hicieron
+        """
+        with self._bloqueo_motor:
+            with self._condicion:
+                lote, desde = self._pendientes, self._desde
+                if not lote:
+                    return 0
+                self._pendientes, self._desde = {}, None
+                self._en_vuelo = (len(lote), desde)
+            try:
+                with self._almacenamiento.transaccion():
+                    for metodo, argumento in lote.values():
+                        getattr(self._almacenamiento, metodo)(self._rearmar(metodo, argumento))
+            except BaseException:
+                with self._condicion:
+                    self._en_vuelo = None
+                    lote.update(self._pendientes)
+                    self._pendientes = lote
+                    self._desde = desde
+                raise
+            with self._condicion:
+                self._en_vuelo = None
+                self.escritas += len(lote)
+                self.vaciados += 1
+                self.retrasos.append(time.monotonic() - desde)
+            self.error = None
+            return len(lote)
+
+    def metricas(self):
+        """
+        Estado de la cola: pendientes, retraso actual de la operación más
+        antigua, percentiles del retraso de vaciado y coalescencia lograda
+        """
+        with self._condicion:
+            retrasos = list(self.retrasos)
+            en_vuelo, desde = self._en_vuelo or (0, self._desde)
+            return {
+                'pendientes': len(self._pendientes) + en_vuelo,
+                'retraso_actual_ms': (time.monotonic() - desde) * 1000 if desde is not None else 0.0,
+                'retraso_p50_ms': percentil(retrasos, 50) * 1000,
+                'retraso_p99_ms': percentil(retrasos, 99) * 1000,
+                'retraso_max_ms': max(retrasos, default=0.0) * 1000,
+                'encoladas': self.encoladas,
+                'escritas': self.escritas,
+                'vaciados': self.vaciados,
+                'error': str(self.error) if self.error else None,
+            }
+
+    # ----- Escrituras (encoladas) -----
+
+    @staticmethod
+    def _rearmar(metodo, fila):
+        """Objeto que espera el motor a partir de la fila encolada (eliminar_* recibe el ID tal cual)"""
+        if metodo == 'guardar_libro':
+            libro = Libro(*fila[:6])
+            libro.disponible = fila[6]
+            return libro
+        if metodo == 'guardar_usuario':
+            usuario = Usuario(*fila[:6])
+            usuario.fecha_registro = fila[6]
+            return usuario
+        if metodo == 'guardar_prestamo':
+            clave, id_usuario, nombre_usuario, id_libro, titulo_libro, fecha_p, fecha_d, estado = fila
+            # De usuario y libro los motores solo escriben el ID y el nombre o título
+            prestamo = Prestamo(Usuario(id_usuario, nombre_usuario, '', '', '', ''),
+                                Libro(id_libro, titulo_libro, '', '', '', ''), fecha_p, clave)
+            prestamo.fecha_devolucion = fecha_d
+            prestamo.estado_devolucion = estado
+            return prestamo
+        return fila
+
+    def guardar_libro(self, libro):
+        self._encolar(('libro', libro.id_libro), 'guardar_libro',
+                      (libro.id_libro, libro.titulo, libro.autor, libro.editorial,
+                       libro.fecha_publicacion, libro.isbn, libro.disponible))
+
+    def eliminar_libro(self, id_libro):
+        self._encolar(('libro', id_libro), 'eliminar_libro', id_libro)
+
+    def guardar_usuario(self, usuario):
+        self._encolar(('usuario', usuario.id_usuario), 'guardar_usuario',
+                      (usuario.id_usuario, usuario.nombre, usuario.rut, usuario.correo,
+                       usuario.telefono, usuario.direccion, usuario.fecha_registro))
+
+    def eliminar_usuario(self, id_usuario):
+        self._encolar(('usuario', id_usuario), 'eliminar_usuario', id_usuario)
+
+    def guardar_prestamo(self, prestamo):
+        self._encolar(('prestamo', prestamo.clave), 'guardar_prestamo',
+                      (prestamo.clave, prestamo.usuario.id_usuario, prestamo.usuario.nombre,
+                       prestamo.libro.id_libro, prestamo.libro.titulo,
+                       prestamo.fecha_prestamo, prestamo.fecha_devolucion, prestamo.estado_devolucion))
+
+    @contextlib.contextmanager
+    def transaccion(self, durabilidad=None):
+        """Las operaciones ya se confirman juntas en cada vaciado"""
+        yield
+
+    # ----- Operaciones que necesitan la cola vacía -----
+
+    def eliminar_prestamos(self):
+        with self._bloqueo_motor:
+            self.vaciar()
+            return self._almacenamiento.eliminar_prestamos()
+
+    def contar_prestamos(self):
+        with self._bloqueo_motor:
+            self.vaciar()
+            return self._almacenamiento.contar_prestamos()
+
+    def leer_libros(self):
+        with self._bloqueo_motor:
+            self.vaciar()
+            return iter(list(self._almacenamiento.leer_libros()))
+
+    def leer_usuarios(self):
+        with self._bloqueo_motor:
+            self.vaciar()
+            return iter(list(self._almacenamiento.leer_usuarios()))
+
+    def leer_prestamos(self, solo_activos=False):
+        # Se vacía antes, pero la lectura es un flujo y se recorre sin el
+        # bloqueo (retenerlo dejaría el vaciado esperando a quien consuma el
+        # flujo): los vaciados que ocurran mientras tanto pueden verse o no,
+        # igual que las escrituras concurrentes con el motor solo
+        with self._bloqueo_motor:
+            self.vaciar()
+        return self._almacenamiento.leer_prestamos(solo_activos)
+
+    def cerrar(self):
+        """Detiene el hilo de vaciado, escribe lo pendiente y cierra el motor"""
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify()
+        self._hilo.join()
+        atexit.unregister(self.vaciar)
+        try:
+            self.vaciar()
+        finally:
+            self._almacenamiento.cerrar()
+
+
+def crear_almacenamiento(motor=MOTOR_ALMACENAMIENTO, hilos=HILOS_CARGA, durabilidad=DURABILIDAD,
+                         escritura_diferida=False):
+    """
+    Crea el motor de almacenamiento indicado por nombre (envuelto en
+    AlmacenamientoDiferido si se pide escritura diferida)
+    """
+    if motor == 'texto':
+        almacenamiento = AlmacenamientoTexto(hilos=hilos, durabilidad=durabilidad)
+    elif motor == 'sqlite':
+        almacenamiento = AlmacenamientoSQLite(durabilidad=durabilidad)
+    elif motor == 'instantanea':
+        almacenamiento = AlmacenamientoInstantanea(durabilidad=durabilidad)
+    else:
+        raise ValueError(f"Motor de almacenamiento desconocido: {motor}")
+    return AlmacenamientoDiferido(almacenamiento) if escritura_diferida else almacenamiento
+
+
+def migrar_desde_texto(destino, origen=None):
+    """
+    Migración única del árbol de archivos .txt a otro motor (SQLite o instantánea).
+    Devuelve la cantidad de (libros, usuarios, préstamos) migrados
+    """
+    origen = origen or AlmacenamientoTexto()
+    libros = list(origen.leer_libros())
+    usuarios = list(origen.leer_usuarios())
+    nombres_usuario = {fila[0]: fila[1] for fila in usuarios}
+    titulos_libro = {fila[0]: fila[1] for fila in libros}
+    prestamos = [
+        (clave, id_usuario, nombres_usuario.get(id_usuario, ''), id_libro,
+         titulos_libro.get(id_libro, ''), fecha_p, fecha_d, estado)
+        for clave, id_usuario, id_libro, fecha_p, fecha_d, estado in origen.leer_prestamos()
+    ]
+
+    try:
+        destino.importar(libros, usuarios, prestamos)
+    finally:
+        destino.cerrar()
+    return len(libros), len(usuarios), len(prestamos)
+
+
+# ==================== ÍNDICES SECUNDARIOS ====================
+
+def tokenizar(texto):
+    """Divide un texto en palabras en minúsculas"""
+    return re.findall(r'\w+', texto.lower())
+
+
+def normalizar_isbn(isbn):
+    """Deja solo dígitos (y la X final) de un ISBN"""
+    return re.sub(r'[^0-9Xx]', '', isbn).upper()
+
+
+def normalizar_rut(rut):
+    """Quita puntos, guiones y espacios de un RUT"""
+    return re.sub(r'[^0-9Kk]', '', rut).upper()
+
+
+class IndiceTexto:
+    """
+    Índice invertido por palabras con búsqueda por palabra completa y por prefijo
+    """
+    def __init__(self):
+        self.postings = {}
+        # Vocabulario ordenado para resolver prefijos con búsqueda binaria
+        self.vocabulario = []
+
+    def agregar(self, id_registro, texto):
+        """Indexa las palabras de un texto para el registro indicado"""
+        for token in set(tokenizar(texto)):
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                bisect.insort(self.vocabulario, token)
+            ids.add(id_registro)
+
+    def quitar(self, id_registro, texto):
+        """Quita del índice las palabras de un texto para el registro indicado"""
+        for token in set(tokenizar(texto)):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(id_registro)
+            if not ids:
+                del self.postings[token]
+                del self.vocabulario[bisect.bisect_left(self.vocabulario, token)]
+
+    def _con_prefijo(self, prefijo):
+        """Une los registros de todas las palabras que empiezan con el prefijo"""
+        inicio = bisect.bisect_left(self.vocabulario, prefijo)
+        resultado = set()
+        for token in itertools.islice(self.vocabulario, inicio, None):
+            if not token.startswith(prefijo):
+                break
+            resultado |= self.postings[token]
+        return resultado
+
+    def buscar(self, consulta):
+        """
+        Devuelve los ids que contienen todas las palabras de la consulta.
+        La última palabra se busca como prefijo (búsqueda mientras se escribe)
+        """
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return set()
+
+        conjuntos = [self.postings.get(token, set()) for token in tokens[:-1]]
+        conjuntos.append(self._con_prefijo(tokens[-1]))
+        conjuntos.sort(key=len)
+        return set(conjuntos[0]).intersection(*conjuntos[1:])
+
+
+@functools.lru_cache(maxsize=65536)
+def plegar(palabra):
+    """Minúsculas sin tildes ni diéresis ('Ónix' -> 'onix')"""
+    descompuesta = unicodedata.normalize('NFKD', palabra.lower())
+    return ''.join(letra for letra in descompuesta if not unicodedata.combining(letra))
+
+
+def trigramas(palabra):
+    """Trigramas de una palabra con un espacio de relleno a cada lado"""
+    relleno = f" {palabra} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def distancia_edicion(a, b, maximo):
+    """
+    Distancia de edición entre a y b contando la transposición de dos letras
+    vecinas como un solo error. Deja de calcular (y devuelve maximo + 1) en
+    cuanto se sabe que supera maximo
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior2 = None
+    anterior = list(range(len(b) + 1))
+    for i, letra_a in enumerate(a, 1):
+        actual = [i] + [0] * len(b)
+        for j, letra_b in enumerate(b, 1):
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (letra_a != letra_b))
+            if i > 1 and j > 1 and letra_a == b[j - 2] and a[i - 2] == letra_b:
+                actual[j] = min(actual[j], anterior2[j - 2] + 1)
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior2, anterior = anterior, actual
+    return anterior[-1]
+
+
+class IndiceDifuso:
+    """
+    Índice de texto libre sobre varios campos de un registro: palabras sin
+    tildes, completado de la última palabra por prefijo y tolerancia a
+    errores de tipeo (trigramas para elegir candidatas + distancia de
+    edición para confirmarlas). Los resultados se ordenan por puntaje
+    """
+    def __init__(self, pesos=PESOS_BUSQUEDA):
+        self.pesos = pesos
+        # palabra -> {id: peso del campo más importante donde aparece}
+        self.postings = {}
+        # trigrama -> palabras del vocabulario que lo contienen
+        self.trigramas = {}
+        # Vocabulario ordenado para los prefijos; se arma en la primera
+        # consulta (no durante la carga) y luego se mantiene con insort
+        self._vocabulario = None
+        self.total_registros = 0
+
+    def _palabras(self, registro):
+        """palabra plegada -> mayor peso de los campos en que aparece"""
+        palabras = {}
+        for campo, peso in self.pesos.items():
+            for palabra in tokenizar(getattr(registro, campo)):
+                palabra = plegar(palabra)
+                if palabras.get(palabra, 0) < peso:
+                    palabras[palabra] = peso
+        return palabras
+
+    def agregar(self, id_registro, registro):
+        """Indexa los campos de un registro"""
+        for palabra, peso in self._palabras(registro).items():
+            ids = self.postings.get(palabra)
+            if ids is None:
+                ids = self.postings[palabra] = {}
+                for trigrama in trigramas(palabra):
+                    agregar_a_indice(self.trigramas, trigrama, palabra)
+                if self._vocabulario is not None:
+                    bisect.insort(self._vocabulario, palabra)
+            ids[id_registro] = peso
+        self.total_registros += 1
+
+    def quitar(self, id_registro, registro):
+        """Quita del índice los campos de un registro (con sus valores indexados)"""
+        for palabra in self._palabras(registro):
+            ids = self.postings.get(palabra)
+            if ids is None:
+                continue
+            ids.pop(id_registro, None)
+            if not ids:
+                del self.postings[palabra]
+                for trigrama in trigramas(palabra):
+                    quitar_de_indice(self.trigramas, trigrama, palabra)
+                if self._vocabulario is not None:
+                    del self._vocabulario[bisect.bisect_left(self._vocabulario, palabra)]
+        self.total_registros -= 1
+
+    def _variantes(self, palabra, completar):
+        """
+        Palabras del índice que pueden corresponder a la de la consulta, con
+        su similitud: la misma palabra (1), las que la completan si es la
+        última de la consulta (0.9) y, si ninguna existe, las que están a
+        pocos errores de tipeo (0.7 con uno, 0.4 con dos; se prueban las de
+        un error antes que las de dos)
+        """
+        variantes = {}
+        if palabra in self.postings:
+            variantes[palabra] = 1.0
+        # Las palabras cortas que ya existen ('de', 'la') no se completan
+        if completar and (len(palabra) > 2 or not variantes):
+            if self._vocabulario is None:
+                self._vocabulario = sorted(self.postings)
+            inicio = bisect.bisect_left(self._vocabulario, palabra)
+            for candidata in itertools.islice(self._vocabulario, inicio, inicio + PALABRAS_POR_PREFIJO):
+                if not candidata.startswith(palabra):
+                    break
+                variantes.setdefault(candidata, 0.9)
+        if variantes:
+            return variantes
+
+        maximo = ERRORES_TOLERADOS[min(len(palabra) // 4, len(ERRORES_TOLERADOS) - 1)]
+        gramas = trigramas(palabra)
+        compartidos = collections.Counter()
+        for trigrama in gramas:
+            compartidos.update(self.trigramas.get(trigrama, ()))
+        # Primero se buscan palabras a un error y solo si no hay se admiten
+        # más; cada error cambia como mucho cuatro trigramas (transposición)
+        for tolerados in range(1, maximo + 1):
+            minimo = len(gramas) - 4 * tolerados
+            for candidata, cantidad in compartidos.items():
+                if cantidad >= minimo and abs(len(candidata) - len(palabra)) <= tolerados:
+                    errores = distancia_edicion(palabra, candidata, tolerados)
+                    if errores <= tolerados:
+                        variantes[candidata] = 1.0 - 0.3 * errores
+            if variantes:
+                break
+        return variantes
+
+    def buscar(self, consulta, limite=RESULTADOS_BUSQUEDA):
+        """
+        Devuelve hasta limite pares (id, puntaje) de mayor a menor. Primero
+        pesa cuántas palabras de la consulta coinciden y luego el puntaje:
+        similitud x peso del campo x rareza de la palabra (idf). Los
+        candidatos salen de la palabra de la consulta con menos registros,
+        así una palabra frecuente ('de') no obliga a recorrer medio catálogo
+        """
+        palabras = [plegar(palabra) for palabra in tokenizar(consulta)]
+        if not palabras:
+            return []
+
+        terminos = []
+        for posicion, palabra in enumerate(palabras, 1):
+            variantes = self._variantes(palabra, posicion == len(palabras))
+            if variantes:
+                pesos = [(self.postings[variante], similitud * math.log(1 + self.total_registros / len(self.postings[variante])))
+                         for variante, similitud in variantes.items()]
+                terminos.append((sum(len(ids) for ids, _ in pesos), pesos))
+        if not terminos:
+            return []
+        terminos.sort(key=operator.itemgetter(0))
+
+        candidatos = set()
+        for ids, _ in terminos[0][1]:
+            candidatos.update(ids)
+        # Se prefieren los registros con todas las palabras: se intersecan
+        # de la más rara a la más frecuente (uniendo sus variantes o, si eso
+        # cuesta más, consultándolas una a una); si ninguno las tiene todas
+        # se puntúan los de la palabra más rara
+        completos = candidatos
+        for tamano, pesos in terminos[1:]:
+            if len(pesos) == 1:
+                completos = completos & pesos[0][0].keys()
+            elif tamano <= len(completos) * len(pesos):
+                completos = set().union(*[completos & ids.keys() for ids, _ in pesos])
+            else:
+                completos = {id_registro for id_registro in completos if any(id_registro in ids for ids, _ in pesos)}
+            if not completos:
+                break
+        if completos:
+            candidatos = completos
+        # Una consulta de solo palabras muy frecuentes coincide con medio
+        # catálogo: se puntúa una muestra acotada
+        if len(candidatos) > CANDIDATOS_BUSQUEDA:
+            candidatos = itertools.islice(candidatos, CANDIDATOS_BUSQUEDA)
+
+        def puntuar(id_registro):
+            coincidencias, puntaje = 0, 0.0
+            for _, pesos in terminos:
+                mejor = max((ids.get(id_registro, 0) * peso for ids, peso in pesos), default=0)
+                if mejor:
+                    coincidencias += 1
+                    puntaje += mejor
+            return coincidencias, puntaje
+
+        puntuados = ((puntuar(id_registro), id_registro) for id_registro in candidatos)
+        mejores = heapq.nlargest(limite, puntuados, key=operator.itemgetter(0))
+        return [(id_registro, round(puntaje, 3)) for (_, puntaje), id_registro in mejores]
+
+
+def agregar_a_indice(indice, clave, id_registro):
+    """Agrega un id al conjunto de una clave en un índice dict -> set"""
+    indice.setdefault(clave, set()).add(id_registro)
+
+
+def quitar_de_indice(indice, clave, id_registro):
+    """Quita un id del conjunto de una clave en un índice dict -> set"""
+    ids = indice.get(clave)
+    if ids is not None:
+        ids.discard(id_registro)
+        if not ids:
+            del indice[clave]
+
+
+# ==================== IMPORTACIÓN MASIVA ====================
+
+CAMPOS_LIBRO = ('id_libro', 'titulo', 'autor', 'editorial', 'fecha_publicacion', 'isbn')
+CAMPOS_USUARIO = ('id_usuario', 'nombre', 'rut', 'correo', 'telefono', 'direccion')
+
+
+def detectar_formato(ruta, formato=None):
+    """Deduce el formato ('csv' o 'jsonl') a partir de la extensión del archivo"""
+    if formato:
+        return formato
+    return 'csv' if ruta.lower().endswith('.csv') else 'jsonl'
+
+
+def leer_filas_importacion(ruta, formato=None):
+    """
+    Recorre un archivo CSV (con encabezado) o JSON Lines fila a fila.
+    Entrega (numero_de_linea, dict) o (numero_de_linea, None) si la fila no se pudo interpretar
+    """
+    formato = detectar_formato(ruta, formato)
+    with open(ruta, 'r', encoding='utf-8', newline='') as archivo:
+        if formato == 'csv':
+            lector = csv.DictReader(archivo)
+            for fila in lector:
+                yield lector.line_num, fila
+        else:
+            for numero, linea in enumerate(archivo, 1):
+                if not linea.strip():
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except ValueError:
+                    fila = None
+                yield numero, fila if isinstance(fila, dict) else None
+
+
+class ResultadoImportacion:
+    """
+    Resumen de una importación masiva
+    """
+    # Cantidad de motivos de rechazo que se conservan como ejemplo
+    MAX_EJEMPLOS = 20
+
+    def __init__(self):
+        self.aceptadas = 0
+        self.rechazadas = 0
+        self.lotes = 0
+        self.segundos = 0.0
+        self.ejemplos_rechazo = []
+
+    def rechazar(self, numero, motivo):
+        self.rechazadas += 1
+        if len(self.ejemplos_rechazo) < self.MAX_EJEMPLOS:
+            self.ejemplos_rechazo.append((numero, motivo))
+
+    @property
+    def filas_por_segundo(self):
+        total = self.aceptadas + self.rechazadas
+        return total / self.segundos if self.segundos else 0.0
+
+    def __str__(self):
+        return (f"Aceptadas: {self.aceptadas} | Rechazadas: {self.rechazadas} | "
+                f"Lotes: {self.lotes} | {self.filas_por_segundo:.0f} filas/s ({self.segundos:.2f}s)")
+
+
+# ==================== EXPORTACIÓN ====================
+
+COLUMNAS_EXPORTACION = {
+    'libros': ('id_libro', 'titulo', 'autor', 'editorial', 'fecha_publicacion', 'isbn', 'disponible'),
+    'usuarios': ('id_usuario', 'nombre', 'rut', 'correo', 'telefono', 'direccion', 'fecha_registro'),
+    'prestamos': ('clave', 'id_usuario', 'nombre_usuario', 'id_libro', 'titulo_libro',
+                  'fecha_prestamo', 'fecha_devolucion', 'estado_devolucion'),
+}
+
+
+class EscritorColumnar:
+    """
+    Escribe un archivo columnar compacto: las filas se agrupan en bloques y
+    cada columna de cada bloque se guarda comprimida por separado.
+    Formato: CABECERA_COLUMNAR + versión, encabezado JSON con las columnas y
+    luego bloques [n_filas][largo + columna comprimida]... terminados en n_filas = 0
+    """
+    def __init__(self, archivo, columnas):
+        self.archivo = archivo
+        self.columnas = columnas
+        self.archivo.write(CABECERA_COLUMNAR + bytes([VERSION_COLUMNAR]))
+        self._escribir_bloque_bytes(json.dumps({'columnas': list(columnas)}).encode('utf-8'))
+
+    def _escribir_bloque_bytes(self, datos):
+        self.archivo.write(struct.pack('<I', len(datos)) + datos)
+
+    def escribir_grupo(self, filas):
+        """Escribe un grupo de filas (lista de tuplas) como columnas comprimidas"""
+        self.archivo.write(struct.pack('<I', len(filas)))
+        for valores in zip(*filas):
+            self._escribir_bloque_bytes(zlib.compress(json.dumps(valores, ensure_ascii=False).encode('utf-8')))
+
+    def cerrar(self):
+        self.archivo.write(struct.pack('<I', 0))
+
+
+def leer_columnar(ruta):
+    """Recorre las filas de un archivo escrito por EscritorColumnar"""
+    with open(ruta, 'rb') as archivo:
+        cabecera = archivo.read(len(CABECERA_COLUMNAR) + 1)
+        if cabecera[:-1] != CABECERA_COLUMNAR or cabecera[-1] != VERSION_COLUMNAR:
+            raise ValueError(f"{ruta} no es un archivo columnar de la biblioteca")
+
+        def leer_bloque():
+            (largo,) = struct.unpack('<I', archivo.read(4))
+            return archivo.read(largo)
+
+        columnas = json.loads(leer_bloque())['columnas']
+        while True:
+            (cantidad,) = struct.unpack('<I', archivo.read(4))
+            if not cantidad:
+                return
+            valores = [json.loads(zlib.decompress(leer_bloque())) for _ in columnas]
+            for fila in zip(*valores):
+                yield dict(zip(columnas, fila))
+
+
+def escribir_exportacion(ruta, formato, columnas, filas):
+    """
+    Escribe las filas en CSV, JSON Lines o columnar con escrituras en bloque
+    (un grupo de FILAS_POR_BLOQUE_EXPORTACION filas por llamada). Devuelve cuántas filas escribió
+    """
+    total = 0
+    grupos = iter(lambda: list(itertools.islice(filas, FILAS_POR_BLOQUE_EXPORTACION)), [])
+
+    if formato == 'columnar':
+        with open(ruta, 'wb', buffering=BUFFER_EXPORTACION) as archivo:
+            escritor = EscritorColumnar(archivo, columnas)
+            for grupo in grupos:
+                escritor.escribir_grupo(grupo)
+                total += len(grupo)
+            escritor.cerrar()
+        return total
+
+    with open(ruta, 'w', encoding='utf-8', newline='', buffering=BUFFER_EXPORTACION) as archivo:
+        if formato == 'csv':
+            escritor = csv.writer(archivo)
+            escritor.writerow(columnas)
+            for grupo in grupos:
+                escritor.writerows(grupo)
+                total += len(grupo)
+        else:
+            for grupo in grupos:
+                archivo.write(''.join(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False) + '\n' for fila in grupo))
+                total += len(grupo)
+    return total
+
+
+# ==================== COPIAS DEL HISTORIAL ====================
+# Columnas de cada préstamo en las copias incrementales (fechas en segundos
+# desde la época) y en el informe de texto del historial
+COLUMNAS_COPIA = ('clave', 'id_usuario', 'nombre', 'rut', 'correo', 'telefono',
+                  'id_libro', 'titulo', 'autor', 'isbn',
+                  'fecha_prestamo', 'fecha_devolucion', 'estado_devolucion')
+
+
+def prestamo_a_registro(prestamo):
+    """Prestamo -> tupla con las COLUMNAS_COPIA"""
+    usuario, libro = prestamo.usuario, prestamo.libro
+    return (prestamo.clave, usuario.id_usuario, usuario.nombre, usuario.rut, usuario.correo, usuario.telefono,
+            libro.id_libro, libro.titulo, libro.autor, libro.isbn,
+            prestamo._fecha_prestamo, prestamo._fecha_devolucion, prestamo._estado_devolucion)
+
+
+def ruta_en_save(prefijo, extension):
+    """Crea SAVE/<fecha>/ si falta y devuelve la ruta de un archivo nuevo con la hora actual"""
+    ahora = datetime.now()
+    ruta_fecha = os.path.join(CARPETA_SAVE, ahora.strftime("%Y-%m-%d"))
+    os.makedirs(ruta_fecha, exist_ok=True)
+    return os.path.join(ruta_fecha, f"{prefijo}_{ahora.strftime('%H-%M-%S')}{extension}")
+
+
+def escribir_informe_historial(ruta, registros, titulo="HISTORIAL DE PRÉSTAMOS"):
+    """
+    Escribe el informe de texto del historial a partir de registros con las
+    COLUMNAS_COPIA, en bloques de FILAS_POR_BLOQUE_EXPORTACION préstamos.
+    Devuelve (total, activos)
+    """
+    registros = iter(registros)
+    total = activos = 0
+    with open(ruta, 'w', encoding='utf-8', buffering=BUFFER_EXPORTACION) as archivo:
+        archivo.write("="*100 + "\n")
+        archivo.write(f"{titulo} - {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
+        archivo.write("="*100 + "\n\n")
+
+        for grupo in iter(lambda: list(itertools.islice(registros, FILAS_POR_BLOQUE_EXPORTACION)), []):
+            partes = []
+            for (_, id_usuario, nombre, rut, correo, telefono, id_libro, titulo_libro, autor, isbn,
+                 fecha_prestamo, fecha_devolucion, estado_devolucion) in grupo:
+                total += 1
+                partes.append(
+                    f"--- PRÉSTAMO #{total} ---\n"
+                    f"Usuario ID: {id_usuario}\n"
+                    f"Usuario Nombre: {nombre}\n"
+                    f"Usuario RUT: {rut}\n"
+                    f"Usuario Correo: {correo}\n"
+                    f"Usuario Teléfono: {telefono}\n"
+                    f"\n"
+                    f"Libro ID: {id_libro}\n"
+                    f"Libro Título: {titulo_libro}\n"
+                    f"Libro Autor: {autor}\n"
+                    f"Libro ISBN: {isbn}\n"
+                    f"\n"
+                    f"Fecha Préstamo: {epoca_a_fecha(fecha_prestamo).strftime('%d/%m/%Y %H:%M:%S')}\n")
+                if fecha_devolucion is not None:
+                    partes.append(f"Fecha Devolución: {epoca_a_fecha(fecha_devolucion).strftime('%d/%m/%Y %H:%M:%S')}\n"
+                                  f"Estado Devolución: {estado_devolucion}\n\n")
+                else:
+                    partes.append("Estado: 📖 ACTIVO\n\n")
+                    activos += 1
+            archivo.write(''.join(partes))
+
+        archivo.write("="*100 + "\n")
+        archivo.write(f"RESUMEN:\n")
+        archivo.write(f"Total de préstamos: {total}\n")
+        archivo.write(f"Préstamos activos: {activos}\n")
+        archivo.write(f"Préstamos devueltos: {total - activos}\n")
+        archivo.write("="*100 + "\n")
+    return total, activos
+
+
+def escribir_copia_incremental(ruta, registros):
+    """
+    Escribe los registros como JSON Lines comprimido con gzip, en bloques de
+    FILAS_POR_BLOQUE_EXPORTACION líneas, mediante temporal + fsync + rename.
+    Devuelve cuántos registros escribió
+    """
+    registros = iter(registros)
+    total = 0
+    temporal = ruta + SUFIJO_TEMPORAL
+    with open(temporal, 'wb', buffering=BUFFER_EXPORTACION) as archivo:
+        with gzip.GzipFile(fileobj=archivo, mode='wb') as comprimido:
+            for grupo in iter(lambda: list(itertools.islice(registros, FILAS_POR_BLOQUE_EXPORTACION)), []):
+                comprimido.write(''.join(json.dumps(registro, ensure_ascii=False) + '\n'
+                                         for registro in grupo).encode('utf-8'))
+                total += len(grupo)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+    return total
+
+
+def leer_copia_incremental(ruta):
+    """Recorre las tuplas (COLUMNAS_COPIA) de una copia incremental"""
+    with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+        for linea in archivo:
+            yield tuple(json.loads(linea))
+
+
+def leer_manifiesto(ruta=ARCHIVO_MANIFIESTO):
+    """
+    Devuelve las entradas del manifiesto en orden, comprobando que cada copia
+    apunte a la anterior. Sin manifiesto devuelve una lista vacía
+    """
+    if not os.path.exists(ruta):
+        return []
+    entradas = []
+    with open(ruta, encoding='utf-8') as archivo:
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            entrada = json.loads(linea)
+            anterior = entradas[-1]['numero'] if entradas else None
+            if entrada['anterior'] != anterior or entrada['numero'] != (anterior or 0) + 1:
+                raise ErrorAlmacenamiento(f"La cadena de copias del manifiesto {ruta} está rota en la copia {entrada['numero']}.")
+            entradas.append(entrada)
+    return entradas
+
+
+def agregar_al_manifiesto(entrada, ruta=ARCHIVO_MANIFIESTO):
+    """Añade una copia al final del manifiesto y la sincroniza con el disco"""
+    with open(ruta, 'a', encoding='utf-8') as archivo:
+        archivo.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        archivo.flush()
+        os.fsync(archivo.fileno())
+
+
+def reconstruir_historial_prestamos(ruta=None, manifiesto=ARCHIVO_MANIFIESTO):
+    """
+    Reconstruye el informe completo del historial recorriendo la cadena de
+    copias incrementales: cada préstamo queda con su versión más reciente.
+    Devuelve (ruta del informe, total de préstamos, copias leídas)
+    """
+    entradas = leer_manifiesto(manifiesto)
+    if not entradas:
+        raise SinPrestamos("No hay copias incrementales del historial para reconstruir.")
+
+    registros = {}
+    for entrada in entradas:
+        ruta_copia = os.path.join(os.path.dirname(manifiesto), entrada['archivo'])
+        if not os.path.exists(ruta_copia):
+            raise ErrorAlmacenamiento(f"Falta la copia {entrada['numero']} del historial: {ruta_copia}")
+        leidos = 0
+        for registro in leer_copia_incremental(ruta_copia):
+            registros[registro[0]] = registro
+            leidos += 1
+        if leidos != entrada['registros']:
+            raise ErrorAlmacenamiento(f"La copia {entrada['numero']} del historial está incompleta: {ruta_copia}")
+
+    if ruta is None:
+        ruta = ruta_en_save('historial_reconstruido', EXTENSION)
+    ordenados = sorted(registros.values(), key=operator.itemgetter(COLUMNAS_COPIA.index('fecha_prestamo')))
+    total, _ = escribir_informe_historial(ruta, ordenados, "HISTORIAL DE PRÉSTAMOS (RECONSTRUIDO)")
+    return ruta, total, len(entradas)
+
+
+# ==================== PAGINACIÓN ====================
+class Pagina:
+    """
+    Una página de un listado. total es la cantidad de registros que cumplen
+    el filtro cuando se conoce sin recorrerlos (None si no)
+    """
+    def __init__(self, elementos, numero, tamano, hay_siguiente, total=None):
+        self.elementos = elementos
+        self.numero = numero
+        self.tamano = tamano
+        self.hay_siguiente = hay_siguiente
+        self.total = total
+
+    @property
+    def total_paginas(self):
+        if self.total is None:
+            return None
+        return max(1, -(-self.total // self.tamano))
+
+
+def paginar(elementos, pagina=1, tamano_pagina=TAMANO_PAGINA, clave=None, descendente=False, total=None):
+    """
+    Corta una página de un flujo sin materializarlo entero. Sin clave se
+    respeta el orden del flujo (una lista se corta directamente, también
+    desde el final si es descendente); con clave solo se ordenan los
+    primeros pagina * tamano_pagina + 1 elementos (heapq)
+    """
+    if pagina < 1 or tamano_pagina < 1:
+        raise ValueError("La página y su tamaño deben ser positivos.")
+
+    inicio = (pagina - 1) * tamano_pagina
+    limite = inicio + tamano_pagina + 1
+    if clave is None and isinstance(elementos, list):
+        if descendente:
+            fin = max(0, len(elementos) - inicio)
+            seleccion = elementos[max(0, fin - tamano_pagina - 1):fin][::-1]
+        else:
+            seleccion = elementos[inicio:limite]
+    elif clave is None:
+        seleccion = list(itertools.islice(elementos, inicio, limite))
+    else:
+        seleccion = (heapq.nlargest if descendente else heapq.nsmallest)(limite, elementos, key=clave)[inicio:]
+    return Pagina(seleccion[:tamano_pagina], pagina, tamano_pagina, len(seleccion) > tamano_pagina, total)
+
+
+# Claves de orden admitidas por los listados
+ORDENES_LIBROS = {
+    'id': operator.attrgetter('id_libro'),
+    'titulo': lambda libro: libro.titulo.lower(),
+    'autor': lambda libro: libro.autor.lower(),
+    'fecha_publicacion': operator.attrgetter('fecha_publicacion'),
+}
+ORDENES_USUARIOS = {
+    'id': operator.attrgetter('id_usuario'),
+    'nombre': lambda usuario: usuario.nombre.lower(),
+    'prestamos': lambda usuario: len(usuario.prestamos),
+}
+ORDENES_PRESTAMOS = {
+    'fecha_prestamo': operator.attrgetter('_fecha_prestamo'),
+    'fecha_devolucion': lambda prestamo: prestamo._fecha_devolucion or 0,
+    'usuario': lambda prestamo: prestamo.usuario.nombre.lower(),
+    'libro': lambda prestamo: prestamo.libro.titulo.lower(),
+}
+ESTADOS_PRESTAMO = ('activo', 'devuelto')
+
+
+class _VistaPorClave:
+    """
+    Una lista ordenada vista a través de su clave de orden, para buscar con
+    bisect sin su parámetro key (que recién existe en Python 3.10)
+    """
+    __slots__ = ('lista', 'clave')
+
+    def __init__(self, lista, clave):
+        self.lista = lista
+        self.clave = clave
+
+    def __len__(self):
+        return len(self.lista)
+
+    def __getitem__(self, posicion):
+        return self.clave(self.lista[posicion])
+
+
+# ==================== RESERVAS ====================
+# Estados de una reserva: las vivas ocupan lugar en la lista de espera o
+# tienen un ejemplar apartado; las demás ya terminaron
+EN_ESPERA = 'en_espera'
+ASIGNADA = 'asignada'
+CUMPLIDA = 'cumplida'
+CANCELADA = 'cancelada'
+VENCIDA = 'vencida'
+RESERVAS_VIVAS = (EN_ESPERA, ASIGNADA)
+
+
+class Reserva:
+    """
+    Reserva de un título por un usuario. Espera en la lista del título
+    (ordenada por prioridad y luego por fecha de solicitud); al devolverse
+    un ejemplar queda asignada con ese ejemplar apartado hasta vence
+    """
+    __slots__ = ('clave', 'usuario', 'titulo', 'prioridad', 'fecha_solicitud', 'estado', 'libro', 'vence')
+
+    def __init__(self, usuario, titulo, prioridad=0, fecha_solicitud=None, clave=None):
+        self.usuario = usuario
+        # Clave del título reservado (ISBN normalizado, ver clave_titulo)
+        self.titulo = titulo
+        self.prioridad = prioridad
+        self.fecha_solicitud = fecha_solicitud or datetime.now()
+        self.clave = clave or f"R_{usuario.id_usuario}_{titulo}_{self.fecha_solicitud.strftime('%Y%m%d%H%M%S%f')}"
+        self.estado = EN_ESPERA
+        self.libro = None
+        # Segundos desde la época en que vence el ejemplar apartado
+        self.vence = None
+
+
+def reserva_a_dict(reserva):
+    return {'clave': reserva.clave, 'id_usuario': reserva.usuario.id_usuario, 'titulo': reserva.titulo,
+            'prioridad': reserva.prioridad, 'fecha_solicitud': reserva.fecha_solicitud.isoformat(sep=' '),
+            'estado': reserva.estado, 'id_libro': reserva.libro.id_libro if reserva.libro else None,
+            'vence': reserva.vence}
+
+
+class DiarioReservas:
+    """
+    Persistencia de las reservas en un archivo JSON Lines de solo anexado:
+    cada cambio escribe una línea con el estado completo de la reserva y al
+    leer gana la última. Al cargar se conservan las vivas y el archivo se
+    reescribe solo con ellas, así no crece con las reservas terminadas
+    """
+    def __init__(self, ruta=ARCHIVO_RESERVAS, durabilidad=DURABILIDAD):
+        self.ruta = ruta
+        self.durabilidad = durabilidad
+        self._archivo = None
+
+    def cargar(self):
+        """Devuelve los datos (dict) de las reservas vivas en orden de creación"""
+        if not os.path.exists(self.ruta):
+            return []
+        ultimas = {}
+        with open(self.ruta, encoding='utf-8') as archivo:
+            for linea in archivo:
+                try:
+                    datos = json.loads(linea)
+                except ValueError:
+                    # Línea a medio escribir por una caída: se descarta
+                    continue
+                ultimas[datos['clave']] = datos
+        return [datos for datos in ultimas.values() if datos['estado'] in RESERVAS_VIVAS]
+
+    def registrar(self, reserva):
+        """Anexa el estado actual de una reserva"""
+        if self._archivo is None:
+            os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+            self._archivo = open(self.ruta, 'a', encoding='utf-8')
+        self._archivo.write(json.dumps(reserva_a_dict(reserva), ensure_ascii=False) + "\n")
+        self._archivo.flush()
+        if self.durabilidad == 'completa':
+            os.fsync(self._archivo.fileno())
+
+    def compactar(self, reservas):
+        """Reescribe el archivo solo con las reservas indicadas (temporal + rename)"""
+        self.cerrar()
+        if not os.path.exists(self.ruta):
+            return
+        temporal = self.ruta + SUFIJO_TEMPORAL
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            archivo.write(''.join(json.dumps(reserva_a_dict(reserva), ensure_ascii=False) + "\n" for reserva in reservas))
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, self.ruta)
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+
+# ==================== OPERACIONES EN LOTE ====================
+class ResultadoLote:
+    """
+    Informe de un préstamo o devolución en lote: un ítem por elemento
+    pedido, con su error de validación o el préstamo resultante. El lote
+    se aplica solo si ningún ítem tiene error
+    """
+    def __init__(self):
+        # Cada ítem es [elemento, error o None, préstamo o None]
+        self.items = []
+        self.aplicado = False
+        self.segundos = 0.0
+
+    def agregar(self, elemento, error=None):
+        self.items.append([elemento, error, None])
+
+    def confirmar(self, indice, prestamo):
+        self.items[indice][2] = prestamo
+        self.aplicado = True
+
+    @property
+    def fallidos(self):
+        return sum(1 for _, error, _ in self.items if error)
+
+    def estado(self, indice):
+        """Texto del resultado de un ítem"""
+        _, error, _ = self.items[indice]
+        if error:
+            return f"rechazado: {error}"
+        return "aplicado" if self.aplicado else "no aplicado (el lote tiene ítems rechazados)"
+
+    def __str__(self):
+        if self.aplicado:
+            return f"Lote aplicado: {len(self.items)} ítem(s) en {self.segundos:.2f}s"
+        return f"Lote NO aplicado: {self.fallidos} de {len(self.items)} ítem(s) rechazado(s)"
+
+
+# ==================== ESTADÍSTICAS DE CIRCULACIÓN ====================
+DIAS_SEMANA = ('Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom')
+
+
+class AnaliticaPrestamos:
+    """
+    Estadísticas del historial de préstamos calculadas sobre columnas (arrays
+    de enteros) en pasadas que corren en C: Counter y sum sobre map/compress,
+    sin un objeto por préstamo. Los conteos base (por libro, por usuario,
+    por tramo horario, duración) se actualizan en el acto con cada préstamo
+    o devolución; las vistas derivadas (rankings, mapas de calor, actividad)
+    se guardan hasta que un cambio las invalida
+    """
+    # Vistas derivadas que quedan obsoletas al cambiar cada conteo base
+    DEPENDENCIAS = {
+        'por_libro': ('titulos', 'autores'),
+        'por_usuario': ('actividad',),
+        'por_tramo': ('dias', 'semanas', 'mapa_calor'),
+        'ultimo': ('actividad',),
+        'duracion': (),
+    }
+
+    def __init__(self, biblio):
+        self.biblio = biblio
+        self.usuarios = array('l')
+        self.libros = array('l')
+        self.fechas_prestamo = array('q')
+        # -1 mientras el préstamo sigue abierto
+        self.fechas_devolucion = array('q')
+        self._textos = []
+        self._codigos = {}
+        # Fila de cada préstamo abierto, para cerrarla al devolverlo
+        self._abiertos = {}
+        self._cache = {}
+        self._bloqueo = threading.RLock()
+
+    def __len__(self):
+        return len(self.fechas_prestamo)
+
+    def _codificar(self, texto):
+        codigo = self._codigos.get(texto)
+        if codigo is None:
+            codigo = self._codigos[texto] = len(self._textos)
+            self._textos.append(texto)
+        return codigo
+
+    def _en_cache(self, nombre, calcular):
+        with self._bloqueo:
+            if nombre not in self._cache:
+                self._cache[nombre] = calcular()
+            return self._cache[nombre]
+
+    def invalidar(self, *nombres):
+        """Descarta las vistas indicadas (todas si no se indica ninguna)"""
+        with self._bloqueo:
+            if not nombres:
+                self._cache.clear()
+            for nombre in nombres:
+                self._cache.pop(nombre, None)
+
+    def agregar(self, clave, id_usuario, id_libro, fecha_prestamo, fecha_devolucion=None):
+        """Agrega un préstamo (fechas en segundos desde la época) y actualiza los conteos"""
+        with self._bloqueo:
+            if clave in self._abiertos:
+                return
+            usuario = self._codificar(id_usuario)
+            libro = self._codificar(id_libro)
+            if fecha_devolucion is None:
+                self._abiertos[clave] = len(self.fechas_prestamo)
+            self.usuarios.append(usuario)
+            self.libros.append(libro)
+            self.fechas_prestamo.append(fecha_prestamo)
+            self.fechas_devolucion.append(-1 if fecha_devolucion is None else fecha_devolucion)
+
+            cache = self._cache
+            if 'por_libro' in cache:
+                cache['por_libro'][libro] += 1
+            if 'por_usuario' in cache:
+                cache['por_usuario'][usuario] += 1
+            if 'por_tramo' in cache:
+                cache['por_tramo'][fecha_prestamo // SEGUNDOS_POR_TRAMO] += 1
+            if 'ultimo' in cache and fecha_prestamo > cache['ultimo'].get(usuario, -1):
+                cache['ultimo'][usuario] = fecha_prestamo
+            self.invalidar(*itertools.chain.from_iterable(
+                self.DEPENDENCIAS[base] for base in ('por_libro', 'por_usuario', 'por_tramo')))
+
+    def cerrar(self, clave, fecha_devolucion):
+        """Marca como devuelto un préstamo abierto"""
+        with self._bloqueo:
+            fila = self._abiertos.pop(clave, None)
+            if fila is None:
+                return
+            self.fechas_devolucion[fila] = fecha_devolucion
+            if 'duracion' in self._cache:
+                suma, cantidad = self._cache['duracion']
+                self._cache['duracion'] = (suma + fecha_devolucion - self.fechas_prestamo[fila], cantidad + 1)
+            # Los préstamos activos de cada usuario forman parte de su actividad
+            self.invalidar('actividad')
+
+    # ----- Conteos base (una pasada vectorizada sobre las columnas) -----
+
+    def _por_libro(self):
+        return self._en_cache('por_libro', lambda: collections.Counter(self.libros))
+
+    def _por_usuario(self):
+        return self._en_cache('por_usuario', lambda: collections.Counter(self.usuarios))
+
+    def _por_tramo(self):
+        return self._en_cache('por_tramo', lambda: collections.Counter(
+            map(operator.floordiv, self.fechas_prestamo, itertools.repeat(SEGUNDOS_POR_TRAMO))))
+
+    def _ultimo(self):
+        def calcular():
+            # Orden por fecha de préstamo: el último valor escrito de cada usuario es su máximo
+            orden = sorted(range(len(self.fechas_prestamo)), key=self.fechas_prestamo.__getitem__)
+            return dict(zip(map(self.usuarios.__getitem__, orden), map(self.fechas_prestamo.__getitem__, orden)))
+        return self._en_cache('ultimo', calcular)
+
+    def _duracion(self):
+        def calcular():
+            devueltos = list(map((0).__le__, self.fechas_devolucion))
+            return (sum(itertools.compress(self.fechas_devolucion, devueltos))
+                    - sum(itertools.compress(self.fechas_prestamo, devueltos)), sum(devueltos))
+        return self._en_cache('duracion', calcular)
+
+    # ----- Vistas -----
+
+    def _ranking(self, nombre, agrupar, limite):
+        def calcular():
+            conteo = collections.Counter()
+            libros = self.biblio.libros
+            for codigo, cantidad in self._por_libro().items():
+                libro = libros.get(self._textos[codigo])
+                if libro is not None:
+                    conteo[agrupar(libro)] += cantidad
+            return conteo.most_common()
+        return self._en_cache(nombre, calcular)[:limite]
+
+    def top_titulos(self, limite=TOP_ESTADISTICAS):
+        """
+        Títulos más prestados como [((título, ISBN), préstamos)], sumando los
+        préstamos de todos sus ejemplares
+        """
+        libros_titulo = self.biblio.titulos
+
+        def agrupar(libro):
+            titulo = libros_titulo.get(clave_titulo(libro))
+            return (libro.titulo, titulo.isbn if titulo is not None else libro.isbn)
+        return self._ranking('titulos', agrupar, limite)
+
+    def top_autores(self, limite=TOP_ESTADISTICAS):
+        """Autores más prestados como [(autor, préstamos)]"""
+        return self._ranking('autores', operator.attrgetter('autor'), limite)
+
+    def _por_hora_local(self, nombre, agrupar):
+        def calcular():
+            conteo = collections.Counter()
+            for tramo, cantidad in self._por_tramo().items():
+                conteo[agrupar(datetime.fromtimestamp(tramo * SEGUNDOS_POR_TRAMO))] += cantidad
+            return dict(sorted(conteo.items()))
+        return self._en_cache(nombre, calcular)
+
+    def prestamos_por_dia(self):
+        """Préstamos por fecha: {date: cantidad} en orden cronológico"""
+        return self._por_hora_local('dias', datetime.date)
+
+    def prestamos_por_semana(self):
+        """Préstamos por semana ISO: {(año, semana): cantidad} en orden cronológico"""
+        return self._por_hora_local('semanas', lambda fecha: tuple(fecha.isocalendar())[:2])
+
+    def mapa_calor(self):
+        """Préstamos por día de la semana y hora: matriz 7 x 24 (lunes = fila 0)"""
+        def calcular():
+            matriz = [[0] * 24 for _ in DIAS_SEMANA]
+            for tramo, cantidad in self._por_tramo().items():
+                fecha = datetime.fromtimestamp(tramo * SEGUNDOS_POR_TRAMO)
+                matriz[fecha.weekday()][fecha.hour] += cantidad
+            return matriz
+        return self._en_cache('mapa_calor', calcular)
+
+    def duracion_promedio(self):
+        """Duración media de los préstamos devueltos (timedelta) y cuántos son; (None, 0) sin devoluciones"""
+        suma, cantidad = self._duracion()
+        return (timedelta(seconds=suma / cantidad) if cantidad else None), cantidad
+
+    def actividad_usuarios(self, limite=None):
+        """
+        Actividad por usuario, de más a menos préstamos, como
+        [(usuario, préstamos, activos, fecha del último préstamo)]
+        """
+        def calcular():
+            usuarios = self.biblio.usuarios
+            ultimo = self._ultimo()
+            actividad = []
+            for codigo, cantidad in self._por_usuario().most_common():
+                usuario = usuarios.get(self._textos[codigo])
+                if usuario is not None:
+                    actividad.append((usuario, cantidad, len(usuario.prestamos), epoca_a_fecha(ultimo.get(codigo))))
+            return actividad
+        return self._en_cache('actividad', calcular)[:limite]
+
+
+# ==================== RECARGA EN CALIENTE ====================
+COLECCIONES = {'libros': 'Libros', 'usuarios': 'Usuarios', 'prestamos': 'Préstamos'}
+ACCIONES_RECARGA = ('agregados', 'modificados', 'eliminados')
+
+
+class VigilanteCarpetas:
+    """
+    Detecta los archivos agregados, modificados o eliminados en las carpetas
+    de cada colección. De cada carpeta (y fragmento) se recuerda su mtime y
+    la firma (mtime en ns, tamaño) de sus archivos: una revisión hace un
+    stat por carpeta y solo lista los archivos de las carpetas cuyo mtime
+    cambió (alta, baja o reemplazo atómico de un archivo). Editar un archivo
+    en su lugar no cambia el mtime de su carpeta, así que además cada
+    intervalo_completo segundos se revisan todos los archivos
+    """
+    # Un mtime de carpeta más reciente que esto no es confiable (la
+    # resolución del reloj del sistema de archivos puede ocultar un cambio
+    # hecho justo después de listarla): la carpeta se vuelve a listar
+    MARGEN_MTIME_NS = 1_000_000_000
+
+    def __init__(self, carpetas, intervalo_completo=INTERVALO_REVISION_COMPLETA):
+        self.carpetas = carpetas
+        self.intervalo_completo = intervalo_completo
+        # Por colección: {subcarpeta relativa: [mtime_ns o None, {archivo: firma}, subcarpetas]}
+        self.vistas = {}
+        for coleccion in carpetas:
+            self.reiniciar(coleccion)
+        self._ultima_completa = time.monotonic()
+
+    @staticmethod
+    def _listar(carpeta, relativa):
+        """Firmas de los .txt y subcarpetas visibles de una subcarpeta"""
+        firmas, subcarpetas = {}, []
+        with os.scandir(carpeta + relativa) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    if not entrada.name.startswith('.'):
+                        subcarpetas.append(relativa + entrada.name + '/')
+                elif entrada.name.endswith(EXTENSION):
+                    try:
+                        estado = entrada.stat()
+                    except FileNotFoundError:
+                        continue
+                    firmas[relativa + entrada.name] = (estado.st_mtime_ns, estado.st_size)
+        return firmas, subcarpetas
+
+    def _revisar(self, coleccion, completa, agregados, modificados, eliminados):
+        carpeta = self.carpetas[coleccion]
+        anteriores = self.vistas[coleccion]
+        actuales = {}
+        pendientes = ['']
+        while pendientes:
+            relativa = pendientes.pop()
+            vista = anteriores.get(relativa)
+            try:
+                mtime = os.stat(carpeta + relativa).st_mtime_ns
+                if not completa and vista is not None and vista[0] == mtime:
+                    actuales[relativa] = vista
+                    pendientes.extend(vista[2])
+                    continue
+                firmas, subcarpetas = self._listar(carpeta, relativa)
+            except FileNotFoundError:
+                continue
+            previas = vista[1] if vista is not None else {}
+            for archivo, firma in firmas.items():
+                if archivo not in previas:
+                    agregados.append(archivo)
+                elif previas[archivo] != firma:
+                    modificados.append(archivo)
+            eliminados.extend(archivo for archivo in previas if archivo not in firmas)
+            if time.time_ns() - mtime < self.MARGEN_MTIME_NS:
+                mtime = None
+            actuales[relativa] = [mtime, firmas, subcarpetas]
+            pendientes.extend(subcarpetas)
+        # Carpetas que desaparecieron con todos sus archivos
+        for relativa, vista in anteriores.items():
+            if relativa not in actuales:
+                eliminados.extend(vista[1])
+        self.vistas[coleccion] = actuales
+
+    def detectar(self):
+        """
+        Devuelve {colección: (agregados, modificados, eliminados)} con las
+        rutas relativas de los archivos que cambiaron desde la revisión anterior
+        """
+        completa = time.monotonic() - self._ultima_completa >= self.intervalo_completo
+        if completa:
+            self._ultima_completa = time.monotonic()
+        cambios = {}
+        for coleccion in self.carpetas:
+            cambios[coleccion] = ([], [], [])
+            self._revisar(coleccion, completa, *cambios[coleccion])
+        return cambios
+
+    def reintentar(self, coleccion, archivo):
+        """
+        Marca para releer en la próxima revisión un archivo que no se pudo
+        leer (p. ej. a medio escribir); sigue siendo conocido, así que
+        volverá como modificado. Devuelve False si el archivo ya no existe
+        """
+        existe = os.path.exists(self.carpetas[coleccion] + archivo)
+        vista = self.vistas[coleccion].get(archivo[:archivo.rfind('/') + 1])
+        if vista is not None:
+            vista[0] = None
+            if existe:
+                vista[1][archivo] = None
+            else:
+                vista[1].pop(archivo, None)
+        return existe
+
+    def reiniciar(self, coleccion):
+        """Toma como punto de partida el estado actual de una carpeta"""
+        self.vistas[coleccion] = {}
+        self._revisar(coleccion, True, [], [], [])
+
+
+class ResultadoRecarga:
+    """
+    Resumen de una recarga en caliente: registros agregados, modificados y
+    eliminados por colección y cambios que no se pudieron aplicar
+    """
+    def __init__(self):
+        self.cambios = collections.Counter()
+        self.conflictos = []
+        self.segundos = 0.0
+
+    def anotar(self, coleccion, accion):
+        self.cambios[coleccion, accion] += 1
+
+    def conflicto(self, motivo):
+        self.conflictos.append(motivo)
+
+    def __bool__(self):
+        return bool(self.cambios or self.conflictos)
+
+    def __str__(self):
+        partes = []
+        for coleccion, etiqueta in COLECCIONES.items():
+            agregados, modificados, eliminados = (self.cambios[coleccion, accion] for accion in ACCIONES_RECARGA)
+            if agregados or modificados or eliminados:
+                partes.append(f"{etiqueta}: +{agregados} ~{modificados} -{eliminados}")
+        if self.conflictos:
+            partes.append(f"Conflictos: {len(self.conflictos)}")
+        return " | ".join(partes or ["Sin cambios"]) + f" ({self.segundos:.3f}s)"
+
+
+# ==================== CLASE BIBLIOTECA ====================
+class Biblioteca:
+    """
+    Clase principal que gestiona la biblioteca completa
+    """
+    def __init__(self, almacenamiento=None, historial_diferido=HISTORIAL_DIFERIDO,
+                 historial_columnar=HISTORIAL_COLUMNAR, instrumentacion=None, dias_prestamo=DIAS_PRESTAMO):
+        self.libros = {}
+        self.usuarios = {}
+        self.prestamos = []
+        # Préstamos abiertos indexados por ID de libro (devolución en O(1))
+        self.prestamos_activos = {}
+        # Préstamos abiertos ordenados por vencimiento como (vencimiento, id_libro):
+        # los vencidos son un prefijo y los por vencer un tramo (búsqueda binaria)
+        self.dias_prestamo = dias_prestamo
+        self._por_vencer = []
+        # Historial en memoria por ID de usuario (modo normal) y contadores
+        # que se mantienen en cada préstamo/devolución en lugar de recontarse
+        self.prestamos_por_usuario = {}
+        self.total_prestamos = 0
+        self.libros_prestados = 0
+        self._bloqueo_contadores = threading.Lock()
+        # Último listado de préstamos filtrado/ordenado (firma, versión, resultado);
+        # la versión cambia con cada préstamo, devolución o borrado del historial
+        self._version_historial = 0
+        self._listado_en_cache = None
+        self.almacenamiento = almacenamiento or crear_almacenamiento()
+        # En modo diferido self.prestamos solo contiene los préstamos activos
+        # y los creados en esta sesión; el resto se lee con iterar_historial()
+        self.historial_diferido = historial_diferido
+        # Con historial columnar los préstamos devueltos se guardan en arrays y
+        # los abiertos viven en prestamos_en_curso (por clave) en vez de en
+        # self.prestamos (no aplica en modo diferido, que no los retiene)
+        self.historial = HistorialColumnar() if historial_columnar and not historial_diferido else None
+        self.prestamos_en_curso = {}
+        # Títulos por ISBN normalizado, con sus ejemplares libres
+        self.titulos = {}
+        # Reservas vivas por clave y por (usuario, título); lista de espera de
+        # cada título como heap (-prioridad, fecha, secuencia, reserva) con
+        # borrado diferido; ejemplares apartados y heap de vencimientos
+        self.reservas = {}
+        self._reserva_de = {}
+        self.listas_espera = {}
+        self.apartados = {}
+        self._vencimientos = []
+        self._secuencia_reservas = itertools.count()
+        self._bloqueo_reservas = threading.RLock()
+        self.diario_reservas = DiarioReservas(durabilidad=getattr(self.almacenamiento, 'durabilidad', DURABILIDAD))
+        # Índices secundarios (se mantienen sincronizados con el CRUD)
+        self.indice_rut = {}
+        self.indice_correo = {}
+        self.indice_titulos = IndiceTexto()
+        self.indice_autores = IndiceTexto()
+        # Índice de texto libre: se arma en la primera búsqueda para no
+        # alargar la carga inicial y desde ahí se mantiene en cada alta,
+        # edición y baja
+        self.indice_texto = None
+        # Estadísticas de circulación: también se arman en la primera consulta
+        # y luego se actualizan con cada préstamo y devolución
+        self.analitica = None
+        # Vigilante de las carpetas del motor de texto (recarga en caliente) y
+        # claves de préstamos cuyo archivo apareció pero aún no se pudo leer
+        # (no están en memoria ni en total_prestamos)
+        self.vigilante = None
+        self._prestamos_sin_leer = set()
+        # Instrumentación opcional (se activa antes de la carga para medirla)
+        self.instrumentacion = instrumentacion
+        if instrumentacion is not None:
+            instrumentacion.instrumentar(self, 'Biblioteca')
+            instrumentacion.instrumentar(self.almacenamiento, 'almacenamiento')
+        self.cargar_datos()
+
+    # ==================== CRUD DE LIBROS ====================
+
+    def agregar_libro(self, id_libro, titulo, autor, editorial, fecha_publicacion, isbn):
+        """
+        Crear - Agrega un nuevo libro a la biblioteca
+        """
+        if id_libro in self.libros:
+            raise IdDuplicado("El ID del libro ya existe.")
+
+        libro = Libro(id_libro, titulo, autor, editorial, fecha_publicacion, isbn)
+        self.libros[id_libro] = libro
+        self._indexar_libro(libro)
+        self.guardar_libro(id_libro, titulo, autor, editorial, fecha_publicacion, isbn)
+        # Un ejemplar nuevo de un título con lista de espera se aparta al primero
+        if clave_titulo(libro) in self.listas_espera:
+            self._asignar_siguiente(libro)
+        return libro
+
+    def buscar_titulo(self, isbn):
+        """
+        Leer - Devuelve el título (con sus ejemplares) del ISBN indicado
+        """
+        titulo = self.titulos.get(normalizar_isbn(isbn))
+        if titulo is None:
+            raise LibroNoEncontrado(isbn)
+        return titulo
+
+    def disponibilidad(self, isbn):
+        """
+        Leer - Devuelve (ejemplares disponibles, ejemplares totales) de un título en O(1)
+        """
+        titulo = self.buscar_titulo(isbn)
+        return titulo.disponibles, titulo.total
+
+    def agregar_ejemplares(self, isbn, cantidad=1):
+        """
+        Crear - Agrega ejemplares a un título existente copiando sus datos.
+        Cada ejemplar recibe el ID <primer ejemplar>-E<n>. Devuelve los libros creados
+        """
+        titulo = self.buscar_titulo(isbn)
+        modelo = min(titulo.ejemplares, key=operator.attrgetter('id_libro'))
+        base = modelo.id_libro.split('-E')[0]
+        nuevos = []
+        numero = titulo.total
+        while len(nuevos) < cantidad:
+            numero += 1
+            id_libro = f"{base}-E{numero:02d}"
+            if id_libro not in self.libros:
+                nuevos.append(self.agregar_libro(id_libro, modelo.titulo, modelo.autor, modelo.editorial,
+                                                 modelo.fecha_publicacion, modelo.isbn))
+        return nuevos
+
+    def agrupar_ejemplares(self):
+        """
+        Migra el catálogo al modelo de títulos y ejemplares: agrupa los libros
+        por ISBN y los ejemplares de un mismo título toman los datos del de
+        menor ID (los que difieren se corrigen y se guardan en una sola
+        transacción). Devuelve (títulos, ejemplares, ejemplares corregidos)
+        """
+        corregidos = []
+        for titulo in list(self.titulos.values()):
+            modelo = min(titulo.ejemplares, key=operator.attrgetter('id_libro'))
+            datos = (modelo.titulo, modelo.autor, modelo.editorial, modelo.fecha_publicacion, modelo.isbn)
+            for libro in titulo.ejemplares:
+                if (libro.titulo, libro.autor, libro.editorial, libro.fecha_publicacion, libro.isbn) != datos:
+                    corregidos.append((libro, datos))
+
+        with self.almacenamiento.transaccion():
+            for libro, (titulo, autor, editorial, fecha_publicacion, isbn) in corregidos:
+                self._desindexar_libro(libro)
+                libro.titulo = titulo
+                libro.autor = autor
+                libro.editorial = editorial
+                libro.fecha_publicacion = fecha_publicacion
+                libro.isbn = isbn
+                self._indexar_libro(libro)
+                self.actualizar_libro(libro)
+        return len(self.titulos), len(self.libros), len(corregidos)
+
+    def buscar_libro(self, id_libro):
+        """
+        Leer - Devuelve un libro por su ID
+        """
+        if id_libro not in self.libros:
+            raise LibroNoEncontrado(id_libro)
+        return self.libros[id_libro]
+
+    def editar_libro(self, id_libro, titulo=None, autor=None, editorial=None, fecha_publicacion=None, isbn=None):
+        """
+        Actualizar - Modifica los datos indicados de un libro (los vacíos se mantienen)
+        """
+        libro = self.buscar_libro(id_libro)
+        if isbn and not self._puede_cambiar_titulo(libro, isbn):
+            raise LibroPrestado("No se puede cambiar el ISBN de un ejemplar prestado, apartado "
+                                "o cuyo título tiene lista de espera.")
+
+        self._desindexar_libro(libro)
+        if titulo:
+            libro.titulo = titulo
+        if autor:
+            libro.autor = autor
+        if editorial:
+            libro.editorial = editorial
+        if fecha_publicacion:
+            libro.fecha_publicacion = fecha_publicacion
+        if isbn:
+            libro.isbn = isbn
+        self._indexar_libro(libro)
+
+        self.actualizar_libro(libro)
+        return libro
+
+    def _puede_cambiar_titulo(self, libro, isbn):
+        """
+        Un ejemplar solo pasa a otro título (ISBN) si no está prestado ni
+        apartado y su título no tiene lista de espera: las reservas y la
+        lista se guardan bajo el ISBN anterior y quedarían huérfanas
+        """
+        clave = clave_titulo(libro)
+        if (normalizar_isbn(isbn) or f"#{libro.id_libro}") == clave:
+            return True
+        return (libro.id_libro not in self.prestamos_activos and libro.id_libro not in self.apartados
+                and not self.listas_espera.get(clave))
+
+    def eliminar_libro(self, id_libro):
+        """
+        Eliminar - Elimina un libro de la biblioteca
+        """
+        libro = self.buscar_libro(id_libro)
+
+        if not libro.disponible:
+            raise LibroPrestado("No se puede eliminar un libro que está prestado.\n   Por favor, espere a que sea devuelto.")
+        if id_libro in self.apartados:
+            raise LibroPrestado("No se puede eliminar un libro apartado para una reserva.")
+
+        try:
+            self.almacenamiento.eliminar_libro(id_libro)
+        except OSError as e:
+            raise ErrorAlmacenamiento(f"Error al eliminar el archivo: {e}") from e
+
+        del self.libros[id_libro]
+        self._desindexar_libro(libro)
+        return libro
+
+    # ==================== CRUD DE USUARIOS ====================
+
+    def registrar_usuario(self, id_usuario, nombre, rut, correo, telefono, direccion):
+        """
+        Crear - Registra un nuevo usuario en la biblioteca
+        """
+        if id_usuario in self.usuarios:
+            raise IdDuplicado("El ID del usuario ya existe.")
+
+        usuario = Usuario(id_usuario, nombre, rut, correo, telefono, direccion)
+        self.usuarios[id_usuario] = usuario
+        self._indexar_usuario(usuario)
+        self.guardar_usuario(id_usuario, nombre, rut, correo, telefono, direccion)
+        return usuario
+
+    def buscar_usuario(self, id_usuario):
+        """
+        Leer - Devuelve un usuario por su ID
+        """
+        if id_usuario not in self.usuarios:
+            raise UsuarioNoEncontrado(id_usuario)
+        return self.usuarios[id_usuario]
+
+    def editar_usuario(self, id_usuario, nombre=None, rut=None, correo=None, telefono=None, direccion=None):
+        """
+        Actualizar - Modifica los datos indicados de un usuario (los vacíos se mantienen)
+        """
+        usuario = self.buscar_usuario(id_usuario)
+
+        self._desindexar_usuario(usuario)
+        if nombre:
+            usuario.nombre = nombre
+        if rut:
+            usuario.rut = rut
+        if correo:
+            usuario.correo = correo
+        if telefono:
+            usuario.telefono = telefono
+        if direccion:
+            usuario.direccion = direccion
+        self._indexar_usuario(usuario)
+
+        self.guardar_usuario(id_usuario, usuario.nombre, usuario.rut, usuario.correo, usuario.telefono, usuario.direccion)
+        return usuario
+
+    def eliminar_usuario(self, id_usuario):
+        """
+        Eliminar - Elimina un usuario de la biblioteca
+        """
+        usuario = self.buscar_usuario(id_usuario)
+
+        if len(usuario.prestamos) > 0:
+            raise UsuarioConPrestamos(
+                "No se puede eliminar un usuario con préstamos activos.\n"
+                f"   El usuario tiene {len(usuario.prestamos)} libro(s) prestado(s).")
+
+        try:
+            self.almacenamiento.eliminar_usuario(id_usuario)
+        except OSError as e:
+            raise ErrorAlmacenamiento(f"Error al eliminar el archivo: {e}") from e
+
+        for reserva in self.reservas_de_usuario(id_usuario):
+            self.cancelar_reserva(reserva.clave)
+        del self.usuarios[id_usuario]
+        self._desindexar_usuario(usuario)
+        return usuario
+
+    # ==================== BÚSQUEDAS POR ÍNDICES ====================
+
+    def _indexar_libro(self, libro):
+        """Agrega un libro a los índices secundarios"""
+        clave = clave_titulo(libro)
+        titulo = self.titulos.get(clave)
+        if titulo is None:
+            titulo = self.titulos[clave] = Titulo(clave)
+        titulo.agregar(libro)
+        self.indice_titulos.agregar(libro.id_libro, libro.titulo)
+        self.indice_autores.agregar(libro.id_libro, libro.autor)
+        if self.indice_texto is not None:
+            self.indice_texto.agregar(libro.id_libro, libro)
+        if self.analitica is not None:
+            self.analitica.invalidar('titulos', 'autores')
+
+    def _desindexar_libro(self, libro):
+        """Quita un libro de los índices secundarios"""
+        clave = clave_titulo(libro)
+        titulo = self.titulos.get(clave)
+        if titulo is not None:
+            titulo.quitar(libro)
+            if not titulo.ejemplares:
+                del self.titulos[clave]
+        self.indice_titulos.quitar(libro.id_libro, libro.titulo)
+        self.indice_autores.quitar(libro.id_libro, libro.autor)
+        if self.indice_texto is not None:
+            self.indice_texto.quitar(libro.id_libro, libro)
+
+    def _indexar_usuario(self, usuario):
+        """Agrega un usuario a los índices secundarios"""
+        agregar_a_indice(self.indice_rut, normalizar_rut(usuario.rut), usuario.id_usuario)
+        agregar_a_indice(self.indice_correo, usuario.correo.strip().lower(), usuario.id_usuario)
+
+    def _desindexar_usuario(self, usuario):
+        """Quita un usuario de los índices secundarios"""
+        quitar_de_indice(self.indice_rut, normalizar_rut(usuario.rut), usuario.id_usuario)
+        quitar_de_indice(self.indice_correo, usuario.correo.strip().lower(), usuario.id_usuario)
+        if self.analitica is not None:
+            self.analitica.invalidar('actividad')
+
+    def _libros_ordenados(self, ids):
+        return [self.libros[id_libro] for id_libro in sorted(ids)]
+
+    def buscar_libros_por_isbn(self, isbn):
+        """
+        Leer - Devuelve los libros (ejemplares) con el ISBN indicado
+        """
+        titulo = self.titulos.get(normalizar_isbn(isbn))
+        return sorted(titulo.ejemplares, key=operator.attrgetter('id_libro')) if titulo else []
+
+    def buscar_libros_por_titulo(self, consulta):
+        """
+        Leer - Devuelve los libros cuyo título contiene las palabras de la consulta
+        """
+        return self._libros_ordenados(self.indice_titulos.buscar(consulta))
+
+    def buscar_libros_por_autor(self, consulta):
+        """
+        Leer - Devuelve los libros cuyo autor contiene las palabras de la consulta
+        """
+        return self._libros_ordenados(self.indice_autores.buscar(consulta))
+
+    def buscar_libros_por_texto(self, consulta, limite=RESULTADOS_BUSQUEDA):
+        """
+        Leer - Busca la consulta en título, autor y editorial sin distinguir
+        tildes y tolerando errores de tipeo. Devuelve pares (libro, puntaje)
+        del más al menos relevante
+        """
+        if self.indice_texto is None:
+            indice = IndiceDifuso()
+            for libro in list(self.libros.values()):
+                indice.agregar(libro.id_libro, libro)
+            self.indice_texto = indice
+        return [(self.libros[id_libro], puntaje) for id_libro, puntaje in self.indice_texto.buscar(consulta, limite)]
+
+    def buscar_usuario_por_rut(self, rut):
+        """
+        Leer - Devuelve el usuario con el RUT indicado (o None)
+        """
+        ids = self.indice_rut.get(normalizar_rut(rut))
+        return self.usuarios[min(ids)] if ids else None
+
+    def buscar_usuario_por_correo(self, correo):
+        """
+        Leer - Devuelve el usuario con el correo indicado (o None)
+        """
+        ids = self.indice_correo.get(correo.strip().lower())
+        return self.usuarios[min(ids)] if ids else None
+
+    # ==================== GESTIÓN DE PRÉSTAMOS ====================
+
+    def prestar_libro(self, id_usuario, id_libro):
+        """
+        Registra un préstamo de libro a un usuario y lo devuelve
+        """
+        self.procesar_vencimientos()
+        return self._confirmar_prestamos([self._validar_prestamo(id_usuario, id_libro)])[0]
+
+    def _validar_prestamo(self, id_usuario, id_libro, en_lote=()):
+        """
+        Comprueba que el préstamo se puede hacer y devuelve (usuario, libro).
+        en_lote son los IDs de libro ya tomados por el mismo lote
+        """
+        usuario = self.buscar_usuario(id_usuario)
+        libro = self.buscar_libro(id_libro)
+
+        if not libro.disponible or id_libro in en_lote:
+            raise LibroPrestado("El libro ya está prestado.")
+        apartado = self.apartados.get(id_libro)
+        if apartado is not None and apartado.usuario is not usuario:
+            raise LibroPrestado("El libro está apartado para otro usuario que lo reservó.")
+        return usuario, libro
+
+    def _confirmar_prestamos(self, validados):
+        """
+        Registra los préstamos de pares (usuario, libro) ya validados: los
+        libros se marcan como prestados y todo se guarda en una sola
+        transacción; si falla, los libros vuelven a quedar disponibles y no
+        se registra ninguno. Devuelve los préstamos creados
+        """
+        prestamos = [Prestamo(usuario, libro, dias=self.dias_prestamo) for usuario, libro in validados]
+        for prestamo in prestamos:
+            prestamo.libro.disponible = False
+        try:
+            with self.almacenamiento.transaccion():
+                for prestamo in prestamos:
+                    self.guardar_prestamo(prestamo)
+                    self.actualizar_libro(prestamo.libro)
+        except BaseException:
+            for prestamo in prestamos:
+                prestamo.libro.disponible = True
+            raise
+
+        for prestamo in prestamos:
+            self._registrar_prestamo(prestamo)
+        return prestamos
+
+    def _registrar_prestamo(self, prestamo):
+        """Incorpora a la memoria (índices, contadores, reservas) un préstamo ya guardado"""
+        usuario, libro = prestamo.usuario, prestamo.libro
+        id_usuario, id_libro = usuario.id_usuario, libro.id_libro
+        self.titulos[clave_titulo(libro)].libres.discard(libro)
+        usuario.prestamos.add(prestamo)
+        self.prestamos_activos[id_libro] = prestamo
+        self._retener_prestamo(prestamo)
+        if self.historial is None and not self.historial_diferido:
+            self.prestamos_por_usuario.setdefault(id_usuario, []).append(prestamo)
+        with self._bloqueo_contadores:
+            self.total_prestamos += 1
+            self.libros_prestados += 1
+            self._version_historial += 1
+            bisect.insort(self._por_vencer, (prestamo._fecha_vencimiento, id_libro))
+            if self.analitica is not None:
+                self.analitica.agregar(prestamo.clave, id_usuario, id_libro, prestamo._fecha_prestamo)
+        
+        # Si el usuario tenía una reserva del título, queda cumplida
+        reserva = self._reserva_de.get((id_usuario, clave_titulo(libro)))
+        if reserva is not None:
+            apartado = reserva.libro
+            self._terminar_reserva(reserva, CUMPLIDA)
+            if apartado is not None and apartado is not libro:
+                self._asignar_siguiente(apartado)
+
+    def prestar_ejemplar(self, id_usuario, isbn, prestar=None):
+        """
+        Presta un ejemplar libre cualquiera del título con ese ISBN, tomado
+        de su lista de libres en O(1). prestar registra el préstamo de un
+        ejemplar por su ID (por defecto prestar_libro; el servicio
+        concurrente pasa la suya, que toma los candados)
+        """
+        prestar = prestar or self.prestar_libro
+        self.buscar_usuario(id_usuario)
+        titulo = self.buscar_titulo(isbn)
+        # Quien tiene un ejemplar apartado se lleva ese
+        reserva = self._reserva_de.get((id_usuario, titulo.isbn))
+        if reserva is not None and reserva.estado == ASIGNADA:
+            return prestar(id_usuario, reserva.libro.id_libro)
+        while True:
+            libro = titulo.asignar()
+            if libro is None:
+                raise LibroPrestado("No quedan ejemplares disponibles de este título.")
+            try:
+                return prestar(id_usuario, libro.id_libro)
+            except LibroPrestado:
+                # Otro mostrador lo prestó por su ID mientras tanto: se prueba con otro
+                continue
+            except Exception:
+                titulo.liberar(libro)
+                raise
+
+    def obtener_prestamo_activo(self, id_libro):
+        """
+        Devuelve el préstamo abierto de un libro prestado (None si el libro
+        figura como prestado pero no tiene registro de préstamo)
+        """
+        libro = self.buscar_libro(id_libro)
+        if libro.disponible:
+            raise LibroNoPrestado("Este libro no está prestado.")
+        return self.prestamos_activos.get(id_libro)
+
+    def devolver_libro(self, id_libro, estado_devolucion=None):
+        """
+        Registra la devolución de un libro con su estado. Devuelve el préstamo
+        cerrado (o None si el libro no tenía registro de préstamo)
+        """
+        prestamo = self._validar_devolucion(id_libro)
+        return self._confirmar_devoluciones([(self.libros[id_libro], prestamo, estado_devolucion)])[0]
+
+    def _validar_devolucion(self, id_libro, en_lote=()):
+        """
+        Comprueba que el libro está prestado (y no repetido en el lote) y
+        devuelve su préstamo abierto (None si no tiene registro de préstamo)
+        """
+        if id_libro in en_lote:
+            raise LibroNoPrestado("Este libro ya se devuelve en el mismo lote.")
+        return self.obtener_prestamo_activo(id_libro)
+
+    def _confirmar_devoluciones(self, validadas):
+        """
+        Registra devoluciones ya validadas como (libro, préstamo, estado): se
+        cierran los préstamos y todo se guarda en una sola transacción; si
+        falla, préstamos y libros quedan como estaban. Devuelve los préstamos cerrados
+        """
+        ahora = datetime.now()
+        for libro, prestamo, estado_devolucion in validadas:
+            if prestamo:
+                prestamo.fecha_devolucion = ahora
+                prestamo.estado_devolucion = estado_devolucion or "Sin observaciones"
+            libro.disponible = True
+        try:
+            with self.almacenamiento.transaccion():
+                for libro, prestamo, _ in validadas:
+                    if prestamo:
+                        self.actualizar_prestamo(prestamo)
+                    self.actualizar_libro(libro)
+        except BaseException:
+            for libro, prestamo, _ in validadas:
+                if prestamo:
+                    prestamo.fecha_devolucion = None
+                    prestamo.estado_devolucion = None
+                libro.disponible = False
+            raise
+
+        for libro, prestamo, _ in validadas:
+            self._registrar_devolucion(libro, prestamo)
+        return [prestamo for _, prestamo, _ in validadas]
+
+    def _registrar_devolucion(self, libro, prestamo_activo):
+        """Quita de la memoria (índices, contadores) un préstamo ya cerrado y guardado"""
+        id_libro = libro.id_libro
+        self.prestamos_activos.pop(id_libro, None)
+        if prestamo_activo:
+            prestamo_activo.usuario.prestamos.discard(prestamo_activo)
+        
+        # Pasa al primero de la lista de espera del título o vuelve a los libres
+        self._asignar_siguiente(libro)
+        with self._bloqueo_contadores:
+            self.libros_prestados -= 1
+            self._version_historial += 1
+            if prestamo_activo:
+                self._quitar_vencimiento(prestamo_activo)
+                if self.analitica is not None:
+                    self.analitica.cerrar(prestamo_activo.clave, prestamo_activo._fecha_devolucion)
+        
+        if prestamo_activo and self.historial is not None:
+            # Pasa de prestamos_en_curso (por clave, O(1)) a los arrays del historial
+            self.prestamos_en_curso.pop(prestamo_activo.clave, None)
+            self.historial.agregar(prestamo_activo.clave, prestamo_activo.usuario.id_usuario,
+                                   prestamo_activo.libro.id_libro, prestamo_activo._fecha_prestamo,
+                                   prestamo_activo._fecha_devolucion, prestamo_activo.estado_devolucion)
+
+    def _quitar_vencimiento(self, prestamo):
+        """Saca un préstamo del índice de vencimientos (con _bloqueo_contadores tomado)"""
+        entrada = (prestamo._fecha_vencimiento, prestamo.libro.id_libro)
+        posicion = bisect.bisect_left(self._por_vencer, entrada)
+        if posicion < len(self._por_vencer) and self._por_vencer[posicion] == entrada:
+            del self._por_vencer[posicion]
+
+    # ==================== OPERACIONES EN LOTE ====================
+
+    def prestar_lote(self, pares):
+        """
+        Presta en bloque una lista de pares (id_usuario, id_libro). Se validan
+        todos antes de tocar nada y se aplican todos o ninguno, con una sola
+        escritura confirmada. Devuelve un ResultadoLote con el detalle por ítem
+        """
+        resultado = ResultadoLote()
+        inicio = time.perf_counter()
+        self.procesar_vencimientos()
+        validados, en_lote = [], set()
+        for id_usuario, id_libro in pares:
+            try:
+                validados.append(self._validar_prestamo(id_usuario, id_libro, en_lote))
+                resultado.agregar((id_usuario, id_libro))
+            except ErrorBiblioteca as e:
+                resultado.agregar((id_usuario, id_libro), error=str(e))
+            en_lote.add(id_libro)
+
+        if validados and not resultado.fallidos:
+            for indice, prestamo in enumerate(self._confirmar_prestamos(validados)):
+                resultado.confirmar(indice, prestamo)
+        resultado.segundos = time.perf_counter() - inicio
+        return resultado
+
+    def devolver_lote(self, devoluciones):
+        """
+        Devuelve en bloque una lista de IDs de libro o de pares (id_libro,
+        estado_devolucion), todo o nada y con una sola escritura confirmada.
+        Devuelve un ResultadoLote con el detalle por ítem
+        """
+        resultado = ResultadoLote()
+        inicio = time.perf_counter()
+        validadas, en_lote = [], set()
+        for item in devoluciones:
+            id_libro, estado_devolucion = (item, None) if isinstance(item, str) else item
+            try:
+                prestamo = self._validar_devolucion(id_libro, en_lote)
+                validadas.append((self.libros[id_libro], prestamo, estado_devolucion))
+                resultado.agregar(id_libro)
+            except ErrorBiblioteca as e:
+                resultado.agregar(id_libro, error=str(e))
+            en_lote.add(id_libro)
+
+        if validadas and not resultado.fallidos:
+            for indice, prestamo in enumerate(self._confirmar_devoluciones(validadas)):
+                resultado.confirmar(indice, prestamo)
+        resultado.segundos = time.perf_counter() - inicio
+        return resultado
+
+    def _retener_prestamo(self, prestamo):
+        """Guarda en memoria un préstamo abierto o cargado según el modo del historial"""
+        if self.historial is not None:
+            self.prestamos_en_curso[prestamo.clave] = prestamo
+        else:
+            self.prestamos.append(prestamo)
+
+    # ==================== VENCIMIENTOS Y MULTAS ====================
+
+    def _prestamos_del_tramo(self, desde, hasta):
+        """Préstamos abiertos que vencen en [desde, hasta) (segundos desde la época)"""
+        with self._bloqueo_contadores:
+            inicio = bisect.bisect_left(self._por_vencer, (desde,)) if desde is not None else 0
+            fin = bisect.bisect_left(self._por_vencer, (hasta,), inicio)
+            tramo = self._por_vencer[inicio:fin]
+        return [self.prestamos_activos[id_libro] for _, id_libro in tramo if id_libro in self.prestamos_activos]
+
+    def prestamos_vencidos(self, ahora=None):
+        """
+        Préstamos abiertos cuyo vencimiento ya pasó, del más atrasado al más
+        reciente. Solo recorre los vencidos, no todos los préstamos abiertos
+        """
+        return self._prestamos_del_tramo(None, fecha_a_epoca(ahora or datetime.now()))
+
+    def prestamos_por_vencer(self, dias=DIAS_AVISO_VENCIMIENTO, ahora=None):
+        """
+        Préstamos abiertos que vencen dentro de los próximos días (aún no vencidos)
+        """
+        desde = fecha_a_epoca(ahora or datetime.now())
+        return self._prestamos_del_tramo(desde, desde + dias * SEGUNDOS_POR_DIA)
+
+    def multa(self, prestamo, hasta=None):
+        """
+        Devuelve (días de atraso, monto) de un préstamo a la fecha indicada
+        (por defecto su devolución o, si sigue abierto, ahora)
+        """
+        hasta = hasta or prestamo.fecha_devolucion or datetime.now()
+        atraso = dias_de_atraso(prestamo._fecha_vencimiento, fecha_a_epoca(hasta))
+        return atraso, atraso * MULTA_POR_DIA
+
+    def calcular_multas(self, ahora=None):
+        """
+        Multas acumuladas a la fecha por los préstamos vencidos y aún abiertos,
+        como lista de (préstamo, días de atraso, monto) y el total por usuario
+        """
+        ahora = ahora or datetime.now()
+        multas = []
+        por_usuario = collections.Counter()
+        for prestamo in self.prestamos_vencidos(ahora):
+            atraso, monto = self.multa(prestamo, ahora)
+            multas.append((prestamo, atraso, monto))
+            por_usuario[prestamo.usuario.id_usuario] += monto
+        return multas, por_usuario
+
+    # ==================== ESTADÍSTICAS DE CIRCULACIÓN ====================
+
+    def estadisticas(self):
+        """
+        Devuelve el motor de estadísticas del historial (AnaliticaPrestamos).
+        La primera llamada arma sus columnas en una pasada por el historial;
+        desde ahí cada préstamo y devolución lo mantiene al día
+        """
+        with self._bloqueo_contadores:
+            if self.analitica is None:
+                analitica = AnaliticaPrestamos(self)
+                for prestamo in self.iterar_historial():
+                    analitica.agregar(prestamo.clave, prestamo.usuario.id_usuario, prestamo.libro.id_libro,
+                                      prestamo._fecha_prestamo, prestamo._fecha_devolucion)
+                self.analitica = analitica
+            return self.analitica
+
+    # ==================== RESERVAS ====================
+
+    def reservar(self, id_usuario, id_libro_o_isbn, prioridad=0):
+        """
+        Pone al usuario en la lista de espera del título (por ID de un
+        ejemplar o por ISBN). Mayor prioridad atiende antes; a igual
+        prioridad, por orden de solicitud. O(log n). Devuelve la reserva
+        """
+        usuario = self.buscar_usuario(id_usuario)
+        if id_libro_o_isbn in self.libros:
+            titulo = self.titulos[clave_titulo(self.libros[id_libro_o_isbn])]
+        else:
+            titulo = self.buscar_titulo(id_libro_o_isbn)
+
+        with self._bloqueo_reservas:
+            self.procesar_vencimientos()
+            if titulo.disponibles:
+                raise ReservaInvalida("Hay ejemplares disponibles de este título: puede prestarse ahora.")
+            if (id_usuario, titulo.isbn) in self._reserva_de:
+                raise ReservaInvalida("El usuario ya tiene una reserva de este título.")
+
+            reserva = Reserva(usuario, titulo.isbn, prioridad)
+            self._registrar_reserva(reserva)
+            self._poner_en_espera(reserva)
+            self.diario_reservas.registrar(reserva)
+        return reserva
+
+    def cancelar_reserva(self, clave):
+        """
+        Cancela una reserva viva; si tenía un ejemplar apartado, pasa al
+        siguiente de la lista. Devuelve la reserva cancelada
+        """
+        with self._bloqueo_reservas:
+            reserva = self.reservas.get(clave)
+            if reserva is None:
+                raise ReservaNoEncontrada(clave)
+            libro = reserva.libro
+            self._terminar_reserva(reserva, CANCELADA)
+            if libro is not None:
+                self._asignar_siguiente(libro)
+        return reserva
+
+    def reservas_de_usuario(self, id_usuario):
+        """Reservas vivas de un usuario"""
+        self.buscar_usuario(id_usuario)
+        return [reserva for (usuario, _), reserva in list(self._reserva_de.items()) if usuario == id_usuario]
+
+    def posicion_en_espera(self, reserva):
+        """Lugar (desde 1) de una reserva en la lista de espera de su título (0 si ya no espera)"""
+        if reserva.estado != EN_ESPERA:
+            return 0
+        entrada = (-reserva.prioridad, reserva.fecha_solicitud.timestamp())
+        return 1 + sum(1 for *orden, _, otra in self.listas_espera.get(reserva.titulo, ())
+                       if otra.estado == EN_ESPERA and tuple(orden) < entrada)
+
+    def procesar_vencimientos(self, ahora=None):
+        """
+        Vence los ejemplares apartados cuyo plazo terminó y los pasa al
+        siguiente de la lista. Solo mira la cima del heap de vencimientos:
+        O(1) si no vence nada y O(k log n) si vencen k. Devuelve las reservas vencidas
+        """
+        ahora = ahora if ahora is not None else fecha_a_epoca(datetime.now())
+        vencidas = []
+        if not self._vencimientos or self._vencimientos[0][0] > ahora:
+            return vencidas
+        with self._bloqueo_reservas:
+            while self._vencimientos and self._vencimientos[0][0] <= ahora:
+                vence, clave = heapq.heappop(self._vencimientos)
+                reserva = self.reservas.get(clave)
+                if reserva is None or reserva.estado != ASIGNADA or reserva.vence != vence:
+                    continue
+                libro = reserva.libro
+                self._terminar_reserva(reserva, VENCIDA)
+                self._asignar_siguiente(libro, ahora)
+                vencidas.append(reserva)
+        return vencidas
+
+    def _registrar_reserva(self, reserva):
+        self.reservas[reserva.clave] = reserva
+        self._reserva_de[(reserva.usuario.id_usuario, reserva.titulo)] = reserva
+
+    def _poner_en_espera(self, reserva):
+        heapq.heappush(self.listas_espera.setdefault(reserva.titulo, []),
+                       (-reserva.prioridad, reserva.fecha_solicitud.timestamp(), next(self._secuencia_reservas), reserva))
+
+    def _apartar(self, reserva, libro, vence=None, desde=None):
+        """Aparta un ejemplar disponible para una reserva hasta vence (por defecto, el plazo contado desde ahora)"""
+        reserva.estado = ASIGNADA
+        reserva.libro = libro
+        if vence is None:
+            vence = (desde if desde is not None else fecha_a_epoca(datetime.now())) + DIAS_RETENCION_RESERVA * SEGUNDOS_POR_DIA
+        reserva.vence = vence
+        self.titulos[reserva.titulo].libres.discard(libro)
+        self.apartados[libro.id_libro] = reserva
+        heapq.heappush(self._vencimientos, (reserva.vence, reserva.clave))
+
+    def _asignar_siguiente(self, libro, desde=None):
+        """
+        Entrega un ejemplar recién disponible al primero de la lista de
+        espera de su título (O(log n); las entradas ya canceladas se
+        descartan al salir) o lo devuelve a los libres. Devuelve la reserva atendida
+        """
+        clave = clave_titulo(libro)
+        with self._bloqueo_reservas:
+            lista = self.listas_espera.get(clave)
+            while lista:
+                reserva = heapq.heappop(lista)[-1]
+                if reserva.estado == EN_ESPERA:
+                    self._apartar(reserva, libro, desde=desde)
+                    self.diario_reservas.registrar(reserva)
+                    return reserva
+            self.listas_espera.pop(clave, None)
+            self.titulos[clave].liberar(libro)
+        return None
+
+    def _terminar_reserva(self, reserva, estado):
+        with self._bloqueo_reservas:
+            reserva.estado = estado
+            self.reservas.pop(reserva.clave, None)
+            self._reserva_de.pop((reserva.usuario.id_usuario, reserva.titulo), None)
+            if reserva.libro is not None and self.apartados.get(reserva.libro.id_libro) is reserva:
+                del self.apartados[reserva.libro.id_libro]
+            self.diario_reservas.registrar(reserva)
+
+    def cargar_reservas(self):
+        """
+        Carga las reservas vivas, reconstruye las listas de espera y el heap
+        de vencimientos, compacta el archivo y atiende lo que haya vencido
+        """
+        for datos in self.diario_reservas.cargar():
+            usuario = self.usuarios.get(datos['id_usuario'])
+            titulo = self.titulos.get(datos['titulo'])
+            if usuario is None or titulo is None:
+                continue
+            reserva = Reserva(usuario, datos['titulo'], datos['prioridad'],
+                              datetime.fromisoformat(datos['fecha_solicitud']), datos['clave'])
+            self._registrar_reserva(reserva)
+            libro = self.libros.get(datos['id_libro']) if datos['estado'] == ASIGNADA else None
+            if libro is not None and libro.disponible and libro.id_libro not in self.apartados:
+                self._apartar(reserva, libro, datos['vence'])
+            else:
+                self._poner_en_espera(reserva)
+
+        # Ejemplares libres con gente esperando (p. ej. tras una caída) se reparten ahora
+        for clave in list(self.listas_espera):
+            titulo = self.titulos[clave]
+            while titulo.libres and self.listas_espera.get(clave):
+                self._asignar_siguiente(titulo.asignar())
+        self.diario_reservas.compactar(list(self.reservas.values()))
+        self.procesar_vencimientos()
+
+    def contar_prestamos(self):
+        """
+        Cuenta los préstamos del historial completo
+        """
+        return self.total_prestamos
+
+    def iterar_historial(self):
+        """
+        Recorre el historial completo de préstamos como un flujo.
+        En modo diferido los devueltos se leen del almacenamiento sin retenerlos en memoria
+        """
+        if not self.historial_diferido:
+            if self.historial is not None:
+                for clave, id_usuario, id_libro, fecha_p, fecha_d, estado in self.historial.filas():
+                    if id_usuario in self.usuarios and id_libro in self.libros:
+                        prestamo = Prestamo(self.usuarios[id_usuario], self.libros[id_libro],
+                                            epoca_a_fecha(fecha_p), clave, self.dias_prestamo)
+                        prestamo._fecha_devolucion = fecha_d
+                        prestamo.estado_devolucion = estado
+                        yield prestamo
+                yield from list(self.prestamos_en_curso.values())
+                return
+            yield from self.prestamos
+            return
+
+        en_memoria = {prestamo.clave: prestamo for prestamo in self.prestamos}
+        for clave, id_usuario, id_libro, fecha_prestamo, fecha_devolucion, estado_devolucion in self.almacenamiento.leer_prestamos():
+            if clave in en_memoria:
+                yield en_memoria[clave]
+            elif id_usuario in self.usuarios and id_libro in self.libros:
+                prestamo = Prestamo(self.usuarios[id_usuario], self.libros[id_libro], fecha_prestamo, clave,
+                                    self.dias_prestamo)
+                prestamo.fecha_devolucion = fecha_devolucion
+                prestamo.estado_devolucion = estado_devolucion
+                yield prestamo
+
+    def iterar_paginas_historial(self, tamano_pagina=50):
+        """
+        Recorre el historial de préstamos en páginas (listas) de tamaño fijo
+        """
+        flujo = self.iterar_historial()
+        while True:
+            pagina = list(itertools.islice(flujo, tamano_pagina))
+            if not pagina:
+                return
+            yield pagina
+
+    def resumen_prestamos(self):
+        """
+        Devuelve (total, activos) del historial de préstamos
+        """
+        return self.contar_prestamos(), len(self.prestamos_activos)
+
+    def guardar_historial_prestamos(self, incremental=False):
+        """
+        Guarda el historial de préstamos en un archivo dentro de SAVE con subcarpeta por fecha.
+        Con incremental=True solo escribe (comprimidos) los préstamos creados o
+        devueltos desde la copia anterior y la encadena en el manifiesto.
+        Devuelve (ruta del archivo, total de préstamos guardados)
+        """
+        if incremental:
+            return self._guardar_copia_incremental()
+
+        if not self.contar_prestamos():
+            raise SinPrestamos("No hay préstamos registrados para guardar.")
+        
+        ruta_completa = ruta_en_save('historial_prestamos', EXTENSION)
+        total_prestamos, _ = escribir_informe_historial(ruta_completa, map(prestamo_a_registro, self.iterar_historial()))
+        return ruta_completa, total_prestamos
+
+    def _guardar_copia_incremental(self):
+        """
+        Escribe la siguiente copia de la cadena: los préstamos cuya fecha de
+        préstamo o de devolución no es anterior al corte de la copia previa.
+        Las fechas se comparan al minuto, la precisión de los archivos .txt
+        (un préstamo hecho segundos después de la copia anterior se lee tras
+        reiniciar con los segundos en cero); lo que esa copia ya guardó de su
+        último minuto queda anotado en el manifiesto y no se repite
+        """
+        entradas = leer_manifiesto()
+        anterior = entradas[-1] if entradas else None
+        desde = epoca_al_minuto(anterior['hasta']) if anterior else None
+        # clave -> minuto de devolución (o None) de lo guardado en el minuto del corte
+        vistos = anterior.get('vistos', {}) if anterior else {}
+        hasta = fecha_a_epoca(datetime.now())
+        vistos_ahora = {}
+
+        def cambios():
+            for prestamo in self.iterar_historial():
+                devolucion = epoca_al_minuto(prestamo._fecha_devolucion)
+                cambio = max(epoca_al_minuto(prestamo._fecha_prestamo), devolucion or 0)
+                if desde is not None and (cambio < desde or vistos.get(prestamo.clave, -1) == devolucion):
+                    continue
+                if cambio >= epoca_al_minuto(hasta):
+                    vistos_ahora[prestamo.clave] = devolucion
+                yield prestamo_a_registro(prestamo)
+
+        flujo = cambios()
+        primero = next(flujo, None)
+        if primero is None:
+            raise SinPrestamos("No hay préstamos nuevos ni devueltos desde la última copia incremental.")
+
+        numero = anterior['numero'] + 1 if anterior else 1
+        ruta_copia = ruta_en_save(f"historial_incremental_{numero:05d}", EXTENSION_INCREMENTAL)
+        total = escribir_copia_incremental(ruta_copia, itertools.chain([primero], flujo))
+        agregar_al_manifiesto({'numero': numero, 'anterior': anterior['numero'] if anterior else None,
+                               'archivo': os.path.relpath(ruta_copia, CARPETA_SAVE),
+                               'desde': desde, 'hasta': hasta, 'registros': total, 'vistos': vistos_ahora})
+        return ruta_copia, total
+
+    def eliminar_historial_prestamos(self):
+        """
+        Elimina completamente el historial de préstamos.
+        Devuelve cuántos registros se borraron del almacenamiento
+        """
+        if not self.contar_prestamos():
+            raise SinPrestamos("No hay préstamos registrados para eliminar.")
+        
+        registros_eliminados = self.almacenamiento.eliminar_prestamos()
+        
+        self.prestamos.clear()
+        self.prestamos_activos.clear()
+        self.prestamos_en_curso.clear()
+        self._por_vencer.clear()
+        self.prestamos_por_usuario.clear()
+        self.total_prestamos = 0
+        self._version_historial += 1
+        self.analitica = None
+        if self.historial is not None:
+            self.historial.limpiar()
+        if self.vigilante is not None:
+            self.vigilante.reiniciar('prestamos')
+        self._prestamos_sin_leer.clear()
+        
+        for usuario in self.usuarios.values():
+            usuario.prestamos.clear()
+        
+        return registros_eliminados
+
+    # ==================== LISTADOS PAGINADOS ====================
+
+    def resumen_libros(self):
+        """
+        Devuelve (total, disponibles, prestados) sin recorrer el catálogo
+        """
+        return len(self.libros), len(self.libros) - self.libros_prestados, self.libros_prestados
+
+    def listar_libros(self, pagina=1, tamano_pagina=TAMANO_PAGINA, disponible=None, orden=None, descendente=False):
+        """
+        Devuelve una Pagina del catálogo, opcionalmente solo disponibles
+        (True) o prestados (False) y ordenada por una clave de ORDENES_LIBROS
+        """
+        if orden is not None and orden not in ORDENES_LIBROS:
+            raise ValueError(f"Orden desconocido: {orden}")
+
+        total, disponibles, prestados = self.resumen_libros()
+        libros = self.libros.values()
+        if disponible is not None:
+            total = disponibles if disponible else prestados
+            libros = (libro for libro in libros if libro.disponible == disponible)
+        return paginar(libros, pagina, tamano_pagina, ORDENES_LIBROS.get(orden), descendente, total)
+
+    def listar_usuarios(self, pagina=1, tamano_pagina=TAMANO_PAGINA, con_prestamos=None, orden=None,
+                        descendente=False):
+        """
+        Devuelve una Pagina de usuarios, opcionalmente solo los que tienen
+        (True) o no tienen (False) préstamos activos
+        """
+        if orden is not None and orden not in ORDENES_USUARIOS:
+            raise ValueError(f"Orden desconocido: {orden}")
+
+        usuarios = self.usuarios.values()
+        total = len(self.usuarios)
+        if con_prestamos is not None:
+            total = None
+            usuarios = (usuario for usuario in usuarios if bool(usuario.prestamos) == con_prestamos)
+        return paginar(usuarios, pagina, tamano_pagina, ORDENES_USUARIOS.get(orden), descendente, total)
+
+    def listar_prestamos(self, pagina=1, tamano_pagina=TAMANO_PAGINA, estado=None, id_usuario=None,
+                         desde=None, hasta=None, orden='fecha_prestamo', descendente=False):
+        """
+        Devuelve una Pagina del historial filtrada por estado ('activo' o
+        'devuelto'), usuario y rango de fechas de préstamo. Según el filtro
+        parte del índice de activos, del de préstamos por usuario o de una
+        búsqueda binaria por fecha; solo recorre el historial completo si
+        ninguno aplica (o en los modos diferido y columnar, que no retienen
+        los préstamos devueltos como objetos y se recorren como flujo).
+        En el modo normal el resultado filtrado y ordenado se guarda hasta el
+        siguiente préstamo o devolución, así que pasar de página no lo recalcula
+        """
+        if orden not in ORDENES_PRESTAMOS:
+            raise ValueError(f"Orden desconocido: {orden}")
+        if estado is not None and estado not in ESTADOS_PRESTAMO:
+            raise ValueError(f"Estado desconocido: {estado}")
+        if id_usuario:
+            self.buscar_usuario(id_usuario)
+
+        # En el modo normal self.prestamos contiene todo el historial en orden de
+        # fecha; las listas que salen de él (por usuario o por rango) también
+        en_memoria = self.historial is None and not self.historial_diferido
+        epoca_desde, epoca_hasta = fecha_a_epoca(desde), fecha_a_epoca(hasta)
+        total = None
+        if estado == 'activo':
+            fuente = self.usuarios[id_usuario].prestamos if id_usuario else self.prestamos_activos.values()
+            if not (desde or hasta):
+                total = len(fuente)
+            id_usuario = None
+        elif id_usuario and en_memoria:
+            fuente = self.prestamos_por_usuario.get(id_usuario, [])
+            id_usuario = None
+        elif (desde or hasta) and en_memoria:
+            fuente = self._prestamos_entre(epoca_desde, epoca_hasta)
+            epoca_desde = epoca_hasta = None
+        elif en_memoria:
+            fuente = self.prestamos
+            if not estado:
+                total = len(fuente)
+        else:
+            fuente = self.iterar_historial()
+            if not (estado or id_usuario or desde or hasta):
+                total = self.total_prestamos
+
+        firma = (estado, id_usuario, epoca_desde, epoca_hasta, orden, descendente)
+        if en_memoria and self._listado_en_cache and self._listado_en_cache[:2] == (firma, self._version_historial):
+            return paginar(self._listado_en_cache[2], pagina, tamano_pagina, total=len(self._listado_en_cache[2]))
+
+        # Solo se filtra elemento a elemento lo que el índice elegido no resolvió
+        filtros = []
+        if estado:
+            filtros.append(lambda prestamo: (prestamo._fecha_devolucion is None) == (estado == 'activo'))
+        if id_usuario:
+            filtros.append(lambda prestamo: prestamo.usuario.id_usuario == id_usuario)
+        if epoca_desde is not None:
+            filtros.append(lambda prestamo: prestamo._fecha_prestamo >= epoca_desde)
+        if epoca_hasta is not None:
+            filtros.append(lambda prestamo: prestamo._fecha_prestamo <= epoca_hasta)
+        if filtros:
+            fuente = (prestamo for prestamo in fuente if all(filtro(prestamo) for filtro in filtros))
+
+        if isinstance(fuente, list) and orden == 'fecha_prestamo':
+            return paginar(fuente, pagina, tamano_pagina, None, descendente, total)
+        if not en_memoria:
+            return paginar(fuente, pagina, tamano_pagina, ORDENES_PRESTAMOS[orden], descendente, total)
+
+        seleccion = sorted(fuente, key=ORDENES_PRESTAMOS[orden], reverse=descendente)
+        self._listado_en_cache = (firma, self._version_historial, seleccion)
+        return paginar(seleccion, pagina, tamano_pagina, total=len(seleccion))
+
+    def _prestamos_entre(self, desde, hasta):
+        """Préstamos en memoria con fecha de préstamo (en segundos) en [desde, hasta]"""
+        fechas = _VistaPorClave(self.prestamos, ORDENES_PRESTAMOS['fecha_prestamo'])
+        inicio = bisect.bisect_left(fechas, desde) if desde is not None else 0
+        fin = bisect.bisect_right(fechas, hasta) if hasta is not None else len(self.prestamos)
+        return self.prestamos[inicio:fin]
+
+    # ==================== IMPORTACIÓN MASIVA ====================
+
+    def importar_libros(self, ruta, formato=None, tamano_lote=TAMANO_LOTE_IMPORTACION,
+                        durabilidad=None, ruta_rechazos=None):
+        """
+        Importa libros desde un archivo CSV o JSON Lines sin pasar por el menú
+        """
+        def crear(datos):
+            return Libro(*(datos[campo] for campo in CAMPOS_LIBRO))
+
+        def registrar(libro):
+            self.libros[libro.id_libro] = libro
+            self._indexar_libro(libro)
+            # Ya confirmado el lote: como en agregar_libro, un ejemplar de un
+            # título con lista de espera se aparta al primero
+            if clave_titulo(libro) in self.listas_espera:
+                self._asignar_siguiente(libro)
+
+        return self._importar(ruta, formato, CAMPOS_LIBRO, ('id_libro', 'titulo'), self.libros,
+                              crear, self.almacenamiento.guardar_libro, registrar,
+                              tamano_lote, durabilidad, ruta_rechazos)
+
+    def importar_usuarios(self, ruta, formato=None, tamano_lote=TAMANO_LOTE_IMPORTACION,
+                          durabilidad=None, ruta_rechazos=None):
+        """
+        Importa usuarios desde un archivo CSV o JSON Lines sin pasar por el menú
+        """
+        def crear(datos):
+            return Usuario(*(datos[campo] for campo in CAMPOS_USUARIO))
+
+        def registrar(usuario):
+            self.usuarios[usuario.id_usuario] = usuario
+            self._indexar_usuario(usuario)
+
+        return self._importar(ruta, formato, CAMPOS_USUARIO, ('id_usuario', 'nombre'), self.usuarios,
+                              crear, self.almacenamiento.guardar_usuario, registrar,
+                              tamano_lote, durabilidad, ruta_rechazos)
+
+    def _importar(self, ruta, formato, campos, obligatorios, existentes, crear, guardar, registrar,
+                  tamano_lote, durabilidad, ruta_rechazos):
+        """
+        Valida y guarda las filas en lotes: cada lote se confirma en una sola
+        transacción y solo el lote en curso se mantiene en memoria
+        """
+        resultado = ResultadoImportacion()
+        inicio = time.perf_counter()
+        lote = {}
+
+        def confirmar_lote():
+            with self.almacenamiento.transaccion(durabilidad):
+                for registro in lote.values():
+                    guardar(registro)
+            for registro in lote.values():
+                registrar(registro)
+            resultado.aceptadas += len(lote)
+            resultado.lotes += 1
+            lote.clear()
+
+        rechazos = open(ruta_rechazos, 'w', encoding='utf-8') if ruta_rechazos else None
+        try:
+            for numero, fila in leer_filas_importacion(ruta, formato):
+                if fila is None:
+                    motivo = "fila con formato inválido"
+                else:
+                    datos = {campo: str(fila.get(campo) or '').strip() for campo in campos}
+                    faltantes = [campo for campo in obligatorios if not datos[campo]]
+                    identificador = datos[campos[0]]
+                    if faltantes:
+                        motivo = f"faltan campos obligatorios: {', '.join(faltantes)}"
+                    elif identificador in existentes or identificador in lote:
+                        motivo = f"el ID {identificador} ya existe"
+                    else:
+                        lote[identificador] = crear(datos)
+                        if len(lote) >= tamano_lote:
+                            confirmar_lote()
+                        continue
+
+                resultado.rechazar(numero, motivo)
+                if rechazos:
+                    rechazos.write(f"{numero}\t{motivo}\n")
+
+            if lote:
+                confirmar_lote()
+        finally:
+            if rechazos:
+                rechazos.close()
+
+        resultado.segundos = time.perf_counter() - inicio
+        return resultado
+
+    # ==================== EXPORTACIÓN ====================
+
+    def exportar(self, coleccion, ruta, formato=None, desde=None, hasta=None, solo_activos=False):
+        """
+        Exporta libros, usuarios o préstamos a CSV, JSON Lines o columnar.
+        Para préstamos se puede filtrar por rango de fecha de préstamo
+        (desde/hasta, datetime) o pedir solo los activos. Devuelve cuántas filas escribió
+        """
+        if coleccion not in COLUMNAS_EXPORTACION:
+            raise ValueError(f"Colección desconocida: {coleccion}")
+        formato = formato or FORMATOS_POR_EXTENSION.get(os.path.splitext(ruta)[1].lower(), 'csv')
+        filas = self._filas_exportacion(coleccion, desde, hasta, solo_activos)
+        return escribir_exportacion(ruta, formato, COLUMNAS_EXPORTACION[coleccion], filas)
+
+    def _filas_exportacion(self, coleccion, desde, hasta, solo_activos):
+        if coleccion == 'libros':
+            for libro in self.libros.values():
+                yield (libro.id_libro, libro.titulo, libro.autor, libro.editorial,
+                       libro.fecha_publicacion, libro.isbn, libro.disponible)
+            return
+
+        if coleccion == 'usuarios':
+            for usuario in self.usuarios.values():
+                yield (usuario.id_usuario, usuario.nombre, usuario.rut, usuario.correo,
+                       usuario.telefono, usuario.direccion, usuario.fecha_registro)
+            return
+
+        # Los activos salen del índice; el historial completo se recorre como flujo
+        prestamos = list(self.prestamos_activos.values()) if solo_activos else self.iterar_historial()
+        for prestamo in prestamos:
+            if desde and prestamo.fecha_prestamo < desde:
+                continue
+            if hasta and prestamo.fecha_prestamo > hasta:
+                continue
+            yield (prestamo.clave, prestamo.usuario.id_usuario, prestamo.usuario.nombre,
+                   prestamo.libro.id_libro, prestamo.libro.titulo,
+                   prestamo.fecha_prestamo.isoformat(sep=' ', timespec='seconds'),
+                   prestamo.fecha_devolucion.isoformat(sep=' ', timespec='seconds') if prestamo.fecha_devolucion else None,
+                   prestamo.estado_devolucion)
+
+    # ==================== RECARGA EN CALIENTE ====================
+
+    def vigilar_archivos(self):
+        """
+        Empieza a vigilar las carpetas del motor de texto para aplicar en
+        memoria los archivos que se agreguen, editen o borren por fuera de
+        la aplicación (ver recargar_cambios). Devuelve el vigilante
+        """
+        if not isinstance(self.almacenamiento, AlmacenamientoTexto):
+            raise ErrorAlmacenamiento("La recarga en caliente solo está disponible con el motor de texto.")
+        self.vigilante = VigilanteCarpetas(self.almacenamiento.carpetas())
+        return self.vigilante
+
+    def recargar_cambios(self):
+        """
+        Aplica a la memoria los archivos agregados, modificados o eliminados
+        desde la revisión anterior. Solo se leen esos archivos y se parchan
+        libros, usuarios y préstamos en su lugar (re-enlazando préstamos,
+        contadores, vencimientos y reservas). Detectarlos cuesta un stat por
+        carpeta más un stat por archivo de las carpetas que cambiaron (con
+        carpetas planas, toda la colección; con fragmentos, solo el fragmento
+        afectado) y, cada INTERVALO_REVISION_COMPLETA segundos, uno por
+        archivo. Los propios cambios de la aplicación también se releen pero
+        no alteran nada.
+        Con historial columnar los préstamos devueltos nuevos se agregan a
+        sus arrays, pero los que ya estaban ahí no se modifican ni se
+        descartan (se verán en la próxima carga).
+        Devuelve un ResultadoRecarga (None si no se está vigilando)
+        """
+        if self.vigilante is None:
+            return None
+        resultado = ResultadoRecarga()
+        inicio = time.perf_counter()
+        cambios = self.vigilante.detectar()
+        # Libros y usuarios antes que préstamos, igual que en la carga inicial
+        for coleccion, recargar, descartar in (('libros', self._recargar_libro, self._descartar_libro),
+                                               ('usuarios', self._recargar_usuario, self._descartar_usuario),
+                                               ('prestamos', self._recargar_prestamo, self._descartar_prestamo)):
+            agregados, modificados, eliminados = cambios[coleccion]
+            nuevos = set(agregados)
+            # Un archivo movido de carpeta aparece como baja y alta: no se descarta
+            presentes = {os.path.basename(archivo) for archivo in agregados + modificados}
+            eliminados = [archivo for archivo in eliminados if os.path.basename(archivo) not in presentes]
+            for archivo, fila in self.almacenamiento.leer_registros(coleccion, agregados + modificados):
+                if fila is not None:
+                    recargar(fila, archivo in nuevos, resultado)
+                    continue
+                existe = self.vigilante.reintentar(coleccion, archivo)
+                if archivo not in nuevos:
+                    if not existe:
+                        eliminados.append(archivo)
+                elif existe and coleccion == 'prestamos':
+                    self._prestamos_sin_leer.add(os.path.basename(archivo)[:-len(EXTENSION)])
+            for archivo in eliminados:
+                descartar(os.path.basename(archivo)[:-len(EXTENSION)], resultado)
+        resultado.segundos = time.perf_counter() - inicio
+        return resultado
+
+    def _recargar_libro(self, fila, nuevo, resultado):
+        id_libro, titulo, autor, editorial, fecha_publicacion, isbn, disponible = fila
+        libro = self.libros.get(id_libro)
+        if libro is None:
+            libro = Libro(id_libro, titulo, autor, editorial, fecha_publicacion, isbn)
+            libro.disponible = disponible
+            self.libros[id_libro] = libro
+            self._indexar_libro(libro)
+            if not disponible:
+                with self._bloqueo_contadores:
+                    self.libros_prestados += 1
+            elif clave_titulo(libro) in self.listas_espera:
+                self._asignar_siguiente(libro)
+            resultado.anotar('libros', 'agregados')
+            return
+
+        rechazado = isbn != libro.isbn and not self._puede_cambiar_titulo(libro, isbn)
+        if rechazado:
+            resultado.conflicto(f"El libro {id_libro} está prestado, apartado o con lista de espera: se mantiene su ISBN.")
+            isbn = libro.isbn
+        datos = (titulo, autor, editorial, fecha_publicacion, isbn)
+        # La disponibilidad la deciden los préstamos y reservas; el archivo
+        # solo manda en los ejemplares que no están prestados ni apartados
+        reservado = id_libro in self.prestamos_activos or id_libro in self.apartados
+        cambia_disponible = disponible != libro.disponible and not reservado
+        if datos == (libro.titulo, libro.autor, libro.editorial, libro.fecha_publicacion, libro.isbn) \
+                and not cambia_disponible:
+            if disponible != libro.disponible or rechazado:
+                self.actualizar_libro(libro)
+            return
+
+        self._desindexar_libro(libro)
+        libro.titulo, libro.autor, libro.editorial, libro.fecha_publicacion, libro.isbn = datos
+        if cambia_disponible:
+            libro.disponible = disponible
+            with self._bloqueo_contadores:
+                self.libros_prestados += -1 if disponible else 1
+        self._indexar_libro(libro)
+        if id_libro in self.apartados:
+            self.titulos[clave_titulo(libro)].libres.discard(libro)
+        elif cambia_disponible and disponible and clave_titulo(libro) in self.listas_espera:
+            self._asignar_siguiente(libro)
+        if disponible != libro.disponible or rechazado:
+            # El archivo contradice un préstamo o reserva: se reescribe con el estado real
+            self.actualizar_libro(libro)
+        resultado.anotar('libros', 'modificados')
+
+    def _descartar_libro(self, id_libro, resultado):
+        libro = self.libros.get(id_libro)
+        if libro is None:
+            return
+        if id_libro in self.prestamos_activos or id_libro in self.apartados:
+            resultado.conflicto(f"El libro {id_libro} se borró pero está prestado o apartado: se mantiene.")
+            return
+        del self.libros[id_libro]
+        self._desindexar_libro(libro)
+        if not libro.disponible:
+            with self._bloqueo_contadores:
+                self.libros_prestados -= 1
+        resultado.anotar('libros', 'eliminados')
+
+    def _recargar_usuario(self, fila, nuevo, resultado):
+        id_usuario, nombre, rut, correo, telefono, direccion, fecha_registro = fila
+        usuario = self.usuarios.get(id_usuario)
+        if usuario is None:
+            usuario = Usuario(id_usuario, nombre, rut, correo, telefono, direccion)
+            if fecha_registro:
+                usuario.fecha_registro = fecha_registro
+            self.usuarios[id_usuario] = usuario
+            self._indexar_usuario(usuario)
+            resultado.anotar('usuarios', 'agregados')
+            return
+
+        datos = (nombre, rut, correo, telefono, direccion, fecha_registro or usuario.fecha_registro)
+        if datos == (usuario.nombre, usuario.rut, usuario.correo, usuario.telefono, usuario.direccion,
+                     usuario.fecha_registro):
+            return
+        self._desindexar_usuario(usuario)
+        (usuario.nombre, usuario.rut, usuario.correo, usuario.telefono, usuario.direccion,
+         usuario.fecha_registro) = datos
+        self._indexar_usuario(usuario)
+        resultado.anotar('usuarios', 'modificados')
+
+    def _descartar_usuario(self, id_usuario, resultado):
+        usuario = self.usuarios.get(id_usuario)
+        if usuario is None:
+            return
+        if usuario.prestamos:
+            resultado.conflicto(f"El usuario {id_usuario} se borró pero tiene préstamos activos: se mantiene.")
+            return
+        for reserva in self.reservas_de_usuario(id_usuario):
+            self.cancelar_reserva(reserva.clave)
+        del self.usuarios[id_usuario]
+        self._desindexar_usuario(usuario)
+        resultado.anotar('usuarios', 'eliminados')
+
+    def _buscar_prestamo(self, clave, fecha_prestamo=None):
+        """
+        Ubica un préstamo de self.prestamos por su clave como (posición,
+        préstamo), o (None, None). La clave termina en la fecha del préstamo,
+        así que basta una búsqueda binaria en el minuto de esa fecha (y, si
+        difiere, en el de la fecha leída del archivo). En modo columnar solo
+        se ubican los abiertos, que están en prestamos_en_curso (sin posición)
+        """
+        if self.historial is not None:
+            return None, self.prestamos_en_curso.get(clave)
+        fechas = [fecha for fecha in (fecha_de_clave(clave), fecha_prestamo) if fecha is not None]
+        orden = ORDENES_PRESTAMOS['fecha_prestamo']
+        vista = _VistaPorClave(self.prestamos, orden)
+        for fecha in fechas:
+            desde = fecha_a_epoca(fecha.replace(second=0, microsecond=0))
+            posicion = bisect.bisect_left(vista, desde)
+            while posicion < len(self.prestamos) and orden(self.prestamos[posicion]) < desde + 60:
+                if self.prestamos[posicion].clave == clave:
+                    return posicion, self.prestamos[posicion]
+                posicion += 1
+        if not fechas:
+            # Clave sin fecha y archivo ya borrado: solo puede ser uno de los abiertos
+            for prestamo in self.prestamos_activos.values():
+                if prestamo.clave == clave:
+                    return self.prestamos.index(prestamo), prestamo
+        return None, None
+
+    def _reubicar_en_historial(self, prestamo):
+        """_registrar_prestamo agrega al final; uno con fecha anterior se lleva a su lugar"""
+        if self.historial is not None:
+            # En modo columnar los abiertos van por clave, sin orden que mantener
+            return
+        for lista in (self.prestamos, self.prestamos_por_usuario.get(prestamo.usuario.id_usuario)):
+            if lista and len(lista) > 1 and lista[-2]._fecha_prestamo > prestamo._fecha_prestamo:
+                lista.pop()
+                self._insertar_por_fecha(lista, prestamo)
+
+    @staticmethod
+    def _insertar_por_fecha(lista, prestamo):
+        """Inserta un préstamo en una lista ordenada por fecha de préstamo, tras los de igual fecha"""
+        vista = _VistaPorClave(lista, ORDENES_PRESTAMOS['fecha_prestamo'])
+        lista.insert(bisect.bisect_right(vista, prestamo._fecha_prestamo), prestamo)
+
+    def _recargar_prestamo(self, fila, nuevo, resultado):
+        clave, id_usuario, id_libro, fecha_prestamo, fecha_devolucion, estado_devolucion = fila
+        if clave in self._prestamos_sin_leer:
+            # Se lee por primera vez: cuenta como nuevo aunque el archivo ya se conociera
+            self._prestamos_sin_leer.discard(clave)
+            nuevo = True
+        _, prestamo = self._buscar_prestamo(clave, fecha_prestamo)
+        if prestamo is not None:
+            if prestamo._fecha_devolucion is None:
+                if fecha_devolucion:
+                    # Devuelto desde el archivo: mismo camino que devolver_libro
+                    libro = prestamo.libro
+                    prestamo.fecha_devolucion = fecha_devolucion
+                    prestamo.estado_devolucion = estado_devolucion
+                    libro.disponible = True
+                    self._registrar_devolucion(libro, prestamo)
+                    self.actualizar_libro(libro)
+                    resultado.anotar('prestamos', 'modificados')
+            elif fecha_devolucion is None:
+                resultado.conflicto(f"El préstamo {clave} ya estaba devuelto: no se vuelve a abrir.")
+            elif (fecha_devolucion, estado_devolucion) != (
+                    prestamo.fecha_devolucion.replace(second=0, microsecond=0), prestamo.estado_devolucion):
+                prestamo.fecha_devolucion = fecha_devolucion
+                prestamo.estado_devolucion = estado_devolucion
+                with self._bloqueo_contadores:
+                    self._version_historial += 1
+                    self.analitica = None
+                resultado.anotar('prestamos', 'modificados')
+            return
+
+        usuario, libro = self.usuarios.get(id_usuario), self.libros.get(id_libro)
+        if usuario is None or libro is None:
+            resultado.conflicto(f"El préstamo {clave} apunta a un usuario o libro inexistente: se ignora.")
+            return
+
+        if fecha_devolucion is None:
+            reserva = self.apartados.get(id_libro)
+            if id_libro in self.prestamos_activos or (reserva is not None and reserva.usuario is not usuario):
+                resultado.conflicto(f"El libro {id_libro} del préstamo {clave} ya está prestado o apartado: se ignora.")
+                return
+            prestamo = Prestamo(usuario, libro, fecha_prestamo, clave, self.dias_prestamo)
+            if not libro.disponible:
+                # _registrar_prestamo lo vuelve a contar como prestado
+                with self._bloqueo_contadores:
+                    self.libros_prestados -= 1
+            libro.disponible = False
+            self._registrar_prestamo(prestamo)
+            self._reubicar_en_historial(prestamo)
+            self.actualizar_libro(libro)
+            resultado.anotar('prestamos', 'agregados')
+            return
+
+        # Devuelto y fuera de memoria
+        if self.historial is not None and not nuevo:
+            # Las filas del historial columnar no se reescriben en su lugar
+            return
+        if self.historial_diferido:
+            # El historial se lee del disco: basta con ajustar el total y las cachés
+            with self._bloqueo_contadores:
+                if nuevo:
+                    self.total_prestamos += 1
+                self._version_historial += 1
+                self.analitica = None
+            resultado.anotar('prestamos', 'agregados' if nuevo else 'modificados')
+            return
+        prestamo = Prestamo(usuario, libro, fecha_prestamo, clave, self.dias_prestamo)
+        prestamo.fecha_devolucion = fecha_devolucion
+        prestamo.estado_devolucion = estado_devolucion
+        if self.historial is not None:
+            self.historial.agregar(clave, id_usuario, id_libro, prestamo._fecha_prestamo,
+                                   prestamo._fecha_devolucion, estado_devolucion)
+        else:
+            self._insertar_por_fecha(self.prestamos, prestamo)
+            self._insertar_por_fecha(self.prestamos_por_usuario.setdefault(id_usuario, []), prestamo)
+        with self._bloqueo_contadores:
+            self.total_prestamos += 1
+            self._version_historial += 1
+            if self.analitica is not None:
+                self.analitica.agregar(clave, id_usuario, id_libro, prestamo._fecha_prestamo,
+                                       prestamo._fecha_devolucion)
+        resultado.anotar('prestamos', 'agregados')
+
+    def _descartar_prestamo(self, clave, resultado):
+        posicion, prestamo = self._buscar_prestamo(clave)
+        if prestamo is None:
+            if clave in self._prestamos_sin_leer:
+                # Nunca se leyó, así que nunca se contó
+                self._prestamos_sin_leer.discard(clave)
+            elif self.historial_diferido:
+                with self._bloqueo_contadores:
+                    self.total_prestamos -= 1
+                    self._version_historial += 1
+                    self.analitica = None
+                resultado.anotar('prestamos', 'eliminados')
+            return
+
+        if self.historial is not None:
+            del self.prestamos_en_curso[clave]
+        else:
+            del self.prestamos[posicion]
+        try:
+            self.prestamos_por_usuario.get(prestamo.usuario.id_usuario, []).remove(prestamo)
+        except ValueError:
+            pass
+        abierto = prestamo._fecha_devolucion is None
+        with self._bloqueo_contadores:
+            self.total_prestamos -= 1
+            self._version_historial += 1
+            self.analitica = None
+            if abierto:
+                self.libros_prestados -= 1
+                self._quitar_vencimiento(prestamo)
+        if abierto:
+            # Sin el archivo el préstamo no existe: el ejemplar vuelve a estar disponible
+            libro = prestamo.libro
+            self.prestamos_activos.pop(libro.id_libro, None)
+            prestamo.usuario.prestamos.discard(prestamo)
+            libro.disponible = True
+            self._asignar_siguiente(libro)
+            self.actualizar_libro(libro)
+        resultado.anotar('prestamos', 'eliminados')
+
+    # ==================== FUNCIONES DE PERSISTENCIA ====================
+
+    def guardar_libro(self, id_libro, titulo, autor, editorial, fecha_publicacion, isbn):
+        """Guarda un libro en el motor de almacenamiento"""
+        self.almacenamiento.guardar_libro(self.libros[id_libro])
+
+    def actualizar_libro(self, libro):
+        """Actualiza el estado de disponibilidad de un libro"""
+        self.almacenamiento.guardar_libro(libro)
+
+    def guardar_usuario(self, id_usuario, nombre, rut, correo, telefono, direccion):
+        """Guarda un usuario en el motor de almacenamiento"""
+        self.almacenamiento.guardar_usuario(self.usuarios[id_usuario])
+
+    def guardar_prestamo(self, prestamo):
+        """Guarda un préstamo en el motor de almacenamiento"""
+        self.almacenamiento.guardar_prestamo(prestamo)
+
+    def actualizar_prestamo(self, prestamo):
+        """Actualiza un préstamo existente en el motor de almacenamiento"""
+        self.almacenamiento.guardar_prestamo(prestamo)
+
+    def cargar_datos(self):
+        """
+        Carga todos los datos desde el motor de almacenamiento al iniciar.
+        Si el motor tiene más de un hilo, las tres colecciones se leen en
+        paralelo y los préstamos se enlazan al final en una sola pasada.
+        Los tiempos de cada colección quedan en self.tiempos_carga
+        """
+        self.tiempos_carga = {}
+        lectores = {
+            'libros': self.almacenamiento.leer_libros,
+            'usuarios': self.almacenamiento.leer_usuarios,
+            'prestamos': functools.partial(self.almacenamiento.leer_prestamos, solo_activos=self.historial_diferido),
+        }
+
+        if self.almacenamiento.hilos > 1:
+            with ThreadPoolExecutor(max_workers=len(lectores)) as ejecutor:
+                futuros = {nombre: ejecutor.submit(self._leer_coleccion, lector) for nombre, lector in lectores.items()}
+                filas = {}
+                for nombre, futuro in futuros.items():
+                    filas[nombre], self.tiempos_carga[nombre] = futuro.result()
+
+            inicio = time.perf_counter()
+            self.cargar_libros(filas['libros'])
+            self.cargar_usuarios(filas['usuarios'])
+            self.cargar_prestamos(filas['prestamos'])
+            self.tiempos_carga['enlace'] = time.perf_counter() - inicio
+        else:
+            for nombre, cargar in (('libros', self.cargar_libros), ('usuarios', self.cargar_usuarios),
+                                   ('prestamos', self.cargar_prestamos)):
+                inicio = time.perf_counter()
+                cargar()
+                self.tiempos_carga[nombre] = time.perf_counter() - inicio
+
+        self.cargar_reservas()
+
+        # Contadores del resumen: se calculan una vez y luego se mantienen
+        self.libros_prestados = sum(1 for libro in self.libros.values() if not libro.disponible)
+        if self.historial_diferido:
+            self.total_prestamos = self.almacenamiento.contar_prestamos()
+        elif self.historial is not None:
+            self.total_prestamos = len(self.historial) + len(self.prestamos_en_curso)
+        else:
+            self.total_prestamos = len(self.prestamos)
+
+    @staticmethod
+    def _leer_coleccion(lector):
+        inicio = time.perf_counter()
+        filas = list(lector())
+        return filas, time.perf_counter() - inicio
+
+    def cargar_libros(self, filas=None):
+        """Carga libros desde el motor de almacenamiento (o desde filas ya leídas)"""
+        if filas is None:
+            filas = self.almacenamiento.leer_libros()
+        for id_libro, titulo, autor, editorial, fecha_publicacion, isbn, disponible in filas:
+            libro = Libro(id_libro, titulo, autor, editorial, fecha_publicacion, isbn)
+            libro.disponible = disponible
+            self.libros[id_libro] = libro
+            self._indexar_libro(libro)
+
+    def cargar_usuarios(self, filas=None):
+        """Carga usuarios desde el motor de almacenamiento (o desde filas ya leídas)"""
+        if filas is None:
+            filas = self.almacenamiento.leer_usuarios()
+        for id_usuario, nombre, rut, correo, telefono, direccion, fecha_registro in filas:
+            usuario = Usuario(id_usuario, nombre, rut, correo, telefono, direccion)
+            if fecha_registro:
+                usuario.fecha_registro = fecha_registro
+            self.usuarios[id_usuario] = usuario
+            self._indexar_usuario(usuario)
+
+    def cargar_prestamos(self, filas=None):
+        """Carga préstamos desde el motor de almacenamiento (o desde filas ya leídas)"""
+        if filas is None:
+            filas = self.almacenamiento.leer_prestamos(solo_activos=self.historial_diferido)
+        for clave, id_usuario, id_libro, fecha_prestamo, fecha_devolucion, estado_devolucion in filas:
+            if id_usuario in self.usuarios and id_libro in self.libros:
+                if fecha_devolucion and self.historial is not None:
+                    self.historial.agregar(clave, id_usuario, id_libro, fecha_a_epoca(fecha_prestamo),
+                                           fecha_a_epoca(fecha_devolucion), estado_devolucion)
+                    continue
+                usuario = self.usuarios[id_usuario]
+                libro = self.libros[id_libro]
+                prestamo = Prestamo(usuario, libro, fecha_prestamo, clave, self.dias_prestamo)
+                prestamo.fecha_devolucion = fecha_devolucion
+                prestamo.estado_devolucion = estado_devolucion
+
+                self._retener_prestamo(prestamo)
+
+                if not prestamo.fecha_devolucion:
+                    usuario.prestamos.add(prestamo)
+                    self.prestamos_activos[id_libro] = prestamo
+
+        # Historial en orden de fecha: los préstamos nuevos se agregan al final,
+        # así que las búsquedas por rango de fechas pueden ser binarias
+        self.prestamos.sort(key=ORDENES_PRESTAMOS['fecha_prestamo'])
+        self._por_vencer = sorted((prestamo._fecha_vencimiento, id_libro)
+                                  for id_libro, prestamo in self.prestamos_activos.items())
+        if self.historial is None and not self.historial_diferido:
+            for prestamo in self.prestamos:
+                self.prestamos_por_usuario.setdefault(prestamo.usuario.id_usuario, []).append(prestamo)
+
+    def vaciar_escrituras(self):
+        """
+        Confirma ya las escrituras encoladas por la escritura diferida y
+        devuelve cuántas eran (0 si no está activa)
+        """
+        vaciar = getattr(self.almacenamiento, 'vaciar', None)
+        return vaciar() if vaciar is not None else 0
+
+    def cerrar(self):
+        """Libera los recursos del motor de almacenamiento y el diario de reservas"""
+        self.diario_reservas.cerrar()
+        self.almacenamiento.cerrar()
+
+
+# ==================== INSTRUMENTACIÓN ====================
+# Desactivada no cuesta nada: los métodos solo se envuelven al activarla y
+# los motores de almacenamiento consultan un único atributo (medidor)
+
+class Instrumentacion:
+    """
+    Métricas opcionales de una sesión: por método, cantidad de llamadas y
+    latencia acumulada y en percentiles; por motor, bytes escritos y
+    archivos tocados
+    """
+    # Métodos públicos que no se envuelven (administradores de contexto)
+    EXCLUIDOS = ('transaccion',)
+
+    def __init__(self):
+        self.duraciones = {}
+        self.escrituras = 0
+        self.bytes_escritos = 0
+        self.archivos = set()
+        self.inicio = time.perf_counter()
+        self._bloqueo = threading.Lock()
+
+    def medir(self, nombre, funcion):
+        """Devuelve funcion envuelta para registrar la duración de cada llamada"""
+        duraciones = self.duraciones.setdefault(nombre, array('d'))
+
+        if inspect.isgeneratorfunction(funcion):
+            # Los flujos se miden desde la primera lectura hasta agotarlos (o cerrarlos)
+            @functools.wraps(funcion)
+            def medida(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    yield from funcion(*args, **kwargs)
+                finally:
+                    duraciones.append(time.perf_counter() - inicio)
+            return medida
+
+        @functools.wraps(funcion)
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                resultado = funcion(*args, **kwargs)
+            except BaseException:
+                duraciones.append(time.perf_counter() - inicio)
+                raise
+            if isinstance(resultado, collections.abc.Iterator):
+                # Una función común que devuelve un flujo (p. ej. leer_libros del
+                # motor de texto) también se mide hasta agotarlo (o cerrarlo)
+                return self._medir_flujo(resultado, inicio, duraciones)
+            duraciones.append(time.perf_counter() - inicio)
+            return resultado
+        return medida
+
+    @staticmethod
+    def _medir_flujo(flujo, inicio, duraciones):
+        try:
+            yield from flujo
+        finally:
+            duraciones.append(time.perf_counter() - inicio)
+
+    def instrumentar(self, objeto, prefijo):
+        """Reemplaza los métodos públicos de un objeto por versiones medidas"""
+        for nombre in dir(type(objeto)):
+            if nombre.startswith('_') or nombre in self.EXCLUIDOS:
+                continue
+            if callable(getattr(type(objeto), nombre)):
+                setattr(objeto, nombre, self.medir(f"{prefijo}.{nombre}", getattr(objeto, nombre)))
+        if hasattr(objeto, 'medidor'):
+            objeto.medidor = self
+
+    def registrar_escritura(self, ruta, cantidad):
+        """Lo llaman los motores por cada archivo escrito o eliminado"""
+        with self._bloqueo:
+            self.escrituras += 1
+            self.bytes_escritos += cantidad
+            self.archivos.add(ruta)
+
+    def resumen(self):
+        """Métricas acumuladas como dict (serializable a JSON)"""
+        llamadas = {}
+        for nombre, duraciones in sorted(self.duraciones.items()):
+            if not duraciones:
+                continue
+            total = sum(duraciones)
+            llamadas[nombre] = {
+                'llamadas': len(duraciones),
+                'total_ms': total * 1000,
+                'media_ms': total / len(duraciones) * 1000,
+                'p50_ms': percentil(duraciones, 50) * 1000,
+                'p95_ms': percentil(duraciones, 95) * 1000,
+                'p99_ms': percentil(duraciones, 99) * 1000,
+                'max_ms': max(duraciones) * 1000,
+            }
+        return {
+            'segundos_sesion': time.perf_counter() - self.inicio,
+            'llamadas': llamadas,
+            'escrituras': {'operaciones': self.escrituras, 'bytes': self.bytes_escritos,
+                           'archivos_tocados': len(self.archivos)},
+        }
+
+    def volcar(self, ruta):
+        """Guarda el resumen en un archivo JSON"""
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            json.dump(self.resumen(), archivo, ensure_ascii=False, indent=2)
+
+
+@contextlib.contextmanager
+def capturar_perfil(modo, ruta):
+    """
+    Envuelve una sesión con cProfile (estadísticas en `ruta`, legibles con
+    pstats) o con tracemalloc (las 30 líneas que más memoria retienen en `ruta`)
+    """
+    if modo == 'cprofile':
+        perfil = cProfile.Profile()
+        perfil.enable()
+        try:
+            yield
+        finally:
+            perfil.disable()
+            perfil.dump_stats(ruta)
+        return
+
+    tracemalloc.start(10)
+    try:
+        yield
+    finally:
+        instantanea = tracemalloc.take_snapshot()
+        actual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(f"Memoria actual: {actual / 2**20:.2f} MB | Pico: {pico / 2**20:.2f} MB\n\n")
+            for estadistica in instantanea.statistics('lineno')[:30]:
+                archivo.write(f"{estadistica}\n")
+
+
+# ==================== MODO SERVIDOR ====================
+# Varios mostradores comparten una sola Biblioteca en memoria a través de HTTP.
+# Cada préstamo o devolución bloquea solo su libro y su usuario (siempre en el
+# orden libro -> usuario para evitar interbloqueos); las escrituras al
+# almacenamiento se serializan porque los motores no son seguros entre hilos
+
+class BloqueosPorClave:
+    """
+    Entrega un candado por clave (id de libro o de usuario), creado a demanda
+    """
+    def __init__(self):
+        self._bloqueos = {}
+        self._guardia = threading.Lock()
+
+    def obtener(self, clave):
+        bloqueo = self._bloqueos.get(clave)
+        if bloqueo is None:
+            with self._guardia:
+                bloqueo = self._bloqueos.setdefault(clave, threading.Lock())
+        return bloqueo
+
+
+class AlmacenamientoSincronizado:
+    """
+    Envoltorio que serializa el acceso a un motor de almacenamiento. Una
+    transacción retiene el candado hasta su commit para que sus escrituras no
+    se mezclen con las de otro hilo
+    """
+    def __init__(self, almacenamiento):
+        self._almacenamiento = almacenamiento
+        self._bloqueo = threading.RLock()
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._almacenamiento, nombre)
+        if not callable(atributo):
+            return atributo
+
+        @functools.wraps(atributo)
+        def sincronizado(*args, **kwargs):
+            with self._bloqueo:
+                return atributo(*args, **kwargs)
+        return sincronizado
+
+    @contextlib.contextmanager
+    def transaccion(self, durabilidad=None):
+        with self._bloqueo, self._almacenamiento.transaccion(durabilidad):
+            yield
+
+
+class ServicioConcurrente:
+    """
+    Préstamos, devoluciones y búsquedas sobre una Biblioteca compartida por
+    varios hilos, con candados finos por libro y por usuario
+    """
+    def __init__(self, biblio):
+        if not isinstance(biblio.almacenamiento, AlmacenamientoSincronizado):
+            biblio.almacenamiento = AlmacenamientoSincronizado(biblio.almacenamiento)
+        self.biblio = biblio
+        self.bloqueos_libros = BloqueosPorClave()
+        self.bloqueos_usuarios = BloqueosPorClave()
+
+    def prestar_libro(self, id_usuario, id_libro):
+        with self.bloqueos_libros.obtener(id_libro), self.bloqueos_usuarios.obtener(id_usuario):
+            return self.biblio.prestar_libro(id_usuario, id_libro)
+
+    def prestar_ejemplar(self, id_usuario, isbn):
+        return self.biblio.prestar_ejemplar(id_usuario, isbn, self.prestar_libro)
+
+    def devolver_libro(self, id_libro, estado_devolucion=None):
+        with self.bloqueos_libros.obtener(id_libro):
+            prestamo = self.biblio.obtener_prestamo_activo(id_libro)
+            if prestamo is None:
+                return self.biblio.devolver_libro(id_libro, estado_devolucion)
+            with self.bloqueos_usuarios.obtener(prestamo.usuario.id_usuario):
+                return self.biblio.devolver_libro(id_libro, estado_devolucion)
+
+    def prestar_lote(self, pares):
+        # Candados de todos los libros y usuarios del lote, siempre en el mismo orden
+        with contextlib.ExitStack() as candados:
+            for id_libro in sorted({id_libro for _, id_libro in pares}):
+                candados.enter_context(self.bloqueos_libros.obtener(id_libro))
+            for id_usuario in sorted({id_usuario for id_usuario, _ in pares}):
+                candados.enter_context(self.bloqueos_usuarios.obtener(id_usuario))
+            return self.biblio.prestar_lote(pares)
+
+    def devolver_lote(self, devoluciones):
+        ids = sorted({item if isinstance(item, str) else item[0] for item in devoluciones})
+        with contextlib.ExitStack() as candados:
+            for id_libro in ids:
+                candados.enter_context(self.bloqueos_libros.obtener(id_libro))
+            prestamos = (self.biblio.prestamos_activos.get(id_libro) for id_libro in ids)
+            for id_usuario in sorted({prestamo.usuario.id_usuario for prestamo in prestamos if prestamo}):
+                candados.enter_context(self.bloqueos_usuarios.obtener(id_usuario))
+            return self.biblio.devolver_lote(devoluciones)
+
+    def buscar_libros(self, isbn=None, titulo=None, autor=None, disponibles=False, texto=None):
+        """Filtra el catálogo por los criterios indicados (todos opcionales)"""
+        if texto:
+            libros = [libro for libro, _ in self.biblio.buscar_libros_por_texto(texto)]
+        elif isbn:
+            libros = self.biblio.buscar_libros_por_isbn(isbn)
+        elif titulo:
+            libros = self.biblio.buscar_libros_por_titulo(titulo)
+        elif autor:
+            libros = self.biblio.buscar_libros_por_autor(autor)
+        else:
+            libros = list(self.biblio.libros.values())
+        if disponibles:
+            libros = [libro for libro in libros if libro.disponible]
+        return libros
+
+
+def libro_a_dict(libro):
+    return {'id_libro': libro.id_libro, 'titulo': libro.titulo, 'autor': libro.autor,
+            'editorial': libro.editorial, 'fecha_publicacion': libro.fecha_publicacion,
+            'isbn': libro.isbn, 'disponible': libro.disponible}
+
+
+def usuario_a_dict(usuario):
+    return {'id_usuario': usuario.id_usuario, 'nombre': usuario.nombre,
+            'prestamos_activos': len(usuario.prestamos)}
+
+
+def prestamo_a_dict(prestamo):
+    return {'clave': prestamo.clave, 'id_usuario': prestamo.usuario.id_usuario,
+            'id_libro': prestamo.libro.id_libro,
+            'fecha_prestamo': prestamo.fecha_prestamo.isoformat(sep=' ', timespec='seconds'),
+            'fecha_vencimiento': prestamo.fecha_vencimiento.isoformat(sep=' ', timespec='seconds'),
+            'fecha_devolucion': (prestamo.fecha_devolucion.isoformat(sep=' ', timespec='seconds')
+                                 if prestamo.fecha_devolucion else None),
+            'estado_devolucion': prestamo.estado_devolucion}
+
+
+def resultado_lote_a_dict(resultado):
+    return {'aplicado': resultado.aplicado,
+            'items': [{'elemento': elemento, 'error': error,
+                       'prestamo': prestamo_a_dict(prestamo) if prestamo else None}
+                      for elemento, error, prestamo in resultado.items]}
+
+
+# Código HTTP de cada error de la biblioteca (el resto responde 409 Conflict)
+ESTADOS_HTTP = {LibroNoEncontrado: 404, UsuarioNoEncontrado: 404, ReservaNoEncontrada: 404}
+
+
+class ManejadorBiblioteca(BaseHTTPRequestHandler):
+    """
+    API JSON del servidor:
+      GET  /libros?isbn=|titulo=|autor=|q=&disponibles=1  búsqueda en el catálogo (q = texto libre)
+      GET  /libros/<id>                                  ficha de un libro
+      GET  /usuarios                                     usuarios registrados
+      POST /prestamos     {"id_usuario", "id_libro"}     registra un préstamo
+                          {"id_usuario", "isbn"}         ... de un ejemplar libre del título
+      POST /devoluciones  {"id_libro", "estado_devolucion"}
+      POST /reservas      {"id_usuario", "id_libro" o "isbn", "prioridad"}  lista de espera
+    """
+    protocol_version = 'HTTP/1.1'
+    # Sin Nagle: la cabecera y el cuerpo salen en escrituras separadas
+    disable_nagle_algorithm = True
+    servicio = None
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, estado, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _atender(self, operacion):
+        try:
+            estado, datos = operacion()
+        except ErrorBiblioteca as e:
+            estado, datos = ESTADOS_HTTP.get(type(e), 409), {'error': str(e)}
+        except (ValueError, KeyError) as e:
+            estado, datos = 400, {'error': f"Solicitud inválida: {e}"}
+        self._responder(estado, datos)
+
+    def do_GET(self):
+        self._atender(self._consultar)
+
+    def do_POST(self):
+        self._atender(self._modificar)
+
+    def _consultar(self):
+        partes = urlsplit(self.path)
+        parametros = {clave: valores[0] for clave, valores in parse_qs(partes.query).items()}
+        ruta = partes.path.rstrip('/')
+
+        if ruta == '/libros':
+            libros = self.servicio.buscar_libros(parametros.get('isbn'), parametros.get('titulo'),
+                                                 parametros.get('autor'), parametros.get('disponibles') == '1',
+                                                 parametros.get('q'))
+            return 200, [libro_a_dict(libro) for libro in libros]
+        if ruta.startswith('/libros/'):
+            return 200, libro_a_dict(self.servicio.biblio.buscar_libro(ruta[len('/libros/'):]))
+        if ruta == '/usuarios':
+            return 200, [usuario_a_dict(usuario) for usuario in list(self.servicio.biblio.usuarios.values())]
+        if ruta == '/escritura':
+            metricas = getattr(self.servicio.biblio.almacenamiento, 'metricas', None)
+            return 200, metricas() if metricas is not None else {'escritura_diferida': False}
+        if ruta == '/estadisticas':
+            analitica = self.servicio.biblio.estadisticas()
+            limite = int(parametros.get('top', TOP_ESTADISTICAS))
+            duracion, devueltos = analitica.duracion_promedio()
+            return 200, {
+                'titulos': [{'titulo': titulo, 'isbn': isbn, 'prestamos': cantidad}
+                            for (titulo, isbn), cantidad in analitica.top_titulos(limite)],
+                'autores': [{'autor': autor, 'prestamos': cantidad} for autor, cantidad in analitica.top_autores(limite)],
+                'por_semana': [{'anio': anio, 'semana': semana, 'prestamos': cantidad}
+                               for (anio, semana), cantidad in analitica.prestamos_por_semana().items()],
+                'mapa_calor': analitica.mapa_calor(),
+                'duracion_promedio_horas': duracion.total_seconds() / 3600 if duracion else None,
+                'devueltos': devueltos,
+            }
+        if ruta == '/vencidos':
+            multas, _ = self.servicio.biblio.calcular_multas()
+            return 200, [dict(prestamo_a_dict(prestamo), dias_atraso=atraso, multa=monto)
+                         for prestamo, atraso, monto in multas]
+        return 404, {'error': "Ruta no encontrada."}
+
+    def _modificar(self):
+        longitud = int(self.headers.get('Content-Length', 0))
+        datos = json.loads(self.rfile.read(longitud) or b'{}')
+        ruta = urlsplit(self.path).path.rstrip('/')
+
+        if ruta == '/prestamos/lote':
+            resultado = self.servicio.prestar_lote([(item['id_usuario'], item['id_libro'])
+                                                    for item in datos['prestamos']])
+            return (201 if resultado.aplicado else 409), resultado_lote_a_dict(resultado)
+        if ruta == '/devoluciones/lote':
+            resultado = self.servicio.devolver_lote([(item['id_libro'], item.get('estado_devolucion'))
+                                                     for item in datos['devoluciones']])
+            return (200 if resultado.aplicado else 409), resultado_lote_a_dict(resultado)
+        if ruta == '/prestamos':
+            if 'isbn' in datos:
+                return 201, prestamo_a_dict(self.servicio.prestar_ejemplar(datos['id_usuario'], datos['isbn']))
+            return 201, prestamo_a_dict(self.servicio.prestar_libro(datos['id_usuario'], datos['id_libro']))
+        if ruta == '/reservas':
+            reserva = self.servicio.biblio.reservar(datos['id_usuario'], datos.get('isbn') or datos['id_libro'],
+                                                    datos.get('prioridad', 0))
+            return 201, reserva_a_dict(reserva)
+        if ruta == '/devoluciones':
+            prestamo = self.servicio.devolver_libro(datos['id_libro'], datos.get('estado_devolucion'))
+            return 200, prestamo_a_dict(prestamo) if prestamo else {'id_libro': datos['id_libro']}
+        return 404, {'error': "Ruta no encontrada."}
+
+
+def crear_servidor(biblio, host=HOST_SERVIDOR, puerto=PUERTO_SERVIDOR):
+    """Crea el servidor HTTP multihilo sobre una Biblioteca ya cargada"""
+    manejador = type('Manejador', (ManejadorBiblioteca,), {'servicio': ServicioConcurrente(biblio)})
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def percentil(valores, porcentaje):
+    """Percentil por rango más cercano de una lista de valores"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, -(-len(ordenados) * porcentaje // 100) - 1)
+    return ordenados[int(indice)]
+
+
+def generar_carga(host=HOST_SERVIDOR, puerto=PUERTO_SERVIDOR, clientes=4,
+                  operaciones=OPERACIONES_POR_CLIENTE, semilla=None):
+    """
+    Generador de carga local: cada cliente (un hilo con su propia conexión)
+    presta un libro al azar a un usuario al azar y, si lo consigue, lo
+    devuelve. Mide préstamos por segundo y la latencia de cada préstamo
+    """
+    conexion = http.client.HTTPConnection(host, puerto)
+    conexion.request('GET', '/libros')
+    libros = [libro['id_libro'] for libro in json.loads(conexion.getresponse().read())]
+    conexion.request('GET', '/usuarios')
+    usuarios = [usuario['id_usuario'] for usuario in json.loads(conexion.getresponse().read())]
+    conexion.close()
+    if not libros or not usuarios:
+        raise ValueError("El servidor necesita al menos un libro y un usuario para generar carga.")
+
+    latencias = []
+    conflictos = []
+    aleatorio = random.Random(semilla)
+    semillas = [aleatorio.random() for _ in range(clientes)]
+
+    def cliente(semilla_cliente):
+        azar = random.Random(semilla_cliente)
+        conexion = http.client.HTTPConnection(host, puerto)
+        propias, choques = [], 0
+        cabeceras = {'Content-Type': 'application/json'}
+        try:
+            for _ in range(operaciones):
+                id_libro = azar.choice(libros)
+                cuerpo = json.dumps({'id_usuario': azar.choice(usuarios), 'id_libro': id_libro}).encode('utf-8')
+                inicio = time.perf_counter()
+                conexion.request('POST', '/prestamos', cuerpo, cabeceras)
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                propias.append(time.perf_counter() - inicio)
+                if respuesta.status != 201:
+                    choques += 1
+                    continue
+                conexion.request('POST', '/devoluciones', json.dumps({'id_libro': id_libro}).encode('utf-8'), cabeceras)
+                conexion.getresponse().read()
+        finally:
+            conexion.close()
+        latencias.extend(propias)
+        conflictos.append(choques)
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=cliente, args=(semilla_cliente,)) for semilla_cliente in semillas]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    prestamos = len(latencias) - sum(conflictos)
+    return {
+        'clientes': clientes,
+        'prestamos': prestamos,
+        'conflictos': sum(conflictos),
+        'segundos': segundos,
+        'prestamos_por_segundo': prestamos / segundos if segundos else 0.0,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+    }
+
+
+# ==================== MEDICIÓN DE MEMORIA ====================
+
+def _bytes_por_registro(registros, construir):
+    """Memoria retenida (tracemalloc) por cada registro que devuelve construir(i)"""
+    tracemalloc.start()
+    try:
+        inicio = tracemalloc.get_traced_memory()[0]
+        retenidos = [construir(i) for i in range(registros)]
+        usados = tracemalloc.get_traced_memory()[0] - inicio
+    finally:
+        tracemalloc.stop()
+    # Se descuenta la lista que retiene los registros durante la medición
+    usados -= sys.getsizeof(retenidos)
+    del retenidos
+    return usados / registros
+
+
+class _RegistroConDict:
+    """
+    Registro de referencia con __dict__ por instancia, sin textos internados
+    ni fechas como enteros: así eran Libro, Usuario y Prestamo antes de __slots__
+    """
+    def __init__(self, **campos):
+        for nombre, valor in campos.items():
+            setattr(self, nombre, valor)
+
+
+def medir_memoria(registros=REGISTROS_MEMORIA):
+    """
+    Mide los bytes por registro de libros, usuarios y préstamos tal como
+    quedan tras leerlos del almacenamiento (textos nuevos en cada fila, como
+    al interpretar archivos), y de un préstamo devuelto en el historial
+    columnar. Cada medición se compara con los mismos datos guardados en un
+    registro con __dict__. Devuelve un dict nombre -> (bytes con __dict__,
+    bytes actuales)
+    """
+    autores = [f"Autor {n}" for n in range(100)]
+    editoriales = [f"Editorial {n}" for n in range(20)]
+    base = datetime(2024, 1, 1).timestamp()
+    # Estado de devolución como queda al leerlo de un archivo: cada registro
+    # decodifica su propia copia (un literal se compartiría y no se mediría)
+    estado_en_archivo = "Sin observaciones".encode('utf-8')
+
+    def crear_libro(i):
+        # Los textos se copian para imitar una lectura desde archivo (sin compartir)
+        return Libro(f"L{i:07d}", f"Titulo {i}", ''.join(autores[i % 100]),
+                     ''.join(editoriales[i % 20]), ''.join('2024'), f"978{i:010d}")
+
+    def crear_usuario(i):
+        return Usuario(f"U{i:07d}", f"Usuario {i}", f"{i}-9", f"u{i}@correo.cl", f"9{i:08d}", f"Calle {i}")
+
+    libro = crear_libro(0)
+    usuario = crear_usuario(0)
+
+    def crear_prestamo(i):
+        prestamo = Prestamo(usuario, libro)
+        prestamo.fecha_prestamo = datetime.fromtimestamp(base + i * 60)
+        prestamo.fecha_devolucion = datetime.fromtimestamp(base + i * 60 + 86400)
+        prestamo.estado_devolucion = estado_en_archivo.decode('utf-8')
+        return prestamo
+
+    def crear_libro_con_dict(i):
+        return _RegistroConDict(id_libro=f"L{i:07d}", titulo=f"Titulo {i}", autor=''.join(autores[i % 100]),
+                                editorial=''.join(editoriales[i % 20]), fecha_publicacion=''.join('2024'),
+                                isbn=f"978{i:010d}", disponible=True)
+
+    def crear_usuario_con_dict(i):
+        return _RegistroConDict(id_usuario=f"U{i:07d}", nombre=f"Usuario {i}", rut=f"{i}-9",
+                                correo=f"u{i}@correo.cl", telefono=f"9{i:08d}", direccion=f"Calle {i}",
+                                fecha_registro=datetime.now().strftime("%d/%m/%Y %H:%M"), prestamos=set())
+
+    def crear_prestamo_con_dict(i):
+        fecha_prestamo = datetime.fromtimestamp(base + i * 60)
+        return _RegistroConDict(usuario=usuario, libro=libro, fecha_prestamo=fecha_prestamo,
+                                fecha_devolucion=datetime.fromtimestamp(base + i * 60 + 86400),
+                                estado_devolucion=estado_en_archivo.decode('utf-8'),
+                                clave=f'{usuario.id_usuario}_{libro.id_libro}_{fecha_prestamo.strftime("%Y%m%d%H%M%S%f")}')
+
+    prestamo_con_dict = _bytes_por_registro(registros, crear_prestamo_con_dict)
+    resultados = {
+        'libro': (_bytes_por_registro(registros, crear_libro_con_dict), _bytes_por_registro(registros, crear_libro)),
+        'usuario': (_bytes_por_registro(registros, crear_usuario_con_dict),
+                    _bytes_por_registro(registros, crear_usuario)),
+        'prestamo': (prestamo_con_dict, _bytes_por_registro(registros, crear_prestamo)),
+    }
+
+    historial = HistorialColumnar()
+    prestamo = crear_prestamo(0)
+
+    def agregar_devuelto(i):
+        historial.agregar(f"{prestamo.clave}{i}", usuario.id_usuario, libro.id_libro,
+                          int(base) + i * 60, int(base) + i * 60 + 86400, estado_en_archivo.decode('utf-8'))
+
+    # El historial columnar reemplaza al mismo préstamo devuelto con __dict__
+    resultados['prestamo_columnar'] = (prestamo_con_dict, _bytes_por_registro(registros, agregar_devuelto))
+    return resultados
+
+
+# ==================== BANCO DE PRUEBAS (BENCHMARK) ====================
+# Cada tamaño genera (una sola vez, con semilla fija) un conjunto sintético en
+# el mismo formato de archivos .txt que escribe la aplicación dentro de
+# CARPETA_BENCHMARK, y mide carga, préstamo, devolución e informes sobre él
+
+@contextlib.contextmanager
+def en_carpeta(carpeta):
+    """Ejecuta el bloque con la carpeta indicada como directorio de trabajo"""
+    anterior = os.getcwd()
+    os.makedirs(carpeta, exist_ok=True)
+    os.chdir(carpeta)
+    try:
+        yield
+    finally:
+        os.chdir(anterior)
+
+
+def generar_dataset(carpeta, registros, proporcion_activos=PROPORCION_ACTIVOS, semilla=0):
+    """
+    Escribe en carpeta/biblioteca/ un conjunto sintético de `registros` libros
+    y préstamos (y registros // 10 usuarios), con la proporción indicada de
+    préstamos activos. Si ya existe con los mismos parámetros no se regenera.
+    Devuelve un dict con las cantidades generadas
+    """
+    parametros = {'registros': registros, 'proporcion_activos': proporcion_activos, 'semilla': semilla}
+    ruta_parametros = os.path.join(carpeta, 'dataset.json')
+    if os.path.exists(ruta_parametros):
+        with open(ruta_parametros, encoding='utf-8') as archivo:
+            generado = json.load(archivo)
+        if generado['parametros'] == parametros:
+            return generado['cantidades']
+
+    azar = random.Random(semilla)
+    n_usuarios = max(1, registros // 10)
+    activos = int(registros * proporcion_activos)
+    autores = [f"Autor {n}" for n in range(max(1, registros // 50))]
+    base = datetime(2020, 1, 1).timestamp()
+
+    def libro_sintetico(i):
+        return Libro(f"L{i:07d}", f"Titulo {i}", autores[i % len(autores)], "Editorial",
+                     str(1950 + i % 75), f"978{i:010d}")
+
+    with en_carpeta(carpeta):
+        for carpeta_datos in (CARPETA_LIBROS, CARPETA_USUARIOS, CARPETA_PRESTAMOS):
+            os.makedirs(carpeta_datos, exist_ok=True)
+        almacenamiento = AlmacenamientoTexto(durabilidad='rapida')
 
-    # ==================== GESTIÓN DE PRÉSTAMOS ====================
+        usuarios = []
+        with almacenamiento.transaccion():
+            for i in range(n_usuarios):
+                usuario = Usuario(f"U{i:07d}", f"Usuario {i}", f"{i}-{i % 10}", f"usuario{i}@correo.cl",
+                                  f"9{i:08d}", f"Calle {i}")
+                usuarios.append(usuario)
+                almacenamiento.guardar_usuario(usuario)
 
-    def prestar_libro(self, id_usuario, id_libro):
-        """
-        Registra un préstamo de libro a un usuario
-        """
-        if id_usuario not in self.usuarios:
-            print("❌ Usuario no encontrado.")
-            return
-        if id_libro not in self.libros:
-            print("❌ Libro no encontrado.")
-            return
+        for inicio in range(0, registros, TAMANO_LOTE_IMPORTACION):
+            with almacenamiento.transaccion():
+                for i in range(inicio, min(inicio + TAMANO_LOTE_IMPORTACION, registros)):
+                    libro = libro_sintetico(i)
+                    # Los primeros `activos` libros quedan prestados; el resto
+                    # de los préstamos ya fue devuelto y cae en un libro al azar
+                    libro.disponible = i >= activos
+                    almacenamiento.guardar_libro(libro)
 
-        libro = self.libros[id_libro]
-        usuario = self.usuarios[id_usuario]
+                    prestado = libro if i < activos else libro_sintetico(azar.randrange(registros))
+                    prestamo = Prestamo(usuarios[azar.randrange(n_usuarios)], prestado,
+                                        datetime.fromtimestamp(base + i * 60))
+                    if i >= activos:
+                        prestamo.fecha_devolucion = datetime.fromtimestamp(base + i * 60 + azar.randint(1, 30) * 86400)
+                        prestamo.estado_devolucion = "Sin observaciones"
+                    almacenamiento.guardar_prestamo(prestamo)
+        almacenamiento.cerrar()
 
-        if not libro.disponible:
-            print("⚠️ El libro ya está prestado.")
-            return
+    cantidades = {'libros': registros, 'usuarios': n_usuarios, 'prestamos': registros, 'activos': activos}
+    with open(ruta_parametros, 'w', encoding='utf-8') as archivo:
+        json.dump({'parametros': parametros, 'cantidades': cantidades}, archivo)
+    return cantidades
 
-        prestamo = Prestamo(usuario, libro)
-        libro.disponible = False
-        usuario.prestamos.append(prestamo)
-        self.prestamos.append(prestamo)
-        
-        self.guardar_prestamo(prestamo)
-        self.actualizar_libro(libro)
-        
-        print("✅ Préstamo registrado con éxito.")
 
-    def devolver_libro(self, id_libro):
-        """
-        Registra la devolución de un libro con su estado
-        """
-        if id_libro not in self.libros:
-            print("❌ Libro no encontrado.")
-            return
+def resumir_tiempos(tiempos, pico_memoria=None):
+    """Llamadas, total, operaciones por segundo y percentiles (ms) de una lista de duraciones"""
+    total = sum(tiempos)
+    return {
+        'llamadas': len(tiempos),
+        'segundos': total,
+        'por_segundo': len(tiempos) / total if total else 0.0,
+        'p50_ms': percentil(tiempos, 50) * 1000,
+        'p95_ms': percentil(tiempos, 95) * 1000,
+        'p99_ms': percentil(tiempos, 99) * 1000,
+        'pico_memoria_mb': pico_memoria / 2**20 if pico_memoria is not None else None,
+    }
 
-        libro = self.libros[id_libro]
-        if libro.disponible:
-            print("⚠️ Este libro no está prestado.")
-            return
 
-        prestamo_activo = None
-        for prestamo in self.prestamos:
-            if prestamo.libro.id_libro == id_libro and prestamo.fecha_devolucion is None:
-                prestamo_activo = prestamo
-                break
-        
-        if prestamo_activo:
-            print("\n" + "="*90)
-            print("📖 INFORMACIÓN DEL PRÉSTAMO")
-            print("="*90)
-            print(f"Usuario: {prestamo_activo.usuario.nombre}")
-            print(f"Libro: {prestamo_activo.libro.titulo}")
-            print(f"Fecha de préstamo: {prestamo_activo.fecha_prestamo.strftime('%d/%m/%Y %H:%M')}")
-            print("="*90)
-            
-            estado_devolucion = input("\nEstado de devolución del libro: ").strip()
-            if not estado_devolucion:
-                estado_devolucion = "Sin observaciones"
-            
-            prestamo_activo.fecha_devolucion = datetime.now()
-            prestamo_activo.estado_devolucion = estado_devolucion
-            
-            try:
-                prestamo_activo.usuario.prestamos.remove(prestamo_activo)
-            except ValueError:
-                pass
-            
-            self.actualizar_prestamo(prestamo_activo)
-        
-        libro.disponible = True
-        self.actualizar_libro(libro)
-        
-        print("\n" + "="*90)
-        print("✅ Libro devuelto correctamente.")
-        print(f"📝 Estado registrado: {estado_devolucion}")
-        print("="*90)
+def _medir(funcion, *args):
+    """Duración de una llamada en segundos"""
+    inicio = time.perf_counter()
+    funcion(*args)
+    return time.perf_counter() - inicio
 
-    def mostrar_prestamos(self):
-        """
-        Muestra el historial de préstamos
-        """
-        print("\n" + "="*100)
-        print("📋 HISTORIAL DE PRÉSTAMOS")
-        print("="*100)
-        
-        if not self.prestamos:
-            print("No hay préstamos registrados.")
-            return
-        
-        for prestamo in self.prestamos:
+
+def _pico_memoria(funcion, *args):
+    """Memoria máxima (bytes) asignada durante una llamada, según tracemalloc"""
+    tracemalloc.start()
+    try:
+        funcion(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _mostrar_historial_completo(biblio):
+    """Imprime todas las páginas del historial, como la opción 13 sin pausas entre páginas"""
+    numero = 1
+    while True:
+        pagina = biblio.listar_prestamos(numero)
+        for prestamo in pagina.elementos:
             print(prestamo)
-        
-        print("\n" + "="*100)
-        print(f"📊 Total de préstamos: {len(self.prestamos)}")
-        prestamos_activos = sum(1 for p in self.prestamos if p.fecha_devolucion is None)
-        prestamos_devueltos = sum(1 for p in self.prestamos if p.fecha_devolucion is not None)
-        print(f"📖 Activos: {prestamos_activos} | ✅ Devueltos: {prestamos_devueltos}")
-        print("="*100)
+        if not pagina.hay_siguiente:
+            break
+        numero += 1
+    print(biblio.resumen_prestamos())
 
-    def guardar_historial_prestamos(self):
-        """
-        Guarda el historial de préstamos en un archivo dentro de SAVE con subcarpeta por fecha
-        """
-        if not self.prestamos:
-            print("❌ No hay préstamos registrados para guardar.")
-            return
-        
-        try:
-            if not os.path.exists(CARPETA_SAVE):
-                os.makedirs(CARPETA_SAVE)
-            
-            fecha_actual = datetime.now().strftime("%Y-%m-%d")
-            ruta_fecha = os.path.join(CARPETA_SAVE, fecha_actual)
-            
-            if not os.path.exists(ruta_fecha):
-                os.makedirs(ruta_fecha)
-            
-            hora_actual = datetime.now().strftime("%H-%M-%S")
-            nombre_archivo = f"historial_prestamos_{hora_actual}{EXTENSION}"
-            ruta_completa = os.path.join(ruta_fecha, nombre_archivo)
-            
-            with open(ruta_completa, 'w', encoding='utf-8') as archivo:
-                archivo.write("="*100 + "\n")
-                archivo.write(f"HISTORIAL DE PRÉSTAMOS - {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-                archivo.write("="*100 + "\n\n")
-                
-                for idx, prestamo in enumerate(self.prestamos, 1):
-                    archivo.write(f"--- PRÉSTAMO #{idx} ---\n")
-                    archivo.write(f"Usuario ID: {prestamo.usuario.id_usuario}\n")
-                    archivo.write(f"Usuario Nombre: {prestamo.usuario.nombre}\n")
-                    archivo.write(f"Usuario RUT: {prestamo.usuario.rut}\n")
-                    archivo.write(f"Usuario Correo: {prestamo.usuario.correo}\n")
-                    archivo.write(f"Usuario Teléfono: {prestamo.usuario.telefono}\n")
-                    archivo.write(f"\n")
-                    archivo.write(f"Libro ID: {prestamo.libro.id_libro}\n")
-                    archivo.write(f"Libro Título: {prestamo.libro.titulo}\n")
-                    archivo.write(f"Libro Autor: {prestamo.libro.autor}\n")
-                    archivo.write(f"Libro ISBN: {prestamo.libro.isbn}\n")
-                    archivo.write(f"\n")
-                    archivo.write(f"Fecha Préstamo: {prestamo.fecha_prestamo.strftime('%d/%m/%Y %H:%M:%S')}\n")
-                    
-                    if prestamo.fecha_devolucion:
-                        archivo.write(f"Fecha Devolución: {prestamo.fecha_devolucion.strftime('%d/%m/%Y %H:%M:%S')}\n")
-                        archivo.write(f"Estado Devolución: {prestamo.estado_devolucion}\n")
-                    else:
-                        archivo.write(f"Estado: 📖 ACTIVO\n")
-                    
-                    archivo.write("\n")
-                
-                archivo.write("="*100 + "\n")
-                archivo.write(f"RESUMEN:\n")
-                prestamos_activos = sum(1 for p in self.prestamos if p.fecha_devolucion is None)
-                prestamos_devueltos = sum(1 for p in self.prestamos if p.fecha_devolucion is not None)
-                archivo.write(f"Total de préstamos: {len(self.prestamos)}\n")
-                archivo.write(f"Préstamos activos: {prestamos_activos}\n")
-                archivo.write(f"Préstamos devueltos: {prestamos_devueltos}\n")
-                archivo.write("="*100 + "\n")
-            
-            print("\n" + "="*90)
-            print("✅ Historial de préstamos guardado correctamente.")
-            print(f"📁 Ubicación: {ruta_completa}")
-            print(f"📊 Total de préstamos guardados: {len(self.prestamos)}")
-            print("="*90)
-            
-        except Exception as e:
-            print(f"❌ Error al guardar el historial: {e}")
 
-    def eliminar_historial_prestamos(self):
-        """
-        Elimina completamente el historial de préstamos
-        """
-        print("\n" + "="*70)
-        print("⚠️  ELIMINAR HISTORIAL DE PRÉSTAMOS")
-        print("="*70)
-        
-        if not self.prestamos:
-            print("❌ No hay préstamos registrados para eliminar.")
-            return
-        
-        total_prestamos = len(self.prestamos)
-        prestamos_activos = sum(1 for p in self.prestamos if p.fecha_devolucion is None)
-        
-        print(f"\n📊 Total de préstamos registrados: {total_prestamos}")
-        print(f"📖 Préstamos activos: {prestamos_activos}")
-        print(f"✅ Préstamos devueltos: {total_prestamos - prestamos_activos}")
-        
-        if prestamos_activos > 0:
-            print("\n⚠️  ADVERTENCIA: Hay préstamos activos.")
-            print("   Si elimina el historial, se perderá el registro de estos préstamos,")
-            print("   pero los libros seguirán marcados como prestados.")
-        
-        print("\n🗑️  Esta acción eliminará TODOS los archivos de préstamos del directorio.")
-        confirmacion = input("\n¿Está seguro de eliminar TODO el historial? (s/n): ").strip().lower()
-        
-        if confirmacion == 's':
-            try:
-                archivos_eliminados = 0
-                if os.path.exists(CARPETA_PRESTAMOS):
-                    archivos = os.listdir(CARPETA_PRESTAMOS)
-                    for archivo in archivos:
-                        if archivo.endswith(EXTENSION):
-                            os.remove(CARPETA_PRESTAMOS + archivo)
-                            archivos_eliminados += 1
-                
-                self.prestamos.clear()
-                
-                for usuario in self.usuarios.values():
-                    usuario.prestamos.clear()
-                
-                print(f"\n✅ Historial eliminado correctamente.")
-                print(f"📁 {archivos_eliminados} archivo(s) eliminado(s) del directorio.")
-                
-            except Exception as e:
-                print(f"\n❌ Error al eliminar el historial: {e}")
-        else:
-            print("\n❌ Eliminación cancelada.")
+def medir_dataset(carpeta, motor=MOTOR_ALMACENAMIENTO, durabilidad=DURABILIDAD,
+                  operaciones=OPERACIONES_BENCHMARK, repeticiones=REPETICIONES_INFORME):
+    """
+    Mide sobre un conjunto ya generado: cargar_datos, prestar_libro,
+    devolver_libro, mostrar_prestamos y guardar_historial_prestamos.
+    Los tiempos se toman sin tracemalloc; el pico de memoria se mide en
+    una pasada aparte de cada operación
+    """
+    resultados = {}
+    with en_carpeta(carpeta), open(os.devnull, 'w', encoding='utf-8') as nulo:
+        if motor != 'texto':
+            destino = crear_almacenamiento(motor, durabilidad=durabilidad)
+            migrar_desde_texto(destino)
+            destino.cerrar()
 
-    # ==================== FUNCIONES DE PERSISTENCIA ====================
+        def abrir():
+            return Biblioteca(crear_almacenamiento(motor, durabilidad=durabilidad))
 
-    def guardar_libro(self, id_libro, titulo, autor, editorial, fecha_publicacion, isbn):
-        """Guarda un libro en archivo .txt"""
-        with open(CARPETA_LIBROS + id_libro + EXTENSION, 'w', encoding='utf-8') as archivo:
-            archivo.write(f'ID: {id_libro}\n')
-            archivo.write(f'Título: {titulo}\n')
-            archivo.write(f'Autor: {autor}\n')
-            archivo.write(f'Editorial: {editorial}\n')
-            archivo.write(f'Fecha Publicación: {fecha_publicacion}\n')
-            archivo.write(f'ISBN: {isbn}\n')
-            archivo.write(f'Disponible: True\n')
+        inicio = time.perf_counter()
+        biblio = abrir()
+        segundos_carga = time.perf_counter() - inicio
+        tiempos_carga = dict(biblio.tiempos_carga)
+        biblio.cerrar()
+        biblio = None
+        pico_carga = _pico_memoria(lambda: abrir().cerrar())
+        resultados['cargar_datos'] = resumir_tiempos([segundos_carga], pico_carga)
+        resultados['cargar_datos']['colecciones'] = tiempos_carga
 
-    def actualizar_libro(self, libro):
-        """Actualiza el estado de disponibilidad de un libro"""
-        with open(CARPETA_LIBROS + libro.id_libro + EXTENSION, 'w', encoding='utf-8') as archivo:
-            archivo.write(f'ID: {libro.id_libro}\n')
-            archivo.write(f'Título: {libro.titulo}\n')
-            archivo.write(f'Autor: {libro.autor}\n')
-            archivo.write(f'Editorial: {libro.editorial}\n')
-            archivo.write(f'Fecha Publicación: {libro.fecha_publicacion}\n')
-            archivo.write(f'ISBN: {libro.isbn}\n')
-            archivo.write(f'Disponible: {libro.disponible}\n')
+        biblio = abrir()
+        try:
+            usuarios = list(biblio.usuarios)
+            disponibles = [libro.id_libro for libro in biblio.libros.values() if libro.disponible][:operaciones]
+            pares = [(usuarios[i % len(usuarios)], id_libro) for i, id_libro in enumerate(disponibles)]
 
-    def guardar_usuario(self, id_usuario, nombre, rut, correo, telefono, direccion):
-        """Guarda un usuario en archivo .txt"""
-        with open(CARPETA_USUARIOS + id_usuario + EXTENSION, 'w', encoding='utf-8') as archivo:
-            archivo.write(f'ID: {id_usuario}\n')
-            archivo.write(f'Nombre: {nombre}\n')
-            archivo.write(f'RUT: {rut}\n')
-            archivo.write(f'Correo: {correo}\n')
-            archivo.write(f'Teléfono: {telefono}\n')
-            archivo.write(f'Dirección: {direccion}\n')
-            archivo.write(f'Fecha Registro: {datetime.now().strftime("%d/%m/%Y %H:%M")}\n')
+            tiempos = [_medir(biblio.prestar_libro, id_usuario, id_libro) for id_usuario, id_libro in pares]
+            resultados['prestar_libro'] = resumir_tiempos(tiempos)
+            tiempos = [_medir(biblio.devolver_libro, id_libro) for _, id_libro in pares]
+            resultados['devolver_libro'] = resumir_tiempos(tiempos)
+            if pares:
+                resultados['prestar_libro']['pico_memoria_mb'] = _pico_memoria(biblio.prestar_libro, *pares[0]) / 2**20
+                resultados['devolver_libro']['pico_memoria_mb'] = _pico_memoria(biblio.devolver_libro, pares[0][1]) / 2**20
 
-    def guardar_prestamo(self, prestamo):
-        """Guarda un préstamo en archivo .txt"""
-        nombre_archivo = f'{prestamo.usuario.id_usuario}_{prestamo.libro.id_libro}_{prestamo.fecha_prestamo.strftime("%Y%m%d%H%M%S")}'
-        with open(CARPETA_PRESTAMOS + nombre_archivo + EXTENSION, 'w', encoding='utf-8') as archivo:
-            archivo.write(f'Usuario ID: {prestamo.usuario.id_usuario}\n')
-            archivo.write(f'Usuario Nombre: {prestamo.usuario.nombre}\n')
-            archivo.write(f'Libro ID: {prestamo.libro.id_libro}\n')
-            archivo.write(f'Libro Título: {prestamo.libro.titulo}\n')
-            archivo.write(f'Fecha Préstamo: {prestamo.fecha_prestamo.strftime("%d/%m/%Y %H:%M")}\n')
-            if prestamo.fecha_devolucion:
-                archivo.write(f'Fecha Devolución: {prestamo.fecha_devolucion.strftime("%d/%m/%Y %H:%M")}\n')
-            if prestamo.estado_devolucion:
-                archivo.write(f'Estado Devolución: {prestamo.estado_devolucion}\n')
+            with contextlib.redirect_stdout(nulo):
+                tiempos = [_medir(_mostrar_historial_completo, biblio) for _ in range(repeticiones)]
+                pico = _pico_memoria(_mostrar_historial_completo, biblio)
+            resultados['mostrar_prestamos'] = resumir_tiempos(tiempos, pico)
 
-    def actualizar_prestamo(self, prestamo):
-        """Actualiza un préstamo existente en archivo .txt"""
-        nombre_archivo = f'{prestamo.usuario.id_usuario}_{prestamo.libro.id_libro}_{prestamo.fecha_prestamo.strftime("%Y%m%d%H%M%S")}'
-        with open(CARPETA_PRESTAMOS + nombre_archivo + EXTENSION, 'w', encoding='utf-8') as archivo:
-            archivo.write(f'Usuario ID: {prestamo.usuario.id_usuario}\n')
-            archivo.write(f'Usuario Nombre: {prestamo.usuario.nombre}\n')
-            archivo.write(f'Libro ID: {prestamo.libro.id_libro}\n')
-            archivo.write(f'Libro Título: {prestamo.libro.titulo}\n')
-            archivo.write(f'Fecha Préstamo: {prestamo.fecha_prestamo.strftime("%d/%m/%Y %H:%M")}\n')
-            if prestamo.fecha_devolucion:
-                archivo.write(f'Fecha Devolución: {prestamo.fecha_devolucion.strftime("%d/%m/%Y %H:%M")}\n')
-            if prestamo.estado_devolucion:
-                archivo.write(f'Estado Devolución: {prestamo.estado_devolucion}\n')
+            tiempos = [_medir(biblio.guardar_historial_prestamos) for _ in range(repeticiones)]
+            resultados['guardar_historial_prestamos'] = resumir_tiempos(
+                tiempos, _pico_memoria(biblio.guardar_historial_prestamos))
+        finally:
+            biblio.cerrar()
+            if os.path.isdir(CARPETA_SAVE):
+                shutil.rmtree(CARPETA_SAVE)
+    return resultados
 
-    def cargar_datos(self):
-        """Carga todos los datos desde archivos al iniciar"""
-        self.cargar_libros()
-        self.cargar_usuarios()
-        self.cargar_prestamos()
 
-    def cargar_libros(self):
-        """Carga libros desde archivos"""
-        if not os.path.exists(CARPETA_LIBROS):
-            return
+def ejecutar_benchmark(tamanos=TAMANOS_BENCHMARK, proporcion_activos=PROPORCION_ACTIVOS,
+                       motor=MOTOR_ALMACENAMIENTO, durabilidad=DURABILIDAD,
+                       operaciones=OPERACIONES_BENCHMARK, carpeta=CARPETA_BENCHMARK):
+    """
+    Genera (o reutiliza) un conjunto por tamaño y lo mide. Cada medición
+    parte de una copia limpia del conjunto para que las corridas se puedan
+    comparar. Devuelve el informe completo como dict (serializable a JSON)
+    """
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'motor': motor,
+        'durabilidad': durabilidad,
+        'proporcion_activos': proporcion_activos,
+        'resultados': [],
+    }
+    for registros in tamanos:
+        origen = os.path.join(carpeta, f"datos_{registros}_{proporcion_activos}")
+        cantidades = generar_dataset(origen, registros, proporcion_activos)
+        trabajo = os.path.join(carpeta, 'trabajo')
+        if os.path.isdir(trabajo):
+            shutil.rmtree(trabajo)
+        shutil.copytree(os.path.join(origen, 'biblioteca'), os.path.join(trabajo, 'biblioteca'))
+        try:
+            operaciones_medidas = medir_dataset(trabajo, motor, durabilidad, operaciones)
+        finally:
+            shutil.rmtree(trabajo)
+        informe['resultados'].append({'registros': registros, **cantidades, 'operaciones': operaciones_medidas})
+    return informe
 
-        archivos = os.listdir(CARPETA_LIBROS)
-        for archivo in archivos:
-            if archivo.endswith(EXTENSION):
-                try:
-                    with open(CARPETA_LIBROS + archivo, 'r', encoding='utf-8') as f:
-                        lineas = f.readlines()
-                        id_libro = lineas[0].split(': ')[1].strip()
-                        titulo = lineas[1].split(': ')[1].strip()
-                        autor = lineas[2].split(': ')[1].strip()
-                        editorial = lineas[3].split(': ')[1].strip()
-                        fecha_publicacion = lineas[4].split(': ')[1].strip()
-                        isbn = lineas[5].split(': ')[1].strip()
-                        disponible = lineas[6].split(': ')[1].strip() == 'True'
-                        
-                        libro = Libro(id_libro, titulo, autor, editorial, fecha_publicacion, isbn)
-                        libro.disponible = disponible
-                        self.libros[id_libro] = libro
-                except Exception as e:
-                    print(f"Error cargando libro {archivo}: {e}")
-
-    def cargar_usuarios(self):
-        """Carga usuarios desde archivos"""
-        if not os.path.exists(CARPETA_USUARIOS):
-            return
-
-        archivos = os.listdir(CARPETA_USUARIOS)
-        for archivo in archivos:
-            if archivo.endswith(EXTENSION):
-                try:
-                    with open(CARPETA_USUARIOS + archivo, 'r', encoding='utf-8') as f:
-                        lineas = f.readlines()
-                        id_usuario = lineas[0].split(': ')[1].strip()
-                        nombre = lineas[1].split(': ')[1].strip()
-                        rut = lineas[2].split(': ')[1].strip()
-                        correo = lineas[3].split(': ')[1].strip()
-                        telefono = lineas[4].split(': ')[1].strip()
-                        direccion = lineas[5].split(': ')[1].strip()
-                        
-                        self.usuarios[id_usuario] = Usuario(id_usuario, nombre, rut, correo, telefono, direccion)
-                except Exception as e:
-                    print(f"Error cargando usuario {archivo}: {e}")
-
-    def cargar_prestamos(self):
-        """Carga préstamos desde archivos"""
-        if not os.path.exists(CARPETA_PRESTAMOS):
-            return
-
-        archivos = os.listdir(CARPETA_PRESTAMOS)
-        for archivo in archivos:
-            if archivo.endswith(EXTENSION):
-                try:
-                    with open(CARPETA_PRESTAMOS + archivo, 'r', encoding='utf-8') as f:
-                        lineas = f.readlines()
-                        id_usuario = lineas[0].split(': ')[1].strip()
-                        nombre_usuario = lineas[1].split(': ')[1].strip()
-                        id_libro = lineas[2].split(': ')[1].strip()
-                        titulo_libro = lineas[3].split(': ')[1].strip()
-                        fecha_prestamo_str = lineas[4].split(': ')[1].strip()
-                        fecha_devolucion_str = None
-                        estado_devolucion = None
-                        
-                        if len(lineas) > 5:
-                            if lineas[5].startswith('Fecha Devolución:'):
-                                fecha_devolucion_str = lineas[5].split(': ')[1].strip()
-                        
-                        if len(lineas) > 6:
-                            if lineas[6].startswith('Estado Devolución:'):
-                                estado_devolucion = lineas[6].split(': ')[1].strip()
-                        
-                        if id_usuario in self.usuarios and id_libro in self.libros:
-                            usuario = self.usuarios[id_usuario]
-                            libro = self.libros[id_libro]
-                            prestamo = Prestamo(usuario, libro)
-                            
-                            prestamo.fecha_prestamo = datetime.strptime(fecha_prestamo_str, "%d/%m/%Y %H:%M")
-                            
-                            if fecha_devolucion_str:
-                                prestamo.fecha_devolucion = datetime.strptime(fecha_devolucion_str, "%d/%m/%Y %H:%M")
-                            
-                            if estado_devolucion:
-                                prestamo.estado_devolucion = estado_devolucion
-                            
-                            self.prestamos.append(prestamo)
-                            
-                            if not prestamo.fecha_devolucion:
-                                usuario.prestamos.append(prestamo)
-                except Exception as e:
-                    print(f"Error cargando préstamo {archivo}: {e}")
+
+def comparar_benchmark(anterior, actual):
+    """
+    Compara dos informes: por tamaño y operación devuelve
+    (registros, operación, por_segundo anterior, actual, variación %)
+    """
+    previos = {(r['registros'], nombre): datos['por_segundo']
+               for r in anterior['resultados'] for nombre, datos in r['operaciones'].items()}
+    for resultado in actual['resultados']:
+        for nombre, datos in resultado['operaciones'].items():
+            previo = previos.get((resultado['registros'], nombre))
+            if previo:
+                yield (resultado['registros'], nombre, previo, datos['por_segundo'],
+                       (datos['por_segundo'] - previo) / previo * 100)
 
 
 # ==================== FUNCIONES AUXILIARES ====================
@@ -753,27 +5307,539 @@ def mostrar_menu():
     print("13. Mostrar Historial de Préstamos")
     print("14. Guardar Historial en SAVE")
     print("15. Eliminar Historial de Préstamos")
+    print("19. Reservas y Lista de Espera")
+    print("20. Vencimientos y Multas")
+    print("21. Estadísticas de Circulación")
+    print("22. Préstamos y Devoluciones en Lote")
+    print("\n--- BÚSQUEDA AVANZADA ---")
+    print("16. Buscar Libros por ISBN, Título, Autor o Texto Libre")
+    print("17. Buscar Usuario por RUT o Correo")
+    print("\n--- DIAGNÓSTICO ---")
+    print("18. Ver Instrumentación")
     print("\n--- SISTEMA ---")
     print("0.  Salir del Sistema")
     print("="*70)
 
 
+# ==================== INTERFAZ DE CONSOLA ====================
+# Cliente delgado sobre Biblioteca: toda la entrada (input) y salida (print)
+# del menú vive aquí; la clase Biblioteca no interactúa con la terminal
+
+def mostrar_libro(libro):
+    """Muestra la ficha completa de un libro"""
+    print("\n🔍 Libro encontrado:")
+    print("="*90)
+    print(f"ID: {libro.id_libro}")
+    print(f"Título: {libro.titulo}")
+    print(f"Autor: {libro.autor}")
+    print(f"Editorial: {libro.editorial}")
+    print(f"Fecha de Publicación: {libro.fecha_publicacion}")
+    print(f"ISBN: {libro.isbn}")
+    print(f"Estado: {'Disponible' if libro.disponible else 'Prestado'}")
+    print("="*90)
+
+
+def recorrer_paginas(obtener_pagina, mostrar_elemento):
+    """
+    Muestra un listado página a página: Enter avanza, un número salta a esa
+    página y 'q' termina. Devuelve False si el listado estaba vacío
+    """
+    numero = 1
+    while True:
+        pagina = obtener_pagina(numero)
+        if not pagina.elementos:
+            return numero > 1
+        
+        for elemento in pagina.elementos:
+            mostrar_elemento(elemento)
+        
+        de_total = f" de {pagina.total_paginas}" if pagina.total is not None else ""
+        print(f"\n📄 Página {pagina.numero}{de_total}")
+        if not pagina.hay_siguiente:
+            return True
+        
+        respuesta = input("Enter = siguiente página | número = ir a esa página | q = terminar: ").strip().lower()
+        if respuesta == 'q':
+            return True
+        numero = int(respuesta) if respuesta.isdigit() and int(respuesta) > 0 else numero + 1
+
+
+def mostrar_libros(biblio):
+    """Muestra el catálogo por páginas, con filtro de disponibilidad"""
+    filtro = input("Mostrar (1) Todos, (2) Disponibles o (3) Prestados [Enter = todos]: ").strip()
+    disponible = {'2': True, '3': False}.get(filtro)
+    
+    print("\n" + "="*90)
+    print("📚 CATÁLOGO DE LIBROS")
+    print("="*90)
+    
+    def mostrar_libro_listado(libro):
+        print(libro)
+        print(f"    ISBN: {libro.isbn}")
+    
+    if not recorrer_paginas(lambda numero: biblio.listar_libros(numero, disponible=disponible), mostrar_libro_listado):
+        print("No hay libros registrados.")
+        return
+    
+    total, disponibles, prestados = biblio.resumen_libros()
+    print("\n" + "="*90)
+    print(f"📊 Total de libros: {total} | Disponibles: {disponibles} | Prestados: {prestados}")
+    print("="*90)
+
+
+def mostrar_usuario(usuario):
+
+    """Muestra la ficha completa de un usuario"""
+    print("\n🔍 Usuario encontrado:")
+    print("="*90)
+    print(f"ID: {usuario.id_usuario}")
+    print(f"Nombre: {usuario.nombre}")
+    print(f"RUT: {usuario.rut}")
+    print(f"Correo: {usuario.correo}")
+    print(f"Teléfono: {usuario.telefono}")
+    print(f"Dirección: {usuario.direccion}")
+    print(f"Préstamos activos: {len(usuario.prestamos)}")
+    
+    if usuario.prestamos:
+        print("\nLibros prestados:")
+        for prestamo in usuario.prestamos:
+            print(f"  - {prestamo.libro.titulo}")
+    
+    print("="*90)
+
+
+def mostrar_usuarios(biblio):
+    """Muestra los usuarios registrados por páginas"""
+    print("\n" + "="*90)
+    print("👥 LISTA DE USUARIOS")
+    print("="*90)
+    
+    def mostrar_usuario_listado(usuario):
+        print(usuario)
+        print(f"    Correo: {usuario.correo} | Dirección: {usuario.direccion}")
+    
+    if not recorrer_paginas(biblio.listar_usuarios, mostrar_usuario_listado):
+        print("No hay usuarios registrados.")
+        return
+    
+    print("\n" + "="*90)
+    print(f"📊 Total de usuarios: {len(biblio.usuarios)}")
+    print("="*90)
+
+
+def mostrar_prestamos(biblio):
+    """Muestra el historial de préstamos por páginas, con filtros opcionales"""
+    print("(Presiona Enter para omitir cada filtro)")
+    estado = {'1': 'activo', '2': 'devuelto'}.get(input("Estado: (1) Activos o (2) Devueltos: ").strip())
+    id_usuario = input("ID del usuario: ").strip() or None
+    desde = input("Desde (DD/MM/AAAA): ").strip()
+    hasta = input("Hasta (DD/MM/AAAA): ").strip()
+    desde = datetime.strptime(desde, "%d/%m/%Y") if desde else None
+    hasta = datetime.strptime(hasta + " 23:59:59", "%d/%m/%Y %H:%M:%S") if hasta else None
+    
+    print("\n" + "="*100)
+    print("📋 HISTORIAL DE PRÉSTAMOS")
+    print("="*100)
+    
+    def obtener_pagina(numero):
+        return biblio.listar_prestamos(numero, estado=estado, id_usuario=id_usuario, desde=desde, hasta=hasta)
+    
+    if not recorrer_paginas(obtener_pagina, print):
+        print("No hay préstamos registrados.")
+        return
+    
+    total_prestamos, prestamos_activos = biblio.resumen_prestamos()
+    print("\n" + "="*100)
+    print(f"📊 Total de préstamos: {total_prestamos}")
+    print(f"📖 Activos: {prestamos_activos} | ✅ Devueltos: {total_prestamos - prestamos_activos}")
+    print("="*100)
+
+
+def menu_editar_libro(biblio, id_libro):
+
+    """Pide los nuevos datos de un libro y lo actualiza"""
+    libro = biblio.buscar_libro(id_libro)
+    print(f"\n📝 Editando libro: {libro.titulo}")
+    print("(Presiona Enter para mantener el valor actual)")
+    
+    biblio.editar_libro(
+        id_libro,
+        titulo=input(f"Título [{libro.titulo}]: ").strip(),
+        autor=input(f"Autor [{libro.autor}]: ").strip(),
+        editorial=input(f"Editorial [{libro.editorial}]: ").strip(),
+        fecha_publicacion=input(f"Fecha de Publicación [{libro.fecha_publicacion}]: ").strip(),
+        isbn=input(f"ISBN [{libro.isbn}]: ").strip(),
+    )
+    print("✅ Libro actualizado correctamente.")
+
+
+def menu_eliminar_libro(biblio, id_libro):
+    """Pide confirmación y elimina un libro"""
+    libro = biblio.buscar_libro(id_libro)
+    if not libro.disponible:
+        raise LibroPrestado("No se puede eliminar un libro que está prestado.\n   Por favor, espere a que sea devuelto.")
+    
+    confirmacion = input(f"¿Está seguro de eliminar '{libro.titulo}'? (s/n): ").strip().lower()
+    if confirmacion == 's':
+        biblio.eliminar_libro(id_libro)
+        print("✅ Libro eliminado correctamente.")
+    else:
+        print("❌ Eliminación cancelada.")
+
+
+def menu_editar_usuario(biblio, id_usuario):
+    """Pide los nuevos datos de un usuario y lo actualiza"""
+    usuario = biblio.buscar_usuario(id_usuario)
+    print(f"\n📝 Editando usuario: {usuario.nombre}")
+    print("(Presiona Enter para mantener el valor actual)")
+    
+    biblio.editar_usuario(
+        id_usuario,
+        nombre=input(f"Nombre [{usuario.nombre}]: ").strip(),
+        rut=input(f"RUT [{usuario.rut}]: ").strip(),
+        correo=input(f"Correo [{usuario.correo}]: ").strip(),
+        telefono=input(f"Teléfono [{usuario.telefono}]: ").strip(),
+        direccion=input(f"Dirección [{usuario.direccion}]: ").strip(),
+    )
+    print("✅ Usuario actualizado correctamente.")
+
+
+def menu_eliminar_usuario(biblio, id_usuario):
+    """Pide confirmación y elimina un usuario"""
+    usuario = biblio.buscar_usuario(id_usuario)
+    if len(usuario.prestamos) > 0:
+        raise UsuarioConPrestamos(
+            "No se puede eliminar un usuario con préstamos activos.\n"
+            f"   El usuario tiene {len(usuario.prestamos)} libro(s) prestado(s).")
+    
+    confirmacion = input(f"¿Está seguro de eliminar a '{usuario.nombre}'? (s/n): ").strip().lower()
+    if confirmacion == 's':
+        biblio.eliminar_usuario(id_usuario)
+        print("✅ Usuario eliminado correctamente.")
+    else:
+        print("❌ Eliminación cancelada.")
+
+
+def menu_devolver_libro(biblio, id_libro):
+    """Muestra el préstamo abierto, pide el estado del libro y registra la devolución"""
+    prestamo_activo = biblio.obtener_prestamo_activo(id_libro)
+    estado_devolucion = None
+    
+    if prestamo_activo:
+        print("\n" + "="*90)
+        print("📖 INFORMACIÓN DEL PRÉSTAMO")
+        print("="*90)
+        print(f"Usuario: {prestamo_activo.usuario.nombre}")
+        print(f"Libro: {prestamo_activo.libro.titulo}")
+        print(f"Fecha de préstamo: {prestamo_activo.fecha_prestamo.strftime('%d/%m/%Y %H:%M')}")
+        print(f"Vencimiento: {prestamo_activo.fecha_vencimiento.strftime('%d/%m/%Y %H:%M')}")
+        print("="*90)
+        
+        estado_devolucion = input("\nEstado de devolución del libro: ").strip()
+    
+    prestamo = biblio.devolver_libro(id_libro, estado_devolucion)
+    
+    print("\n" + "="*90)
+    print("✅ Libro devuelto correctamente.")
+    print(f"📝 Estado registrado: {prestamo.estado_devolucion if prestamo else 'Sin observaciones'}")
+    if prestamo:
+        atraso, monto = biblio.multa(prestamo)
+        if atraso:
+            print(f"💰 Devuelto con {atraso} día(s) de atraso. Multa: ${monto:,}".replace(',', '.'))
+    reserva = biblio.apartados.get(id_libro)
+    if reserva is not None:
+        print(f"📌 Apartado para {reserva.usuario.nombre} ({reserva.usuario.id_usuario}) "
+              f"hasta el {epoca_a_fecha(reserva.vence).strftime('%d/%m/%Y %H:%M')}")
+    print("="*90)
+
+
+def menu_reservas(biblio):
+    """Muestra las reservas de un usuario y permite reservar un título o cancelar una reserva"""
+    print("\n--- RESERVAS Y LISTA DE ESPERA ---")
+    id_usuario = input("ID del usuario: ").strip()
+    reservas = biblio.reservas_de_usuario(id_usuario)
+    
+    print("\n" + "="*90)
+    if not reservas:
+        print("El usuario no tiene reservas vigentes.")
+    for numero, reserva in enumerate(reservas, 1):
+        if reserva.estado == ASIGNADA:
+            detalle = (f"📌 Ejemplar {reserva.libro.id_libro} apartado hasta el "
+                       f"{epoca_a_fecha(reserva.vence).strftime('%d/%m/%Y %H:%M')}")
+        else:
+            detalle = f"⏳ Lugar en la lista de espera: {biblio.posicion_en_espera(reserva)}"
+        print(f"{numero}. ISBN {reserva.titulo} - solicitada el {reserva.fecha_solicitud.strftime('%d/%m/%Y %H:%M')} | {detalle}")
+    print("="*90)
+    
+    accion = input("(1) Reservar un título, (2) Cancelar una reserva [Enter = volver]: ").strip()
+    if accion == '1':
+        id_libro = input("ID del libro o ISBN del título: ").strip()
+        prioridad = input("Prioridad (número, mayor = antes) [Enter = 0]: ").strip()
+        reserva = biblio.reservar(id_usuario, id_libro, int(prioridad) if prioridad else 0)
+        print(f"✅ Reserva registrada. Lugar en la lista de espera: {biblio.posicion_en_espera(reserva)}")
+    elif accion == '2' and reservas:
+        numero = input("Número de la reserva a cancelar: ").strip()
+        if not numero.isdigit() or not 1 <= int(numero) <= len(reservas):
+            print("❌ Número de reserva inválido.")
+            return
+        biblio.cancelar_reserva(reservas[int(numero) - 1].clave)
+        print("✅ Reserva cancelada.")
+
+
+def menu_vencimientos(biblio):
+    """Muestra los préstamos vencidos con su multa y los que vencen en los próximos días"""
+    dias = input(f"Mostrar también los que vencen en los próximos N días [Enter = {DIAS_AVISO_VENCIMIENTO}]: ").strip()
+    dias = int(dias) if dias.isdigit() else DIAS_AVISO_VENCIMIENTO
+    multas, por_usuario = biblio.calcular_multas()
+    
+    print("\n" + "="*90)
+    print(f"⏰ PRÉSTAMOS VENCIDOS ({len(multas)})")
+    print("="*90)
+    for prestamo, atraso, monto in multas:
+        print(f"{prestamo.usuario.nombre} → {prestamo.libro.titulo} | "
+              f"Venció: {prestamo.fecha_vencimiento.strftime('%d/%m/%Y')} | "
+              f"{atraso} día(s) | Multa: ${monto:,}".replace(',', '.'))
+    if por_usuario:
+        print(f"\n💰 Total adeudado: ${sum(por_usuario.values()):,} entre {len(por_usuario)} usuario(s)".replace(',', '.'))
+    
+    por_vencer = biblio.prestamos_por_vencer(dias)
+    print("\n" + "="*90)
+    print(f"📅 VENCEN EN LOS PRÓXIMOS {dias} DÍA(S) ({len(por_vencer)})")
+    print("="*90)
+    for prestamo in por_vencer:
+        print(f"{prestamo.usuario.nombre} → {prestamo.libro.titulo} | "
+              f"Vence: {prestamo.fecha_vencimiento.strftime('%d/%m/%Y %H:%M')}")
+    print("="*90)
+
+
+def mostrar_resultado_lote(resultado):
+    """Muestra el detalle por ítem de un préstamo o devolución en lote"""
+    print("\n" + "="*90)
+    for indice, (elemento, error, prestamo) in enumerate(resultado.items):
+        icono = '❌' if error else ('✅' if resultado.aplicado else '⏸️ ')
+        detalle = f" | Vence: {prestamo.fecha_vencimiento.strftime('%d/%m/%Y')}" if prestamo and not prestamo.fecha_devolucion else ""
+        elemento = ' → '.join(elemento) if isinstance(elemento, tuple) else elemento
+        print(f"{icono} {elemento}: {resultado.estado(indice)}{detalle}")
+    print("="*90)
+    print(f"📊 {resultado}")
+
+
+def mostrar_recarga(resultado):
+    """Informa los cambios externos aplicados por la recarga en caliente (nada si no hubo)"""
+    if not resultado:
+        return
+    print(f"\n🔄 Cambios externos aplicados: {resultado}")
+    for motivo in resultado.conflictos:
+        print(f"   ⚠️  {motivo}")
+
+
+def menu_lote(biblio):
+    """Presta varios libros a un usuario o recibe varias devoluciones en una sola operación"""
+    print("\n--- PRÉSTAMOS Y DEVOLUCIONES EN LOTE ---")
+    modo = input("(1) Prestar varios libros a un usuario o (2) Devolver varios libros: ").strip()
+    if modo == '1':
+        id_usuario = input("ID del usuario: ").strip()
+        ids = input("IDs de los libros (separados por comas o espacios): ").replace(',', ' ').split()
+        resultado = biblio.prestar_lote([(id_usuario, id_libro) for id_libro in ids])
+    elif modo == '2':
+        ids = input("IDs de los libros (separados por comas o espacios): ").replace(',', ' ').split()
+        estado_devolucion = input("Estado de devolución (el mismo para todos): ").strip() or None
+        resultado = biblio.devolver_lote([(id_libro, estado_devolucion) for id_libro in ids])
+    else:
+        print("❌ Opción inválida.")
+        return
+    mostrar_resultado_lote(resultado)
+
+
+def barra(cantidad, maximo, ancho=30):
+    """Barra proporcional de texto para los gráficos de la consola"""
+    return '█' * max(1 if cantidad else 0, round(ancho * cantidad / maximo)) if maximo else ''
+
+
+def mostrar_estadisticas(biblio, limite=TOP_ESTADISTICAS, semanas=12):
+    """Muestra los rankings, los mapas de calor y la actividad del historial de préstamos"""
+    analitica = biblio.estadisticas()
+    print("\n" + "="*90)
+    print(f"📈 ESTADÍSTICAS DE CIRCULACIÓN ({len(analitica)} préstamos)")
+    print("="*90)
+    
+    print(f"\n🏆 Top {limite} títulos más prestados:")
+    for puesto, ((titulo, isbn), cantidad) in enumerate(analitica.top_titulos(limite), 1):
+        print(f"{puesto:>3}. {titulo} (ISBN {isbn}) — {cantidad}")
+    print(f"\n✍️  Top {limite} autores más prestados:")
+    for puesto, (autor, cantidad) in enumerate(analitica.top_autores(limite), 1):
+        print(f"{puesto:>3}. {autor} — {cantidad}")
+    
+    duracion, devueltos = analitica.duracion_promedio()
+    if duracion is not None:
+        print(f"\n⏳ Duración promedio: {duracion.days} día(s) y {duracion.seconds // 3600} hora(s) "
+              f"sobre {devueltos} devolución(es)")
+    
+    por_semana = list(analitica.prestamos_por_semana().items())[-semanas:]
+    maximo = max((cantidad for _, cantidad in por_semana), default=0)
+    print(f"\n📅 Préstamos por semana (últimas {len(por_semana)}):")
+    for (anio, semana), cantidad in por_semana:
+        print(f"   {anio}-S{semana:02d} {cantidad:>7} {barra(cantidad, maximo)}")
+    
+    por_dia = list(analitica.prestamos_por_dia().items())[-semanas * 7:]
+    maximo = max((cantidad for _, cantidad in por_dia), default=0)
+    print(f"\n🗓️  Préstamos por día (últimos {len(por_dia)} días con préstamos):")
+    for fecha, cantidad in por_dia:
+        print(f"   {fecha.strftime('%d/%m/%Y')} {DIAS_SEMANA[fecha.weekday()]} {cantidad:>6} {barra(cantidad, maximo)}")
+    
+    matriz = analitica.mapa_calor()
+    maximo = max(map(max, matriz))
+    niveles = ' ░▒▓█'
+    print("\n🔥 Mapa de calor por día de la semana y hora (░▒▓█ = más préstamos):")
+    print("        " + "".join(f"{hora:<3}" for hora in range(0, 24, 3)))
+    for dia, fila in zip(DIAS_SEMANA, matriz):
+        celdas = "".join(niveles[-(-(len(niveles) - 1) * cantidad // maximo)] if maximo else ' ' for cantidad in fila)
+        print(f"   {dia}  {celdas}")
+    
+    print("\n👥 Usuarios más activos:")
+    for usuario, cantidad, activos, ultimo in analitica.actividad_usuarios(limite):
+        ultimo_texto = ultimo.strftime('%d/%m/%Y') if ultimo else '-'
+        print(f"   {usuario.nombre} ({usuario.id_usuario}) — {cantidad} préstamo(s), "
+              f"{activos} activo(s), último: {ultimo_texto}")
+    print("="*90)
+
+
+def menu_guardar_historial(biblio):
+    """Guarda el historial de préstamos en SAVE (completo o incremental) o lo reconstruye e informa la ubicación"""
+    modo = input("Guardar (1) Completo, (2) Incremental o (3) Reconstruir desde las copias incrementales [Enter = completo]: ").strip()
+    try:
+        if modo == '3':
+            ruta_completa, total_prestamos, copias = reconstruir_historial_prestamos()
+        else:
+            ruta_completa, total_prestamos = biblio.guardar_historial_prestamos(incremental=modo == '2')
+    except OSError as e:
+        print(f"❌ Error al guardar el historial: {e}")
+        return
+    
+    print("\n" + "="*90)
+    if modo == '3':
+        print(f"✅ Historial reconstruido a partir de {copias} copia(s) incremental(es).")
+    elif modo == '2':
+        print("✅ Copia incremental del historial guardada correctamente.")
+    else:
+        print("✅ Historial de préstamos guardado correctamente.")
+    print(f"📁 Ubicación: {ruta_completa}")
+    print(f"📊 Total de préstamos guardados: {total_prestamos}")
+    print("="*90)
+
+
+def menu_eliminar_historial(biblio):
+    """Muestra el resumen del historial, pide confirmación y lo elimina"""
+    print("\n" + "="*70)
+    print("⚠️  ELIMINAR HISTORIAL DE PRÉSTAMOS")
+    print("="*70)
+    
+    total_prestamos, prestamos_activos = biblio.resumen_prestamos()
+    if not total_prestamos:
+        print("❌ No hay préstamos registrados para eliminar.")
+        return
+    
+    print(f"\n📊 Total de préstamos registrados: {total_prestamos}")
+    print(f"📖 Préstamos activos: {prestamos_activos}")
+    print(f"✅ Préstamos devueltos: {total_prestamos - prestamos_activos}")
+    
+    if prestamos_activos > 0:
+        print("\n⚠️  ADVERTENCIA: Hay préstamos activos.")
+        print("   Si elimina el historial, se perderá el registro de estos préstamos,")
+        print("   pero los libros seguirán marcados como prestados.")
+    
+    print("\n🗑️  Esta acción eliminará TODOS los registros de préstamos del almacenamiento.")
+    confirmacion = input("\n¿Está seguro de eliminar TODO el historial? (s/n): ").strip().lower()
+    
+    if confirmacion == 's':
+        try:
+            registros_eliminados = biblio.eliminar_historial_prestamos()
+        except OSError as e:
+            print(f"\n❌ Error al eliminar el historial: {e}")
+            return
+        print(f"\n✅ Historial eliminado correctamente.")
+        print(f"📁 {registros_eliminados} registro(s) eliminado(s) del almacenamiento.")
+    else:
+        print("\n❌ Eliminación cancelada.")
+
+
+def mostrar_instrumentacion(instrumentacion):
+    """Muestra las métricas de llamadas y escrituras de la sesión"""
+    resumen = instrumentacion.resumen()
+    print("\n" + "="*100)
+    print(f"📈 INSTRUMENTACIÓN ({resumen['segundos_sesion']:.0f}s de sesión)")
+    print("="*100)
+    print(f"{'Método':<42} {'Llamadas':>8} {'Total ms':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for nombre, datos in resumen['llamadas'].items():
+        print(f"{nombre:<42} {datos['llamadas']:>8} {datos['total_ms']:>10.2f} "
+              f"{datos['p50_ms']:>9.3f} {datos['p95_ms']:>9.3f} {datos['p99_ms']:>9.3f}")
+    escrituras = resumen['escrituras']
+    print("\n" + "="*100)
+    print(f"💾 Escrituras: {escrituras['operaciones']} | Bytes: {escrituras['bytes']} | "
+          f"Archivos tocados: {escrituras['archivos_tocados']}")
+    print("="*100)
+
+
+def mostrar_escritura_diferida(metricas):
+    """Muestra el estado de la cola de escritura diferida y su retraso de vaciado"""
+    print("\n" + "="*90)
+    print("💾 ESCRITURA DIFERIDA")
+    print("="*90)
+    print(f"Pendientes: {metricas['pendientes']} | Retraso actual: {metricas['retraso_actual_ms']:.1f} ms")
+    print(f"Retraso de vaciado: p50 {metricas['retraso_p50_ms']:.1f} ms | p99 {metricas['retraso_p99_ms']:.1f} ms | "
+          f"máx {metricas['retraso_max_ms']:.1f} ms")
+    print(f"Operaciones encoladas: {metricas['encoladas']} | Escrituras reales: {metricas['escritas']} | "
+          f"Vaciados: {metricas['vaciados']}")
+    if metricas['error']:
+        print(f"⚠️  Último error de vaciado (se reintentará): {metricas['error']}")
+    print("="*90)
+
+
+def menu_instrumentacion(biblio):
+    """Muestra la instrumentación y ofrece guardar el volcado JSON"""
+    metricas = getattr(biblio.almacenamiento, 'metricas', None)
+    if metricas is not None:
+        mostrar_escritura_diferida(metricas())
+    if biblio.instrumentacion is None:
+        print("⚠️  La instrumentación está desactivada. Inicie el sistema con --instrumentar.")
+        return
+    
+    mostrar_instrumentacion(biblio.instrumentacion)
+    ruta = input("\nArchivo para guardar el volcado JSON (Enter para omitir): ").strip()
+    if ruta:
+        biblio.instrumentacion.volcar(ruta)
+        print(f"📁 Volcado guardado en {ruta}")
+
+
 # ==================== FUNCIÓN PRINCIPAL ====================
 
-def app():
+def app(motor=MOTOR_ALMACENAMIENTO, historial_diferido=HISTORIAL_DIFERIDO, hilos=HILOS_CARGA,
+        durabilidad=DURABILIDAD, historial_columnar=HISTORIAL_COLUMNAR, instrumentacion=None,
+        dias_prestamo=DIAS_PRESTAMO, escritura_diferida=ESCRITURA_DIFERIDA, vigilar=VIGILAR_ARCHIVOS):
     """
     Función principal que ejecuta el sistema de biblioteca
     """
     crear_directorios()
-    biblio = Biblioteca()
+    biblio = Biblioteca(crear_almacenamiento(motor, hilos, durabilidad, escritura_diferida), historial_diferido,
+                        historial_columnar, instrumentacion, dias_prestamo)
     
     print("✅ Sistema de biblioteca iniciado correctamente.")
+    print("⏱️  Carga: " + " | ".join(f"{nombre} {segundos:.3f}s" for nombre, segundos in biblio.tiempos_carga.items()))
+    if vigilar:
+        try:
+            biblio.vigilar_archivos()
+            print("👀 Recarga en caliente activa: se aplicarán los archivos editados por fuera.")
+        except ErrorBiblioteca as e:
+            print(f"{e.icono} {e}")
     
     while True:
         mostrar_menu()
         
         try:
-            opcion = input("\nSeleccione una opción (0-15): ").strip()
+            opcion = input("\nSeleccione una opción (0-22): ").strip()
+            # Los archivos editados mientras se esperaba la opción se aplican
+            # antes de ejecutarla, para no operar (ni sobrescribir) datos viejos
+            mostrar_recarga(biblio.recargar_cambios())
             
             # ===== GESTIÓN DE LIBROS =====
             if opcion == '1':
@@ -785,24 +5851,25 @@ def app():
                 fecha_publicacion = input("Fecha de Publicación (ej: 2023): ").strip()
                 isbn = input("ISBN: ").strip()
                 biblio.agregar_libro(id_libro, titulo, autor, editorial, fecha_publicacion, isbn)
+                print("✅ Libro agregado correctamente.")
             
             elif opcion == '2':
                 print("\n--- BUSCAR LIBRO ---")
                 id_libro = input("ID del libro: ").strip()
-                biblio.buscar_libro(id_libro)
+                mostrar_libro(biblio.buscar_libro(id_libro))
             
             elif opcion == '3':
                 print("\n--- EDITAR LIBRO ---")
                 id_libro = input("ID del libro a editar: ").strip()
-                biblio.editar_libro(id_libro)
+                menu_editar_libro(biblio, id_libro)
             
             elif opcion == '4':
                 print("\n--- ELIMINAR LIBRO ---")
                 id_libro = input("ID del libro a eliminar: ").strip()
-                biblio.eliminar_libro(id_libro)
+                menu_eliminar_libro(biblio, id_libro)
             
             elif opcion == '5':
-                biblio.mostrar_libros()
+                mostrar_libros(biblio)
             
             # ===== GESTIÓN DE USUARIOS =====
             elif opcion == '6':
@@ -814,67 +5881,427 @@ def app():
                 telefono = input("Teléfono: ").strip()
                 direccion = input("Dirección: ").strip()
                 biblio.registrar_usuario(id_usuario, nombre, rut, correo, telefono, direccion)
+                print("✅ Usuario registrado correctamente.")
             
             elif opcion == '7':
                 print("\n--- BUSCAR USUARIO ---")
                 id_usuario = input("ID del usuario: ").strip()
-                biblio.buscar_usuario(id_usuario)
+                mostrar_usuario(biblio.buscar_usuario(id_usuario))
             
             elif opcion == '8':
                 print("\n--- EDITAR USUARIO ---")
                 id_usuario = input("ID del usuario a editar: ").strip()
-                biblio.editar_usuario(id_usuario)
+                menu_editar_usuario(biblio, id_usuario)
             
             elif opcion == '9':
                 print("\n--- ELIMINAR USUARIO ---")
                 id_usuario = input("ID del usuario a eliminar: ").strip()
-                biblio.eliminar_usuario(id_usuario)
+                menu_eliminar_usuario(biblio, id_usuario)
             
             elif opcion == '10':
-                biblio.mostrar_usuarios()
+                mostrar_usuarios(biblio)
             
             # ===== GESTIÓN DE PRÉSTAMOS =====
             elif opcion == '11':
                 print("\n--- PRESTAR LIBRO ---")
                 id_usuario = input("ID del usuario: ").strip()
-                id_libro = input("ID del libro: ").strip()
-                biblio.prestar_libro(id_usuario, id_libro)
+                id_libro = input("ID del libro o ISBN del título: ").strip()
+                try:
+                    if id_libro in biblio.libros:
+                        biblio.prestar_libro(id_usuario, id_libro)
+                        print("✅ Préstamo registrado con éxito.")
+                    else:
+                        prestamo = biblio.prestar_ejemplar(id_usuario, id_libro)
+                        disponibles, total = biblio.disponibilidad(id_libro)
+                        print(f"✅ Préstamo registrado con éxito (ejemplar {prestamo.libro.id_libro}).")
+                        print(f"📊 Quedan {disponibles} de {total} ejemplar(es) disponibles.")
+                except LibroPrestado as e:
+                    print(f"{e.icono} {e}")
+                    if input("¿Desea reservarlo y entrar en la lista de espera? (s/n): ").strip().lower() == 's':
+                        reserva = biblio.reservar(id_usuario, id_libro)
+                        print(f"📌 Reserva registrada. Lugar en la lista de espera: {biblio.posicion_en_espera(reserva)}")
             
             elif opcion == '12':
                 print("\n--- DEVOLVER LIBRO ---")
                 id_libro = input("ID del libro: ").strip()
-                biblio.devolver_libro(id_libro)
+                menu_devolver_libro(biblio, id_libro)
             
             elif opcion == '13':
-                biblio.mostrar_prestamos()
+                mostrar_prestamos(biblio)
             
             elif opcion == '14':
-                biblio.guardar_historial_prestamos()
+                menu_guardar_historial(biblio)
             
             elif opcion == '15':
-                biblio.eliminar_historial_prestamos()
+                menu_eliminar_historial(biblio)
+            
+            # ===== BÚSQUEDA AVANZADA =====
+            elif opcion == '16':
+                print("\n--- BUSCAR LIBROS ---")
+                criterio = input("Buscar por (1) ISBN, (2) Título, (3) Autor o (4) Texto libre: ").strip()
+                consulta = input("Texto a buscar: ").strip()
+                if criterio == '4':
+                    resultados = biblio.buscar_libros_por_texto(consulta)
+                    if not resultados:
+                        print("❌ No se encontraron libros.")
+                    for libro, puntaje in resultados:
+                        print(libro)
+                        print(f"    ISBN: {libro.isbn} | Relevancia: {puntaje}")
+                    continue
+                if criterio == '1':
+                    resultados = biblio.buscar_libros_por_isbn(consulta)
+                elif criterio == '2':
+                    resultados = biblio.buscar_libros_por_titulo(consulta)
+                elif criterio == '3':
+                    resultados = biblio.buscar_libros_por_autor(consulta)
+                else:
+                    print("❌ Criterio inválido.")
+                    continue
+                
+                if not resultados:
+                    print("❌ No se encontraron libros.")
+                for libro in resultados:
+                    print(libro)
+                    print(f"    ISBN: {libro.isbn}")
+            
+            elif opcion == '17':
+                print("\n--- BUSCAR USUARIO ---")
+                criterio = input("Buscar por (1) RUT o (2) Correo: ").strip()
+                consulta = input("Texto a buscar: ").strip()
+                if criterio == '1':
+                    usuario = biblio.buscar_usuario_por_rut(consulta)
+                elif criterio == '2':
+                    usuario = biblio.buscar_usuario_por_correo(consulta)
+                else:
+                    print("❌ Criterio inválido.")
+                    continue
+                
+                if usuario:
+                    mostrar_usuario(usuario)
+                else:
+                    print("❌ Usuario no encontrado.")
+            
+            # ===== DIAGNÓSTICO =====
+            elif opcion == '18':
+                menu_instrumentacion(biblio)
+            
+            elif opcion == '19':
+                menu_reservas(biblio)
+            
+            elif opcion == '20':
+                menu_vencimientos(biblio)
+            
+            elif opcion == '21':
+                mostrar_estadisticas(biblio)
+            
+            elif opcion == '22':
+                menu_lote(biblio)
             
             # ===== SALIR =====
             elif opcion == '0':
+                escritas = biblio.vaciar_escrituras()
                 print("\n" + "="*70)
                 print("👋 ¡Gracias por usar el sistema de biblioteca!")
                 print("📁 Todos los datos han sido guardados correctamente.")
+                if escritas:
+                    print(f"💾 Escrituras diferidas confirmadas al salir: {escritas}")
                 print("\n By: MCode-DevOps93 🐺")
                 print("="*70)
                 break
             
             else:
-                print("❌ Opción inválida. Por favor seleccione entre 0-15.")
+                print("❌ Opción inválida. Por favor seleccione entre 0-22.")
         
+        except ErrorBiblioteca as e:
+            print(f"{e.icono} {e}")
         except KeyboardInterrupt:
             print("\n\n👋 Sistema cerrado por el usuario.")
+            escritas = biblio.vaciar_escrituras()
+            if escritas:
+                print(f"💾 Escrituras diferidas confirmadas al salir: {escritas}")
             break
         except Exception as e:
             print(f"❌ Error: {e}")
 
+    biblio.cerrar()
+
+
+def main(argumentos=None):
+    """
+    Interpreta la línea de comandos: sin subcomando abre el menú interactivo
+    """
+    parser = argparse.ArgumentParser(description="Sistema de Gestión Bibliotecaria")
+    parser.add_argument('--motor', choices=MOTORES, default=MOTOR_ALMACENAMIENTO,
+                        help="Motor de almacenamiento a utilizar")
+    parser.add_argument('--historial-diferido', action='store_true', default=HISTORIAL_DIFERIDO,
+                        help="Cargar solo los préstamos activos al iniciar y leer el historial bajo demanda")
+    parser.add_argument('--hilos', type=int, default=HILOS_CARGA,
+                        help="Hilos de lectura para la carga inicial (1 = secuencial)")
+    parser.add_argument('--durabilidad', choices=DURABILIDADES, default=DURABILIDAD,
+                        help="'completa' sincroniza cada commit con el disco; 'rapida' omite fsync")
+    parser.add_argument('--historial-columnar', action='store_true', default=HISTORIAL_COLUMNAR,
+                        help="Guardar en memoria los préstamos devueltos por columnas (menos memoria)")
+    parser.add_argument('--dias-prestamo', type=int, default=DIAS_PRESTAMO,
+                        help="Plazo de los préstamos en días (el vencimiento se calcula con este plazo)")
+    parser.add_argument('--escritura-diferida', action='store_true', default=ESCRITURA_DIFERIDA,
+                        help="Encolar las escrituras y confirmarlas en segundo plano (menú y servidor)")
+    parser.add_argument('--vigilar', action='store_true', default=VIGILAR_ARCHIVOS,
+                        help="Aplicar en el menú los archivos .txt agregados, editados o borrados por fuera")
+    parser.add_argument('--instrumentar', action='store_true',
+                        help="Medir llamadas, latencias y escrituras de la sesión (menú opción 18)")
+    parser.add_argument('--volcado', help="Al terminar, guardar la instrumentación en este archivo JSON")
+    parser.add_argument('--perfil', choices=('cprofile', 'tracemalloc'),
+                        help="Capturar un perfil de CPU o de memoria de toda la sesión")
+    parser.add_argument('--perfil-salida', help="Archivo del perfil (por defecto perfil_<fecha>.prof/.txt)")
+    subcomandos = parser.add_subparsers(dest='comando')
+
+    migrar = subcomandos.add_parser('migrar', help="Migra el árbol de archivos .txt a otro motor de almacenamiento")
+    migrar.add_argument('--a', dest='destino', choices=('sqlite', 'instantanea'), default='sqlite',
+                        help="Motor de destino")
+
+    fragmentar = subcomandos.add_parser('fragmentar', help="Reparte los .txt en subcarpetas: préstamos por mes y libros/usuarios por hash")
+    fragmentar.add_argument('--fragmentos', type=int, default=FRAGMENTOS_HASH,
+                            help="Subcarpetas para libros y usuarios (0 = carpetas planas)")
+    fragmentar.add_argument('--plano', action='store_true', help="Volver todas las carpetas a la distribución plana")
+
+    subcomandos.add_parser('compactar', help="Vuelca el diario a una instantánea nueva (motor 'instantanea')")
+    subcomandos.add_parser('ejemplares', help="Agrupa los libros por ISBN en títulos con ejemplares y unifica sus datos")
+
+    importar = subcomandos.add_parser('importar', help="Importa libros o usuarios desde un archivo CSV o JSON Lines")
+    importar.add_argument('coleccion', choices=('libros', 'usuarios'))
+    importar.add_argument('ruta', help="Archivo .csv (con encabezado) o .jsonl")
+    importar.add_argument('--formato', choices=('csv', 'jsonl'), help="Formato del archivo (por defecto según la extensión)")
+    importar.add_argument('--lote', type=int, default=TAMANO_LOTE_IMPORTACION, help="Registros por lote")
+    importar.add_argument('--rechazos', help="Archivo donde anotar las filas rechazadas y su motivo")
+
+    exportar = subcomandos.add_parser('exportar', help="Exporta libros, usuarios o préstamos a CSV, JSON Lines o columnar")
+    exportar.add_argument('coleccion', choices=tuple(COLUMNAS_EXPORTACION))
+    exportar.add_argument('ruta', help="Archivo de destino (.csv, .jsonl o .col)")
+    exportar.add_argument('--formato', choices=FORMATOS_EXPORTACION, help="Formato (por defecto según la extensión)")
+    exportar.add_argument('--desde', help="Solo préstamos desde esta fecha (DD/MM/AAAA)")
+    exportar.add_argument('--hasta', help="Solo préstamos hasta esta fecha inclusive (DD/MM/AAAA)")
+    exportar.add_argument('--solo-activos', action='store_true', help="Solo préstamos activos")
+
+    servidor = subcomandos.add_parser('servidor', help="Atiende préstamos, devoluciones y búsquedas de varios mostradores por HTTP")
+    servidor.add_argument('--host', default=HOST_SERVIDOR)
+    servidor.add_argument('--puerto', type=int, default=PUERTO_SERVIDOR)
+
+    carga = subcomandos.add_parser('carga', help="Genera carga contra un servidor en marcha (usar con una copia de los datos)")
+    carga.add_argument('--host', default=HOST_SERVIDOR)
+    carga.add_argument('--puerto', type=int, default=PUERTO_SERVIDOR)
+    carga.add_argument('--clientes', type=int, nargs='+', default=list(CLIENTES_CARGA),
+                       help="Cantidades de clientes concurrentes a probar")
+    carga.add_argument('--operaciones', type=int, default=OPERACIONES_POR_CLIENTE,
+                       help="Préstamos que intenta cada cliente")
+
+    historial = subcomandos.add_parser('historial', help="Guarda el historial en SAVE (completo o incremental) o lo reconstruye")
+    historial.add_argument('modo', choices=('completo', 'incremental', 'reconstruir'))
+    historial.add_argument('--salida', help="Ruta del informe reconstruido (por defecto dentro de SAVE)")
+
+    vencimientos = subcomandos.add_parser('vencimientos', help="Lista los préstamos vencidos con su multa y los por vencer")
+    vencimientos.add_argument('--dias', type=int, default=DIAS_AVISO_VENCIMIENTO,
+                              help="Días de anticipación para los préstamos por vencer")
+
+    lote = subcomandos.add_parser('lote', help="Presta o devuelve en bloque (todo o nada) los libros de un archivo CSV o JSON Lines")
+    lote.add_argument('operacion', choices=('prestar', 'devolver'))
+    lote.add_argument('ruta', help="Columnas id_usuario,id_libro (prestar) o id_libro[,estado_devolucion] (devolver)")
+    lote.add_argument('--formato', choices=('csv', 'jsonl'), help="Formato del archivo (por defecto según la extensión)")
+
+    estadisticas = subcomandos.add_parser('estadisticas', help="Muestra rankings, mapas de calor y actividad de los préstamos")
+    estadisticas.add_argument('--top', type=int, default=TOP_ESTADISTICAS, help="Puestos de cada ranking")
+    estadisticas.add_argument('--semanas', type=int, default=12, help="Semanas que abarcan los gráficos por semana y por día")
+
+    memoria = subcomandos.add_parser('memoria', help="Mide los bytes por registro de libros, usuarios y préstamos")
+    memoria.add_argument('--registros', type=int, default=REGISTROS_MEMORIA, help="Registros sintéticos por tipo")
+
+    benchmark = subcomandos.add_parser('benchmark', help="Mide carga, préstamos, devoluciones e informes sobre datos sintéticos")
+    benchmark.add_argument('--tamanos', type=int, nargs='+', default=list(TAMANOS_BENCHMARK),
+                           help="Registros (libros y préstamos) de cada conjunto, de 1000 a 1000000")
+    benchmark.add_argument('--activos', type=float, default=PROPORCION_ACTIVOS,
+                           help="Proporción de préstamos activos (0 a 1)")
+    benchmark.add_argument('--operaciones', type=int, default=OPERACIONES_BENCHMARK,
+                           help="Préstamos y devoluciones medidos por conjunto")
+    benchmark.add_argument('--salida', help="Archivo JSON donde guardar los resultados")
+    benchmark.add_argument('--comparar', help="Resultados JSON de una versión anterior para comparar")
+
+    args = parser.parse_args(argumentos)
+
+    instrumentacion = Instrumentacion() if args.instrumentar or args.volcado else None
+    if args.perfil:
+        extension = '.prof' if args.perfil == 'cprofile' else '.txt'
+        ruta_perfil = args.perfil_salida or f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+        with capturar_perfil(args.perfil, ruta_perfil):
+            ejecutar_comando(args, instrumentacion)
+        print(f"📁 Perfil ({args.perfil}) guardado en {ruta_perfil}")
+    else:
+        ejecutar_comando(args, instrumentacion)
+
+    if args.volcado:
+        instrumentacion.volcar(args.volcado)
+        print(f"📁 Instrumentación guardada en {args.volcado}")
+
+
+def ejecutar_comando(args, instrumentacion=None):
+    """
+    Ejecuta el subcomando elegido; sin subcomando abre el menú interactivo
+    """
+    if args.comando == 'migrar':
+        crear_directorios()
+        libros, usuarios, prestamos = migrar_desde_texto(crear_almacenamiento(args.destino))
+        print(f"✅ Migración al motor '{args.destino}' completada")
+        print(f"📊 Libros: {libros} | Usuarios: {usuarios} | Préstamos: {prestamos}")
+    elif args.comando == 'fragmentar':
+        crear_directorios()
+        almacenamiento = AlmacenamientoTexto(durabilidad=args.durabilidad)
+        if args.plano:
+            movidos = almacenamiento.redistribuir(0, False)
+            print("✅ Carpetas de datos vueltas a la distribución plana")
+        else:
+            movidos = almacenamiento.redistribuir(args.fragmentos)
+            print(f"✅ Préstamos repartidos por mes; libros y usuarios en {args.fragmentos} fragmento(s)")
+        print("📦 Archivos movidos: " + " | ".join(f"{COLECCIONES[coleccion]} {cantidad}"
+                                                   for coleccion, cantidad in movidos.items()))
+    elif args.comando == 'compactar':
+        almacenamiento = AlmacenamientoInstantanea()
+        tamano = almacenamiento.compactar()
+        almacenamiento.cerrar()
+        print(f"✅ Instantánea compactada en {ARCHIVO_INSTANTANEA} ({tamano} bytes)")
+    elif args.comando == 'ejemplares':
+        biblio = Biblioteca(crear_almacenamiento(args.motor, args.hilos, args.durabilidad),
+                            args.historial_diferido, args.historial_columnar, instrumentacion)
+        try:
+            titulos, ejemplares, corregidos = biblio.agrupar_ejemplares()
+        finally:
+            biblio.cerrar()
+        print(f"✅ Catálogo agrupado en {titulos} título(s) con {ejemplares} ejemplar(es)")
+        print(f"📊 Ejemplares con datos unificados: {corregidos}")
+    elif args.comando == 'importar':
+        crear_directorios()
+        biblio = Biblioteca(crear_almacenamiento(args.motor, args.hilos, args.durabilidad),
+                            args.historial_diferido, args.historial_columnar, instrumentacion)
+        try:
+            importar = biblio.importar_libros if args.coleccion == 'libros' else biblio.importar_usuarios
+            resultado = importar(args.ruta, args.formato, args.lote, ruta_rechazos=args.rechazos)
+        finally:
+            biblio.cerrar()
+        print(f"✅ Importación de {args.coleccion} finalizada")
+        print(f"📊 {resultado}")
+        for numero, motivo in resultado.ejemplos_rechazo:
+            print(f"   ❌ Línea {numero}: {motivo}")
+    elif args.comando == 'exportar':
+        desde = datetime.strptime(args.desde, "%d/%m/%Y") if args.desde else None
+        hasta = datetime.strptime(args.hasta + " 23:59:59", "%d/%m/%Y %H:%M:%S") if args.hasta else None
+        biblio = Biblioteca(crear_almacenamiento(args.motor, args.hilos, args.durabilidad),
+                            args.historial_diferido, args.historial_columnar, instrumentacion)
+        try:
+            inicio = time.perf_counter()
+            total = biblio.exportar(args.coleccion, args.ruta, args.formato, desde, hasta, args.solo_activos)
+            segundos = time.perf_counter() - inicio
+        finally:
+            biblio.cerrar()
+        print(f"✅ Exportación de {args.coleccion} guardada en {args.ruta}")
+        print(f"📊 {total} fila(s) en {segundos:.2f}s")
+    elif args.comando == 'servidor':
+        crear_directorios()
+        biblio = Biblioteca(crear_almacenamiento(args.motor, args.hilos, args.durabilidad, args.escritura_diferida),
+                            args.historial_diferido, args.historial_columnar, instrumentacion, args.dias_prestamo)
+        servidor = crear_servidor(biblio, args.host, args.puerto)
+        print(f"✅ Servidor de biblioteca escuchando en http://{args.host}:{args.puerto}")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Servidor detenido.")
+        finally:
+            servidor.server_close()
+            biblio.cerrar()
+    elif args.comando == 'carga':
+        print(f"{'Clientes':>8} {'Préstamos':>10} {'Conflictos':>10} {'Préstamos/s':>12} {'p50 ms':>8} {'p99 ms':>8}")
+        for clientes in args.clientes:
+            r = generar_carga(args.host, args.puerto, clientes, args.operaciones)
+            print(f"{r['clientes']:>8} {r['prestamos']:>10} {r['conflictos']:>10} "
+                  f"{r['prestamos_por_segundo']:>12.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    elif args.comando == 'benchmark':
+        informe = ejecutar_benchmark(args.tamanos, args.activos, args.motor, args.durabilidad, args.operaciones)
+        print(f"{'Registros':>9} {'Operación':<28} {'Op/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'Pico MB':>8}")
+        for resultado in informe['resultados']:
+            for nombre, datos in resultado['operaciones'].items():
+                pico = datos['pico_memoria_mb']
+                print(f"{resultado['registros']:>9} {nombre:<28} {datos['por_segundo']:>10.1f} "
+                      f"{datos['p50_ms']:>9.2f} {datos['p99_ms']:>9.2f} {pico if pico is not None else 0:>8.2f}")
+        if args.salida:
+            with open(args.salida, 'w', encoding='utf-8') as archivo:
+                json.dump(informe, archivo, ensure_ascii=False, indent=2)
+            print(f"📁 Resultados guardados en {args.salida}")
+        if args.comparar:
+            with open(args.comparar, encoding='utf-8') as archivo:
+                anterior = json.load(archivo)
+            print(f"\n{'Registros':>9} {'Operación':<28} {'Antes op/s':>11} {'Ahora op/s':>11} {'Cambio':>8}")
+            for registros, nombre, previo, actual, variacion in comparar_benchmark(anterior, informe):
+                print(f"{registros:>9} {nombre:<28} {previo:>11.1f} {actual:>11.1f} {variacion:>+7.1f}%")
+    elif args.comando == 'historial':
+        try:
+            if args.modo == 'reconstruir':
+                ruta, total, copias = reconstruir_historial_prestamos(args.salida)
+                print(f"✅ Historial reconstruido desde {copias} copia(s) en {ruta}")
+            else:
+                crear_directorios()
+                biblio = Biblioteca(crear_almacenamiento(args.motor, args.hilos, args.durabilidad),
+                                    args.historial_diferido, args.historial_columnar, instrumentacion)
+                try:
+                    ruta, total = biblio.guardar_historial_prestamos(incremental=args.modo == 'incremental')
+                finally:
+                    biblio.cerrar()
+                print(f"✅ Historial guardado en {ruta}")
+        except ErrorBiblioteca as e:
+            print(f"{e.icono} {e}")
+            return
+        print(f"📊 {total} préstamo(s)")
+    elif args.comando == 'vencimientos':
+        biblio = Biblioteca(crear_almacenamiento(args.motor, args.hilos, args.durabilidad),
+                            args.historial_diferido, args.historial_columnar, instrumentacion, args.dias_prestamo)
+        try:
+            multas, por_usuario = biblio.calcular_multas()
+            por_vencer = biblio.prestamos_por_vencer(args.dias)
+        finally:
+            biblio.cerrar()
+        print(f"{'Usuario':<12} {'Libro':<12} {'Vencimiento':<17} {'Atraso':>7} {'Multa':>10}")
+        for prestamo, atraso, monto in multas:
+            print(f"{prestamo.usuario.id_usuario:<12} {prestamo.libro.id_libro:<12} "
+                  f"{prestamo.fecha_vencimiento.strftime('%d/%m/%Y %H:%M'):<17} {atraso:>7} {monto:>10}")
+        print(f"📊 Vencidos: {len(multas)} | Multas: ${sum(por_usuario.values())} | "
+              f"Vencen en {args.dias} día(s): {len(por_vencer)}")
+    elif args.comando == 'lote':
+        filas = [fila or {} for _, fila in leer_filas_importacion(args.ruta, args.formato)]
+        biblio = Biblioteca(crear_almacenamiento(args.motor, args.hilos, args.durabilidad),
+                            args.historial_diferido, args.historial_columnar, instrumentacion, args.dias_prestamo)
+        try:
+            if args.operacion == 'prestar':
+                resultado = biblio.prestar_lote([(str(fila.get('id_usuario') or '').strip(),
+                                                  str(fila.get('id_libro') or '').strip()) for fila in filas])
+            else:
+                resultado = biblio.devolver_lote([(str(fila.get('id_libro') or '').strip(),
+                                                   fila.get('estado_devolucion') or None) for fila in filas])
+        finally:
+            biblio.cerrar()
+        mostrar_resultado_lote(resultado)
+    elif args.comando == 'estadisticas':
+        biblio = Biblioteca(crear_almacenamiento(args.motor, args.hilos, args.durabilidad),
+                            args.historial_diferido, args.historial_columnar, instrumentacion, args.dias_prestamo)
+        try:
+            mostrar_estadisticas(biblio, args.top, args.semanas)
+        finally:
+            biblio.cerrar()
+    elif args.comando == 'memoria':
+        print(f"{'Registro':<18} {'Con __dict__':>13} {'Actual':>10} {'Ahorro':>8}")
+        for nombre, (con_dict, actual) in medir_memoria(args.registros).items():
+            print(f"{nombre:<18} {con_dict:>13.1f} {actual:>10.1f} {1 - actual / con_dict:>8.0%}")
+    else:
+        app(args.motor, args.historial_diferido, args.hilos, args.durabilidad, args.historial_columnar,
+            instrumentacion, args.dias_prestamo, args.escritura_diferida, args.vigilar)
+
 
 # ==================== PUNTO DE ENTRADA ====================
 if __name__ == "__main__":
-    app()
+    main()
 
 
@@ -0,0 +1,45 @@
+import importlib.util
+import os
+
+import pytest
+
+RUTA_MODULO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Bliblioteca-V2.1.py')
+
+
+def cargar_modulo():
+    """El nombre del archivo no es un nombre de módulo válido: se carga desde su ruta"""
+    spec = importlib.util.spec_from_file_location('biblioteca_wolfrabbit', RUTA_MODULO)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+@pytest.fixture(scope='session')
+def bib():
+    return cargar_modulo()
+
+
+@pytest.fixture
+def carpeta(tmp_path, monkeypatch, bib):
+    """Las rutas de datos son relativas: cada prueba trabaja en su propia carpeta"""
+    monkeypatch.chdir(tmp_path)
+    bib.crear_directorios()
+    return tmp_path
+
+
+def poblar(biblioteca):
+    """Cuatro usuarios, dos ejemplares de un mismo título y un tercer libro"""
+    for numero in range(1, 5):
+        biblioteca.registrar_usuario(f'U{numero}', f'Usuario {numero}', f'{numero}-9', f'u{numero}@correo.cl',
+                                     f'90000000{numero}', 'Calle 1')
+    biblioteca.agregar_libro('L1', 'Rayuela', 'Cortázar', 'Sudamericana', '1963', '978-84-376-0494-7')
+    biblioteca.agregar_libro('L2', 'Rayuela', 'Cortázar', 'Sudamericana', '1963', '978-84-376-0494-7')
+    biblioteca.agregar_libro('L3', 'Ficciones', 'Borges', 'Sur', '1944', '978-84-206-3317-8')
+    return biblioteca
+
+
+@pytest.fixture
+def biblioteca(carpeta, bib):
+    b = poblar(bib.Biblioteca(bib.crear_almacenamiento()))
+    yield b
+    b.cerrar()
@@ -0,0 +1,48 @@
+import os
+
+
+def leer_carpeta(raiz):
+    """Contenido de todos los archivos de un conjunto, por ruta relativa"""
+    contenido = {}
+    for carpeta, _, archivos in os.walk(raiz):
+        for nombre in archivos:
+            ruta = os.path.join(carpeta, nombre)
+            with open(ruta, 'rb') as archivo:
+                contenido[os.path.relpath(ruta, raiz)] = archivo.read()
+    return contenido
+
+
+def test_el_conjunto_sintetico_es_reproducible(tmp_path, bib):
+    cantidades = bib.generar_dataset(str(tmp_path / 'a'), 200, 0.25)
+    bib.generar_dataset(str(tmp_path / 'b'), 200, 0.25)
+    assert cantidades == {'libros': 200, 'usuarios': 20, 'prestamos': 200, 'activos': 50}
+    primero = leer_carpeta(tmp_path / 'a' / 'biblioteca')
+    assert primero == leer_carpeta(tmp_path / 'b' / 'biblioteca')
+    assert sum(ruta.endswith('.txt') for ruta in primero) == 200 + 20 + 200
+
+
+def test_con_los_mismos_parametros_no_se_regenera(tmp_path, bib, monkeypatch):
+    carpeta = str(tmp_path / 'conjunto')
+    bib.generar_dataset(carpeta, 50)
+    monkeypatch.setattr(bib, 'AlmacenamientoTexto', None)
+    assert bib.generar_dataset(carpeta, 50)['libros'] == 50
+
+
+def test_ejecutar_y_comparar_benchmark(tmp_path, bib):
+    carpeta = str(tmp_path / 'benchmark')
+    informe = bib.ejecutar_benchmark(tamanos=(100,), proporcion_activos=0.2, operaciones=10, carpeta=carpeta)
+    resultado, = informe['resultados']
+    assert resultado['registros'] == 100 and resultado['activos'] == 20
+    operaciones = resultado['operaciones']
+    assert set(operaciones) == {'cargar_datos', 'prestar_libro', 'devolver_libro', 'mostrar_prestamos',
+                                'guardar_historial_prestamos'}
+    assert operaciones['prestar_libro']['llamadas'] == 10
+    assert operaciones['cargar_datos']['pico_memoria_mb'] > 0
+    # La copia de trabajo se descarta y el conjunto original queda intacto
+    assert not os.path.exists(os.path.join(carpeta, 'trabajo'))
+
+    anterior = {'resultados': [{'registros': 100, 'operaciones': {
+        nombre: {'por_segundo': datos['por_segundo'] / 2} for nombre, datos in operaciones.items()}}]}
+    comparacion = list(bib.comparar_benchmark(anterior, informe))
+    assert len(comparacion) == len(operaciones)
+    assert all(round(variacion) == 100 for *_, variacion in comparacion)
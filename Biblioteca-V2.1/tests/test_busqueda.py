@@ -0,0 +1,37 @@
+def ids(resultados):
+    # Los empates de puntaje (dos ejemplares iguales) no tienen un orden fijo
+    return [libro.id_libro for libro, _ in sorted(resultados, key=lambda par: (-par[1], par[0].id_libro))]
+
+
+def test_plegar_y_distancia_de_edicion(bib):
+    assert bib.plegar('Alas de ÓNIX') == 'alas de onix'
+    assert bib.distancia_edicion('borges', 'borges', 2) == 0
+    # Una transposición de letras vecinas es un solo error
+    assert bib.distancia_edicion('borges', 'bogres', 2) == 1
+    assert bib.distancia_edicion('cortazar', 'borges', 2) == 3
+
+
+def test_busqueda_sin_tildes_con_errores_y_por_prefijo(biblioteca):
+    biblioteca.agregar_libro('L4', 'Alas de ónix', 'Rebecca Yarros', 'Planeta', '2023', '978-84-08-28040-5')
+    assert ids(biblioteca.buscar_libros_por_texto('alas de onix')) == ['L4']
+    assert ids(biblioteca.buscar_libros_por_texto('Cortazr')) == ['L1', 'L2']
+    assert ids(biblioteca.buscar_libros_por_texto('ficc')) == ['L3']
+    assert ids(biblioteca.buscar_libros_por_texto('borges ficciones')) == ['L3']
+    assert biblioteca.buscar_libros_por_texto('zzzz') == []
+
+
+def test_el_titulo_pesa_mas_que_el_autor(biblioteca):
+    biblioteca.agregar_libro('L4', 'Borges y yo', 'Bioy Casares', 'Emecé', '1990', '978-950-04-0000-1')
+    resultados = biblioteca.buscar_libros_por_texto('borges')
+    assert ids(resultados) == ['L4', 'L3']
+    assert resultados[0][1] > resultados[1][1]
+
+
+def test_el_indice_sigue_las_altas_ediciones_y_bajas(biblioteca):
+    assert ids(biblioteca.buscar_libros_por_texto('rayuela')) == ['L1', 'L2']
+    biblioteca.editar_libro('L2', titulo='Los premios')
+    biblioteca.eliminar_libro('L1')
+    assert ids(biblioteca.buscar_libros_por_texto('rayuela')) == []
+    assert ids(biblioteca.buscar_libros_por_texto('premios')) == ['L2']
+    biblioteca.agregar_libro('L9', 'Rayuela', 'Cortázar', 'Alfaguara', '2013', '978-84-204-1411-1')
+    assert ids(biblioteca.buscar_libros_por_texto('rayuela')) == ['L9']
@@ -0,0 +1,45 @@
+import pytest
+
+
+def estado(biblioteca):
+    """Resumen comparable de lo que quedó en memoria tras la carga"""
+    return (
+        {id_libro: (l.titulo, l.isbn, l.disponible) for id_libro, l in biblioteca.libros.items()},
+        {id_usuario: (u.nombre, u.rut, sorted(p.clave for p in u.prestamos)) for id_usuario, u in biblioteca.usuarios.items()},
+        sorted((p.clave, p.usuario.id_usuario, p.libro.id_libro, p.fecha_devolucion is None) for p in biblioteca.prestamos),
+        sorted((id_libro, p.clave) for id_libro, p in biblioteca.prestamos_activos.items()),
+    )
+
+
+@pytest.fixture
+def datos(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L2')
+    biblioteca.prestar_libro('U3', 'L3')
+    biblioteca.devolver_libro('L2', 'Bien')
+    biblioteca.cerrar()
+    return biblioteca
+
+
+@pytest.mark.parametrize('historial_diferido', [False, True])
+def test_la_carga_en_paralelo_deja_el_mismo_estado(datos, bib, monkeypatch, historial_diferido):
+    # Bloques de dos archivos para que cada carpeta se reparta entre varios hilos
+    monkeypatch.setattr(bib, 'TAMANO_BLOQUE_CARGA', 2)
+    secuencial = bib.Biblioteca(bib.crear_almacenamiento(hilos=1), historial_diferido)
+    paralela = bib.Biblioteca(bib.crear_almacenamiento(hilos=4), historial_diferido)
+    secuencial.cerrar()
+    paralela.cerrar()
+
+    assert estado(paralela) == estado(secuencial)
+    assert estado(paralela)[3] == estado(datos)[3]
+    if not historial_diferido:
+        assert estado(paralela) == estado(datos)
+
+
+@pytest.mark.parametrize('hilos', [1, 4])
+def test_la_carga_registra_el_tiempo_de_cada_coleccion(datos, bib, hilos):
+    recargada = bib.Biblioteca(bib.crear_almacenamiento(hilos=hilos))
+    recargada.cerrar()
+    esperadas = {'libros', 'usuarios', 'prestamos'} | ({'enlace'} if hilos > 1 else set())
+    assert set(recargada.tiempos_carga) == esperadas
+    assert all(segundos >= 0 for segundos in recargada.tiempos_carga.values())
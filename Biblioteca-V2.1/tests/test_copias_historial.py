@@ -0,0 +1,99 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+from conftest import poblar
+
+
+@pytest.fixture
+def reloj(bib, monkeypatch):
+    """Fija datetime.now() del módulo; se adelanta asignando reloj['ahora']"""
+    reloj = {'ahora': datetime(2024, 5, 2, 10, 5, 20)}
+
+    class Reloj(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return reloj['ahora']
+
+    monkeypatch.setattr(bib, 'datetime', Reloj)
+    return reloj
+
+
+def claves_en(ruta):
+    with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+        return [json.loads(linea)[0] for linea in archivo]
+
+
+def test_la_cadena_de_copias_reconstruye_el_historial(biblioteca, bib, reloj):
+    primero = biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L3')
+    ruta, total = biblioteca.guardar_historial_prestamos(incremental=True)
+    assert total == 2 and sorted(claves_en(ruta)) == sorted(p.clave for p in biblioteca.iterar_historial())
+
+    reloj['ahora'] = datetime(2024, 5, 3, 9, 0)
+    biblioteca.devolver_libro('L1', 'Con una mancha')
+    tercero = biblioteca.prestar_libro('U3', 'L2')
+    ruta, total = biblioteca.guardar_historial_prestamos(incremental=True)
+    # Solo lo que cambió desde la copia anterior
+    assert sorted(claves_en(ruta)) == sorted([primero.clave, tercero.clave])
+
+    entradas = bib.leer_manifiesto()
+    assert [(e['numero'], e['anterior']) for e in entradas] == [(1, None), (2, 1)]
+
+    informe, total, copias = bib.reconstruir_historial_prestamos('reconstruido.txt')
+    assert (total, copias) == (3, 2)
+    texto = open(informe, encoding='utf-8').read()
+    assert texto.count('--- PRÉSTAMO #') == 3
+    assert 'Estado Devolución: Con una mancha' in texto and 'Préstamos activos: 2' in texto
+
+
+def test_un_cambio_en_el_minuto_de_la_copia_no_se_pierde_al_reiniciar(carpeta, bib, reloj):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento()))
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.guardar_historial_prestamos(incremental=True)
+    # Diez segundos después, en el mismo minuto que la copia
+    reloj['ahora'] = datetime(2024, 5, 2, 10, 5, 30)
+    biblioteca.devolver_libro('L1')
+    nuevo = biblioteca.prestar_libro('U2', 'L3')
+    biblioteca.cerrar()
+
+    # El motor .txt guarda las fechas al minuto: tras reiniciar quedan en 10:05:00
+    reloj['ahora'] = datetime(2024, 5, 2, 11, 0)
+    biblioteca = bib.Biblioteca(bib.crear_almacenamiento())
+    try:
+        ruta, total = biblioteca.guardar_historial_prestamos(incremental=True)
+    finally:
+        biblioteca.cerrar()
+    assert nuevo.clave in claves_en(ruta) and total == 2
+    _, total, _ = bib.reconstruir_historial_prestamos('reconstruido.txt')
+    assert total == 2
+    assert 'Préstamos activos: 1' in open('reconstruido.txt', encoding='utf-8').read()
+
+
+def test_sin_cambios_no_se_escribe_otra_copia(biblioteca, bib, reloj):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.guardar_historial_prestamos(incremental=True)
+    reloj['ahora'] = datetime(2024, 5, 2, 12, 0)
+    with pytest.raises(bib.SinPrestamos):
+        biblioteca.guardar_historial_prestamos(incremental=True)
+    assert len(bib.leer_manifiesto()) == 1
+
+
+def test_una_cadena_rota_o_incompleta_se_rechaza(biblioteca, bib, reloj):
+    with pytest.raises(bib.SinPrestamos):
+        bib.reconstruir_historial_prestamos()
+    biblioteca.prestar_libro('U1', 'L1')
+    ruta, _ = biblioteca.guardar_historial_prestamos(incremental=True)
+
+    with open(bib.ARCHIVO_MANIFIESTO, 'a', encoding='utf-8') as manifiesto:
+        manifiesto.write(json.dumps({'numero': 3, 'anterior': 1, 'archivo': 'x', 'registros': 0}) + '\n')
+    with pytest.raises(bib.ErrorAlmacenamiento):
+        bib.reconstruir_historial_prestamos()
+
+    with open(bib.ARCHIVO_MANIFIESTO, 'w', encoding='utf-8') as manifiesto:
+        manifiesto.write(json.dumps({'numero': 1, 'anterior': None, 'archivo': ruta[len(bib.CARPETA_SAVE):],
+                                     'registros': 5}) + '\n')
+    with pytest.raises(bib.ErrorAlmacenamiento):
+        bib.reconstruir_historial_prestamos()
@@ -0,0 +1,64 @@
+import pytest
+
+RAYUELA = '978-84-376-0494-7'
+FICCIONES = '9788420633178'
+
+
+def test_los_ejemplares_de_un_isbn_forman_un_titulo(biblioteca, bib):
+    assert biblioteca.disponibilidad(RAYUELA) == (2, 2)
+    # El ISBN se normaliza: con o sin guiones es el mismo título
+    assert biblioteca.buscar_titulo(FICCIONES).total == 1
+    with pytest.raises(bib.LibroNoEncontrado):
+        biblioteca.buscar_titulo('978-0-00-000000-2')
+
+
+def test_prestar_ejemplar_toma_uno_libre_y_la_devolucion_lo_libera(biblioteca, bib):
+    primero = biblioteca.prestar_ejemplar('U1', RAYUELA)
+    segundo = biblioteca.prestar_ejemplar('U2', RAYUELA)
+    assert {primero.libro.id_libro, segundo.libro.id_libro} == {'L1', 'L2'}
+    assert biblioteca.disponibilidad(RAYUELA) == (0, 2)
+    with pytest.raises(bib.LibroPrestado):
+        biblioteca.prestar_ejemplar('U3', RAYUELA)
+
+    biblioteca.devolver_libro(primero.libro.id_libro)
+    assert biblioteca.disponibilidad(RAYUELA) == (1, 2)
+    assert biblioteca.prestar_ejemplar('U3', RAYUELA).libro is primero.libro
+
+
+def test_prestar_por_id_tambien_actualiza_los_libres(biblioteca):
+    biblioteca.prestar_libro('U1', 'L2')
+    assert biblioteca.disponibilidad(RAYUELA) == (1, 2)
+    assert biblioteca.prestar_ejemplar('U2', RAYUELA).libro.id_libro == 'L1'
+
+
+def test_un_prestamo_fallido_devuelve_el_ejemplar_a_los_libres(biblioteca, bib):
+    with pytest.raises(bib.UsuarioNoEncontrado):
+        biblioteca.prestar_ejemplar('U9', RAYUELA)
+    assert biblioteca.disponibilidad(RAYUELA) == (2, 2)
+
+
+def test_agregar_ejemplares_copia_los_datos_del_titulo(biblioteca):
+    nuevos = biblioteca.agregar_ejemplares(FICCIONES, 2)
+    assert [libro.id_libro for libro in nuevos] == ['L3-E02', 'L3-E03']
+    assert all(libro.titulo == 'Ficciones' and libro.autor == 'Borges' for libro in nuevos)
+    assert biblioteca.disponibilidad(FICCIONES) == (3, 3)
+
+
+def test_los_ejemplares_se_agrupan_al_recargar_y_se_igualan_al_migrar(carpeta, bib):
+    biblioteca = bib.Biblioteca(bib.crear_almacenamiento())
+    biblioteca.agregar_libro('A1', 'Rayuela', 'Cortázar', 'Sudamericana', '1963', RAYUELA)
+    biblioteca.agregar_libro('A2', 'Rayuela (2a ed.)', 'Cortazar', 'Sudamericana', '1963', '9788437604947')
+    biblioteca.cerrar()
+
+    biblioteca = bib.Biblioteca(bib.crear_almacenamiento())
+    try:
+        assert biblioteca.disponibilidad(RAYUELA) == (2, 2)
+        assert biblioteca.agrupar_ejemplares() == (1, 2, 1)
+        assert biblioteca.buscar_libro('A2').titulo == 'Rayuela'
+    finally:
+        biblioteca.cerrar()
+    biblioteca = bib.Biblioteca(bib.crear_almacenamiento())
+    try:
+        assert biblioteca.buscar_libro('A2').autor == 'Cortázar'
+    finally:
+        biblioteca.cerrar()
@@ -0,0 +1,131 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import poblar
+
+
+@pytest.fixture(params=['texto', 'sqlite', 'instantanea'])
+def motor(request, carpeta):
+    return request.param
+
+
+def crear_diferido(bib, motor):
+    """Almacenamiento diferido cuyo hilo no vacía por su cuenta durante la prueba"""
+    almacenamiento = bib.crear_almacenamiento(motor, escritura_diferida=True)
+    almacenamiento.intervalo = 3600
+    almacenamiento.max_pendientes = 10 ** 6
+    return almacenamiento
+
+
+def test_las_escrituras_se_encolan_hasta_vaciar(bib, motor):
+    almacenamiento = crear_diferido(bib, motor)
+    biblioteca = poblar(bib.Biblioteca(almacenamiento))
+    try:
+        biblioteca.prestar_libro('U1', 'L1')
+        biblioteca.devolver_libro('L1')
+        biblioteca.prestar_libro('U2', 'L1')
+
+        metricas = almacenamiento.metricas()
+        # Las tres escrituras de L1 y las dos del primer préstamo se unen en una
+        assert metricas['pendientes'] == 4 + 3 + 2
+        assert metricas['escritas'] == 0
+
+        assert biblioteca.vaciar_escrituras() == 9
+        metricas = almacenamiento.metricas()
+        assert metricas['pendientes'] == 0
+        assert metricas['escritas'] == 9 and metricas['vaciados'] == 1
+        assert metricas['encoladas'] == 4 + 3 + 6
+    finally:
+        biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento(motor))
+    try:
+        assert sorted(recargada.prestamos_activos) == ['L1']
+        assert recargada.prestamos_activos['L1'].usuario.id_usuario == 'U2'
+        assert recargada.total_prestamos == 2
+    finally:
+        recargada.cerrar()
+
+
+def test_cerrar_escribe_lo_pendiente(bib, motor):
+    biblioteca = poblar(bib.Biblioteca(crear_diferido(bib, motor)))
+    biblioteca.prestar_libro('U1', 'L3')
+    biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento(motor))
+    try:
+        assert len(recargada.libros) == 3 and len(recargada.usuarios) == 4
+        assert sorted(recargada.prestamos_activos) == ['L3']
+    finally:
+        recargada.cerrar()
+
+
+def test_se_escribe_el_estado_del_momento_de_encolar(bib, motor):
+    almacenamiento = crear_diferido(bib, motor)
+    libro = bib.Libro('L1', 'Antes', 'Autor', 'Editorial', '2000', '978-0-306-40615-7')
+    usuario = bib.Usuario('U1', 'Ana', '1-9', 'ana@correo.cl', '900000001', 'Calle 1')
+    prestamo = bib.Prestamo(usuario, libro, datetime(2026, 1, 1, 10, 0))
+    almacenamiento.guardar_libro(libro)
+    almacenamiento.guardar_usuario(usuario)
+    almacenamiento.guardar_prestamo(prestamo)
+
+    # Cambios posteriores sin volver a encolar no deben llegar al motor
+    libro.titulo, libro.disponible = 'Después', False
+    usuario.nombre = 'Otra'
+    prestamo.fecha_devolucion = datetime(2026, 1, 2)
+    prestamo.estado_devolucion = 'Dañado'
+    try:
+        assert almacenamiento.vaciar() == 3
+        assert list(almacenamiento.leer_libros()) == [
+            ('L1', 'Antes', 'Autor', 'Editorial', '2000', '978-0-306-40615-7', True)]
+        assert [fila[1] for fila in almacenamiento.leer_usuarios()] == ['Ana']
+        assert list(almacenamiento.leer_prestamos()) == [
+            (prestamo.clave, 'U1', 'L1', datetime(2026, 1, 1, 10, 0), None, None)]
+    finally:
+        almacenamiento.cerrar()
+
+
+def test_un_vaciado_fallido_conserva_la_cola(bib, motor):
+    almacenamiento = crear_diferido(bib, motor)
+    almacenamiento.guardar_libro(bib.Libro('L1', 'Título', 'Autor', 'Editorial', '2000', ''))
+
+    def falla(libro):
+        raise OSError('disco lleno')
+    motor_real = almacenamiento._almacenamiento
+    motor_real.guardar_libro = falla
+    with pytest.raises(OSError):
+        almacenamiento.vaciar()
+    assert almacenamiento.metricas()['pendientes'] == 1
+
+    del motor_real.guardar_libro
+    try:
+        assert almacenamiento.vaciar() == 1
+        assert [fila[0] for fila in almacenamiento.leer_libros()] == ['L1']
+    finally:
+        almacenamiento.cerrar()
+
+
+def test_un_alta_y_su_baja_antes_de_vaciar_no_traban_la_cola(bib, motor):
+    almacenamiento = crear_diferido(bib, motor)
+    biblioteca = poblar(bib.Biblioteca(almacenamiento))
+    try:
+        biblioteca.vaciar_escrituras()
+        # El alta y la baja se juntan en un eliminar_* de registros nunca escritos
+        biblioteca.agregar_libro('L9', 'Efímero', 'Autor', 'Editorial', '2000', '')
+        biblioteca.eliminar_libro('L9')
+        biblioteca.registrar_usuario('U9', 'Fugaz', '9-9', 'u9@correo.cl', '900000009', 'Calle 9')
+        biblioteca.eliminar_usuario('U9')
+        biblioteca.editar_libro('L3', titulo='Ficciones (2a ed.)')
+
+        assert biblioteca.vaciar_escrituras() == 3
+        assert almacenamiento.metricas()['pendientes'] == 0
+    finally:
+        biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento(motor))
+    try:
+        assert sorted(recargada.libros) == ['L1', 'L2', 'L3'] and 'U9' not in recargada.usuarios
+        assert recargada.libros['L3'].titulo == 'Ficciones (2a ed.)'
+    finally:
+        recargada.cerrar()
@@ -0,0 +1,83 @@
+import pytest
+
+
+def empates_en_orden(ranking):
+    """Los empates de un ranking no tienen orden fijo (dependen del orden de carga)"""
+    return sorted(ranking, key=lambda fila: (-fila[1], fila))
+
+
+def vistas(analitica):
+    """Todas las vistas, con los usuarios de la actividad por ID"""
+    return {
+        'titulos': empates_en_orden(analitica.top_titulos()),
+        'autores': empates_en_orden(analitica.top_autores()),
+        'dias': analitica.prestamos_por_dia(),
+        'semanas': analitica.prestamos_por_semana(),
+        'mapa_calor': analitica.mapa_calor(),
+        'duracion': analitica.duracion_promedio()[1],
+        'actividad': empates_en_orden((usuario.id_usuario, cantidad, activos)
+                                      for usuario, cantidad, activos, _ in analitica.actividad_usuarios()),
+    }
+
+
+def recalcular(biblioteca):
+    biblioteca.analitica = None
+    return vistas(biblioteca.estadisticas())
+
+
+def test_los_ejemplares_suman_al_mismo_titulo(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.devolver_libro('L1')
+    biblioteca.prestar_libro('U2', 'L2')
+    biblioteca.prestar_libro('U1', 'L3')
+    analitica = biblioteca.estadisticas()
+
+    assert len(analitica) == 3
+    assert analitica.top_titulos() == [(('Rayuela', '9788437604947'), 2), (('Ficciones', '9788420633178'), 1)]
+    assert analitica.top_autores(1) == [('Cortázar', 2)]
+    assert sum(map(sum, analitica.mapa_calor())) == 3
+    assert sum(analitica.prestamos_por_dia().values()) == 3
+    assert analitica.duracion_promedio()[1] == 1
+    assert [(u.id_usuario, cantidad, activos) for u, cantidad, activos, _ in analitica.actividad_usuarios()] \
+        == [('U1', 2, 1), ('U2', 1, 1)]
+
+
+def test_los_conteos_se_mantienen_igual_que_recalculados(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    analitica = biblioteca.estadisticas()
+    vistas(analitica)
+
+    biblioteca.prestar_libro('U2', 'L3')
+    biblioteca.devolver_libro('L1')
+    biblioteca.prestar_libro('U3', 'L1')
+    biblioteca.editar_libro('L3', titulo='Ficciones (ed. revisada)')
+    mantenidas = vistas(analitica)
+
+    assert biblioteca.estadisticas() is analitica
+    assert mantenidas == recalcular(biblioteca)
+    assert mantenidas['titulos'][0] == (('Rayuela', '9788437604947'), 2)
+    assert (('Ficciones (ed. revisada)', '9788420633178'), 1) in mantenidas['titulos']
+
+
+@pytest.mark.parametrize('modo', [{}, {'historial_diferido': True}, {'historial_columnar': True}])
+def test_se_arma_desde_el_historial_cargado(biblioteca, bib, modo):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.devolver_libro('L1')
+    biblioteca.prestar_libro('U2', 'L1')
+    esperadas = recalcular(biblioteca)
+    biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento(), **modo)
+    try:
+        assert vistas(recargada.estadisticas()) == esperadas
+    finally:
+        recargada.cerrar()
+
+
+def test_borrar_el_historial_descarta_las_estadisticas(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.estadisticas()
+    biblioteca.devolver_libro('L1')
+    biblioteca.eliminar_historial_prestamos()
+    assert len(biblioteca.estadisticas()) == 0
+    assert biblioteca.estadisticas().top_titulos() == []
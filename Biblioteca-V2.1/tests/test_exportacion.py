@@ -0,0 +1,72 @@
+import csv
+import json
+from datetime import datetime
+
+import pytest
+
+
+def leer(bib, ruta, formato):
+    if formato == 'columnar':
+        return list(bib.leer_columnar(ruta))
+    with open(ruta, encoding='utf-8', newline='') as archivo:
+        if formato == 'csv':
+            return list(csv.DictReader(archivo))
+        return [json.loads(linea) for linea in archivo]
+
+
+@pytest.fixture
+def con_prestamos(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L3')
+    biblioteca.devolver_libro('L1', 'Bien')
+    for prestamo, fecha in zip(sorted(biblioteca.prestamos, key=lambda p: p.libro.id_libro),
+                               (datetime(2024, 1, 10, 9, 30), datetime(2024, 3, 5, 18, 0))):
+        prestamo.fecha_prestamo = fecha
+    return biblioteca
+
+
+@pytest.mark.parametrize('formato', ['csv', 'jsonl', 'columnar'])
+def test_exportar_libros_en_cada_formato(biblioteca, bib, carpeta, monkeypatch, formato):
+    # Grupos de dos filas para cubrir varios bloques
+    monkeypatch.setattr(bib, 'FILAS_POR_BLOQUE_EXPORTACION', 2)
+    ruta = str(carpeta / f'libros.{formato}')
+
+    assert biblioteca.exportar('libros', ruta, formato) == 3
+
+    filas = leer(bib, ruta, formato)
+    assert [fila['id_libro'] for fila in filas] == ['L1', 'L2', 'L3']
+    assert list(filas[0]) == list(bib.COLUMNAS_EXPORTACION['libros'])
+    assert filas[2]['titulo'] == 'Ficciones'
+
+
+def test_el_formato_se_deduce_de_la_extension(biblioteca, bib, carpeta):
+    ruta = str(carpeta / 'usuarios.col')
+    assert biblioteca.exportar('usuarios', ruta) == 4
+    assert [fila['rut'] for fila in bib.leer_columnar(ruta)] == ['1-9', '2-9', '3-9', '4-9']
+
+
+def test_exportar_prestamos_por_rango_y_solo_activos(con_prestamos, carpeta):
+    ruta = str(carpeta / 'prestamos.jsonl')
+
+    assert con_prestamos.exportar('prestamos', ruta) == 2
+    devuelto = next(fila for fila in leer(None, ruta, 'jsonl') if fila['id_libro'] == 'L1')
+    assert devuelto['fecha_prestamo'] == '2024-01-10 09:30:00'
+    assert devuelto['estado_devolucion'] == 'Bien' and devuelto['fecha_devolucion']
+
+    assert con_prestamos.exportar('prestamos', ruta, desde=datetime(2024, 2, 1)) == 1
+    assert [fila['id_libro'] for fila in leer(None, ruta, 'jsonl')] == ['L3']
+    assert con_prestamos.exportar('prestamos', ruta, hasta=datetime(2024, 2, 1)) == 1
+    assert [fila['id_libro'] for fila in leer(None, ruta, 'jsonl')] == ['L1']
+
+    assert con_prestamos.exportar('prestamos', ruta, solo_activos=True) == 1
+    activo = leer(None, ruta, 'jsonl')[0]
+    assert activo['id_libro'] == 'L3' and activo['fecha_devolucion'] is None
+
+
+def test_exportacion_invalida(biblioteca, bib, carpeta):
+    with pytest.raises(ValueError):
+        biblioteca.exportar('reservas', str(carpeta / 'x.csv'))
+    ajeno = carpeta / 'ajeno.col'
+    ajeno.write_bytes(b'no es columnar')
+    with pytest.raises(ValueError):
+        list(bib.leer_columnar(str(ajeno)))
@@ -0,0 +1,89 @@
+import os
+
+from conftest import poblar
+
+
+def prestar_y_devolver(biblioteca):
+    """L1 queda devuelto y L3 sigue prestado"""
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L3')
+    biblioteca.devolver_libro('L1', 'Sin daños')
+
+
+def archivos(carpeta, bib):
+    return sorted(relativa for relativa, _ in bib.recorrer_carpeta(carpeta))
+
+
+def test_redistribuir_a_fragmentos_y_volver_a_plano(biblioteca, bib):
+    prestar_y_devolver(biblioteca)
+    almacenamiento = biblioteca.almacenamiento
+    mes = biblioteca.prestamos_activos['L3'].fecha_prestamo.strftime('%Y/%m/')
+
+    movidos = almacenamiento.redistribuir(fragmentos=16)
+
+    assert movidos == {'libros': 3, 'usuarios': 4, 'prestamos': 2}
+    assert all(ruta.startswith(mes) for ruta in archivos(bib.CARPETA_PRESTAMOS, bib))
+    assert all(ruta.count('/') == 1 for ruta in archivos(bib.CARPETA_LIBROS, bib))
+    assert bib.leer_distribucion(bib.CARPETA_PRESTAMOS) == bib.PRESTAMOS_POR_MES
+    # Volver a ejecutarla no mueve nada
+    assert almacenamiento.redistribuir(fragmentos=16) == {'libros': 0, 'usuarios': 0, 'prestamos': 0}
+    biblioteca.cerrar()
+
+    fragmentada = bib.Biblioteca(bib.crear_almacenamiento())
+    try:
+        assert fragmentada.almacenamiento.prestamos_por_mes
+        assert sorted(fragmentada.libros) == ['L1', 'L2', 'L3'] and len(fragmentada.usuarios) == 4
+        assert sorted(fragmentada.prestamos_activos) == ['L3'] and fragmentada.total_prestamos == 2
+
+        movidos = fragmentada.almacenamiento.redistribuir(fragmentos=0, prestamos_por_mes=False)
+        assert movidos == {'libros': 3, 'usuarios': 4, 'prestamos': 2}
+    finally:
+        fragmentada.cerrar()
+
+    for carpeta in (bib.CARPETA_LIBROS, bib.CARPETA_USUARIOS, bib.CARPETA_PRESTAMOS):
+        assert all('/' not in ruta for ruta in archivos(carpeta, bib))
+        assert not any(entrada.is_dir() for entrada in os.scandir(carpeta))
+        assert bib.leer_distribucion(carpeta) == ''
+    plana = bib.Biblioteca(bib.crear_almacenamiento())
+    plana.cerrar()
+    assert sorted(plana.prestamos_activos) == ['L3'] and plana.total_prestamos == 2
+
+
+def test_el_indice_de_abiertos_sigue_a_los_fragmentos(biblioteca, bib):
+    prestar_y_devolver(biblioteca)
+    biblioteca.almacenamiento.redistribuir()
+    # Las rutas anotadas ya no sirven: el índice se descarta
+    assert not os.path.exists(bib.CARPETA_PRESTAMOS + bib.ARCHIVO_ACTIVOS)
+    biblioteca.prestar_libro('U3', 'L2')
+    biblioteca.cerrar()
+
+    diferida = bib.Biblioteca(bib.crear_almacenamiento(), historial_diferido=True)
+    diferida.cerrar()
+    assert sorted(diferida.prestamos_activos) == ['L2', 'L3']
+
+    # Reconstruido, anota cada préstamo abierto con su fragmento
+    with open(bib.CARPETA_PRESTAMOS + bib.ARCHIVO_ACTIVOS, encoding='utf-8') as indice:
+        anotados = indice.read().splitlines()
+    assert sorted(anotados) == [ruta for ruta in archivos(bib.CARPETA_PRESTAMOS, bib)
+                                if os.path.basename(ruta)[:-len(bib.EXTENSION)] in
+                                {p.clave for p in diferida.prestamos_activos.values()}]
+    assert all(ruta.count('/') == 2 for ruta in anotados)
+
+    diferida = bib.Biblioteca(bib.crear_almacenamiento(), historial_diferido=True)
+    diferida.cerrar()
+    assert sorted(diferida.prestamos_activos) == ['L2', 'L3'] and diferida.total_prestamos == 3
+
+
+def test_eliminar_prestamos_descarta_los_fragmentos_enteros(carpeta, bib):
+    almacenamiento = bib.crear_almacenamiento()
+    almacenamiento.redistribuir()
+    biblioteca = poblar(bib.Biblioteca(almacenamiento))
+    try:
+        prestar_y_devolver(biblioteca)
+        assert biblioteca.almacenamiento.eliminar_prestamos() == 2
+        assert not any(entrada.is_dir() for entrada in os.scandir(bib.CARPETA_PRESTAMOS))
+        assert biblioteca.almacenamiento.contar_prestamos() == 0
+        biblioteca.prestar_libro('U1', 'L2')
+        assert biblioteca.almacenamiento.contar_prestamos() == 1
+    finally:
+        biblioteca.cerrar()
@@ -0,0 +1,85 @@
+import builtins
+import os
+
+import pytest
+
+from conftest import poblar
+
+
+def prestar_y_devolver(biblioteca):
+    """L1 queda devuelto y L3 sigue prestado"""
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L3')
+    biblioteca.devolver_libro('L1', 'Sin daños')
+
+
+@pytest.mark.parametrize('motor', ['texto', 'sqlite'])
+def test_el_modo_diferido_carga_solo_los_activos(carpeta, bib, motor):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento(motor)))
+    prestar_y_devolver(biblioteca)
+    biblioteca.cerrar()
+
+    diferida = bib.Biblioteca(bib.crear_almacenamiento(motor), historial_diferido=True)
+    try:
+        assert [p.libro.id_libro for p in diferida.prestamos] == ['L3']
+        assert sorted(diferida.prestamos_activos) == ['L3']
+        assert diferida.contar_prestamos() == 2
+        historial = {p.libro.id_libro: p for p in diferida.iterar_historial()}
+        assert sorted(historial) == ['L1', 'L3']
+        assert historial['L1'].estado_devolucion == 'Sin daños'
+        assert historial['L3'] is diferida.prestamos_activos['L3']
+    finally:
+        diferida.cerrar()
+
+
+def test_al_iniciar_no_se_abren_los_prestamos_devueltos(biblioteca, bib, monkeypatch):
+    prestar_y_devolver(biblioteca)
+    devuelto = next(p for p in biblioteca.prestamos if p.fecha_devolucion).clave
+    biblioteca.cerrar()
+    # La primera carga (que lee el devuelto) compacta el índice
+    bib.Biblioteca(bib.crear_almacenamiento(), historial_diferido=True).cerrar()
+
+    abiertos = []
+    abrir = builtins.open
+
+    def registrar(ruta, *args, **kwargs):
+        if isinstance(ruta, str):
+            abiertos.append(os.path.basename(ruta))
+        return abrir(ruta, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', registrar)
+    diferida = bib.Biblioteca(bib.crear_almacenamiento(), historial_diferido=True)
+    monkeypatch.setattr(builtins, 'open', abrir)
+    diferida.cerrar()
+
+    assert devuelto + bib.EXTENSION not in abiertos
+    assert [p.libro.id_libro for p in diferida.prestamos] == ['L3']
+
+
+def test_el_indice_de_abiertos_se_reconstruye_si_falta(biblioteca, bib):
+    prestar_y_devolver(biblioteca)
+    biblioteca.cerrar()
+    indice = bib.CARPETA_PRESTAMOS + bib.ARCHIVO_ACTIVOS
+    with open(indice, encoding='utf-8') as archivo:
+        anotados = archivo.read().splitlines()
+    activo = biblioteca.prestamos_activos['L3'].clave + bib.EXTENSION
+    # Se anotan al prestar; el devuelto sale recién al compactar
+    assert activo in anotados and len(anotados) == 2
+    os.remove(indice)
+
+    diferida = bib.Biblioteca(bib.crear_almacenamiento(), historial_diferido=True)
+    diferida.cerrar()
+
+    assert sorted(diferida.prestamos_activos) == ['L3']
+    with open(indice, encoding='utf-8') as archivo:
+        assert archivo.read().splitlines() == [activo]
+
+
+def test_eliminar_el_historial_vacia_el_indice(biblioteca, bib):
+    prestar_y_devolver(biblioteca)
+    assert biblioteca.almacenamiento.eliminar_prestamos() == 2
+    biblioteca.cerrar()
+
+    diferida = bib.Biblioteca(bib.crear_almacenamiento(), historial_diferido=True)
+    diferida.cerrar()
+    assert diferida.prestamos == [] and diferida.contar_prestamos() == 0
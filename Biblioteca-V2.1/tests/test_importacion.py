@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+
+def escribir(ruta, texto):
+    ruta.write_text(texto, encoding='utf-8')
+    return str(ruta)
+
+
+def test_importar_libros_csv_en_lotes_con_rechazos(biblioteca, bib, carpeta):
+    ruta = escribir(carpeta / 'libros.csv', (
+        "id_libro,titulo,autor,editorial,fecha_publicacion,isbn\n"
+        "N1,Pedro Páramo,Rulfo,FCE,1955,978-0-00-000001-1\n"
+        "N2,,Sin título,X,2000,1\n"
+        "L1,Repetido en la biblioteca,X,X,2000,2\n"
+        "N3,El Aleph,Borges,Losada,1949,978-0-00-000003-3\n"
+        "N1,Repetido en el archivo,X,X,2000,3\n"
+        "N4,Los detectives salvajes,Bolaño,Anagrama,1998,978-0-00-000004-4\n"
+    ))
+    rechazos = carpeta / 'rechazos.txt'
+
+    resultado = biblioteca.importar_libros(ruta, tamano_lote=2, ruta_rechazos=str(rechazos))
+
+    assert (resultado.aceptadas, resultado.rechazadas, resultado.lotes) == (3, 3, 2)
+    assert [numero for numero, _ in resultado.ejemplos_rechazo] == [3, 4, 6]
+    assert 'titulo' in resultado.ejemplos_rechazo[0][1]
+    assert 'L1' in resultado.ejemplos_rechazo[1][1] and 'N1' in resultado.ejemplos_rechazo[2][1]
+    assert rechazos.read_text(encoding='utf-8').splitlines()[0].startswith('3\t')
+    assert biblioteca.libros['L1'].titulo == 'Rayuela'
+    # Los importados quedan indexados y en el almacenamiento
+    assert [l.id_libro for l in biblioteca.buscar_libros_por_titulo('aleph')] == ['N3']
+    guardados = {fila[0] for fila in biblioteca.almacenamiento.leer_libros()}
+    assert {'N1', 'N3', 'N4'} <= guardados
+
+
+def test_importar_usuarios_jsonl_rechaza_lineas_invalidas(biblioteca, bib, carpeta):
+    ruta = escribir(carpeta / 'usuarios.jsonl', '\n'.join([
+        json.dumps({'id_usuario': 'N1', 'nombre': 'Ana', 'rut': '11-1', 'correo': 'ana@correo.cl'}),
+        '{"id_usuario": "N2", "nombre": ',
+        '["no", "es", "un", "objeto"]',
+        '',
+        json.dumps({'id_usuario': 'U1', 'nombre': 'Ya existe'}),
+        json.dumps({'id_usuario': 'N3', 'nombre': 'Beto', 'telefono': 912345678}),
+    ]) + '\n')
+
+    resultado = biblioteca.importar_usuarios(ruta)
+
+    assert (resultado.aceptadas, resultado.rechazadas, resultado.lotes) == (2, 3, 1)
+    assert [numero for numero, _ in resultado.ejemplos_rechazo] == [2, 3, 5]
+    assert biblioteca.usuarios['N3'].telefono == '912345678'
+    assert biblioteca.buscar_usuario_por_rut('11-1').id_usuario == 'N1'
+
+
+def test_un_lote_que_no_se_guarda_no_queda_en_memoria(biblioteca, bib, carpeta, monkeypatch):
+    ruta = escribir(carpeta / 'libros.jsonl', ''.join(
+        json.dumps({'id_libro': f'N{numero}', 'titulo': f'Libro {numero}'}) + '\n' for numero in range(1, 6)))
+    guardar_libro = bib.AlmacenamientoTexto.guardar_libro
+
+    def fallar_en_n4(self, libro):
+        if libro.id_libro == 'N4':
+            raise OSError('disco lleno')
+        guardar_libro(self, libro)
+
+    monkeypatch.setattr(bib.AlmacenamientoTexto, 'guardar_libro', fallar_en_n4)
+    with pytest.raises(OSError):
+        biblioteca.importar_libros(ruta, tamano_lote=2)
+
+    # El primer lote se confirmó; el segundo (N3, N4) se descartó entero
+    assert sorted(i for i in biblioteca.libros if i.startswith('N')) == ['N1', 'N2']
+    assert sorted(fila[0] for fila in biblioteca.almacenamiento.leer_libros()
+                  if fila[0].startswith('N')) == ['N1', 'N2']
+
+
+def test_los_ejemplares_importados_atienden_la_lista_de_espera(biblioteca, bib, carpeta):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L2')
+    reserva = biblioteca.reservar('U3', '978-84-376-0494-7')
+    ruta = escribir(carpeta / 'ejemplares.csv', (
+        "id_libro,titulo,autor,editorial,fecha_publicacion,isbn\n"
+        "L1-E03,Rayuela,Cortázar,Sudamericana,1963,978-84-376-0494-7\n"
+        "L1-E04,Rayuela,Cortázar,Sudamericana,1963,978-84-376-0494-7\n"
+    ))
+
+    biblioteca.importar_libros(ruta, tamano_lote=1)
+
+    assert reserva.estado == bib.ASIGNADA and reserva.libro.id_libro == 'L1-E03'
+    # El segundo ejemplar ya no tiene a quién apartarse y queda libre
+    assert biblioteca.disponibilidad('978-84-376-0494-7') == (1, 4)
@@ -0,0 +1,56 @@
+def ids(libros):
+    return [libro.id_libro for libro in libros]
+
+
+def test_isbn_se_busca_normalizado(biblioteca):
+    assert ids(biblioteca.buscar_libros_por_isbn('978 84 376 0494 7')) == ['L1', 'L2']
+    assert ids(biblioteca.buscar_libros_por_isbn('9788420633178')) == ['L3']
+    assert biblioteca.buscar_libros_por_isbn('978-0-306-40615-7') == []
+
+
+def test_rut_y_correo_se_buscan_normalizados(biblioteca):
+    assert biblioteca.buscar_usuario_por_rut('2-9') is biblioteca.usuarios['U2']
+    assert biblioteca.buscar_usuario_por_rut('29') is biblioteca.usuarios['U2']
+    assert biblioteca.buscar_usuario_por_correo('  U3@Correo.CL ') is biblioteca.usuarios['U3']
+    assert biblioteca.buscar_usuario_por_rut('7-7') is None
+
+
+def test_titulo_y_autor_por_palabras_y_prefijo(biblioteca):
+    assert ids(biblioteca.buscar_libros_por_titulo('ray')) == ['L1', 'L2']
+    assert ids(biblioteca.buscar_libros_por_titulo('FICCIONES')) == ['L3']
+    assert ids(biblioteca.buscar_libros_por_autor('borg')) == ['L3']
+    assert biblioteca.buscar_libros_por_titulo('rayuela borges') == []
+    assert biblioteca.buscar_libros_por_titulo('') == []
+
+
+def test_editar_actualiza_los_indices(biblioteca):
+    biblioteca.editar_libro('L3', titulo='El Aleph', isbn='978-0-306-40615-7')
+    assert ids(biblioteca.buscar_libros_por_titulo('aleph')) == ['L3']
+    assert biblioteca.buscar_libros_por_titulo('ficciones') == []
+    assert ids(biblioteca.buscar_libros_por_isbn('9780306406157')) == ['L3']
+    assert biblioteca.buscar_libros_por_isbn('9788420633178') == []
+    assert 'ficciones' not in biblioteca.indice_titulos.vocabulario
+
+    biblioteca.editar_usuario('U4', rut='4.444-9', correo='nuevo@correo.cl')
+    assert biblioteca.buscar_usuario_por_rut('44449') is biblioteca.usuarios['U4']
+    assert biblioteca.buscar_usuario_por_rut('4-9') is None
+    assert biblioteca.buscar_usuario_por_correo('u4@correo.cl') is None
+
+
+def test_eliminar_quita_de_los_indices(biblioteca):
+    biblioteca.eliminar_libro('L1')
+    biblioteca.eliminar_usuario('U1')
+    assert ids(biblioteca.buscar_libros_por_isbn('9788437604947')) == ['L2']
+    assert ids(biblioteca.buscar_libros_por_titulo('rayuela')) == ['L2']
+    assert biblioteca.buscar_usuario_por_correo('u1@correo.cl') is None
+
+
+def test_los_indices_se_reconstruyen_al_cargar(biblioteca, bib):
+    biblioteca.cerrar()
+    recargada = bib.Biblioteca(bib.crear_almacenamiento())
+    try:
+        assert ids(recargada.buscar_libros_por_isbn('9788437604947')) == ['L1', 'L2']
+        assert ids(recargada.buscar_libros_por_autor('cortázar')) == ['L1', 'L2']
+        assert recargada.buscar_usuario_por_rut('1-9') is recargada.usuarios['U1']
+    finally:
+        recargada.cerrar()
@@ -0,0 +1,45 @@
+import json
+
+from conftest import poblar
+
+
+def test_la_instrumentacion_mide_llamadas_y_escrituras(carpeta, bib):
+    instrumentacion = bib.Instrumentacion()
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento(), instrumentacion=instrumentacion))
+    try:
+        biblioteca.prestar_libro('U1', 'L1')
+        biblioteca.devolver_libro('L1')
+        assert len(list(biblioteca.iterar_historial())) == 1
+    finally:
+        biblioteca.cerrar()
+
+    resumen = instrumentacion.resumen()
+    assert resumen['llamadas']['Biblioteca.prestar_libro']['llamadas'] == 1
+    assert resumen['llamadas']['Biblioteca.agregar_libro']['llamadas'] == 3
+    # Los flujos se cuentan una vez, al agotarse
+    assert resumen['llamadas']['Biblioteca.iterar_historial']['llamadas'] == 1
+    assert resumen['escrituras']['operaciones'] > 0 and resumen['escrituras']['bytes'] > 0
+
+    instrumentacion.volcar('metricas.json')
+    with open('metricas.json', encoding='utf-8') as archivo:
+        assert json.load(archivo)['llamadas'].keys() == resumen['llamadas'].keys()
+
+
+def test_una_llamada_fallida_tambien_se_mide(carpeta, bib):
+    instrumentacion = bib.Instrumentacion()
+    biblioteca = bib.Biblioteca(bib.crear_almacenamiento(), instrumentacion=instrumentacion)
+    try:
+        try:
+            biblioteca.buscar_libro('L9')
+        except bib.LibroNoEncontrado:
+            pass
+    finally:
+        biblioteca.cerrar()
+    assert instrumentacion.resumen()['llamadas']['Biblioteca.buscar_libro']['llamadas'] == 1
+
+
+def test_capturar_perfil_escribe_el_archivo(carpeta, bib):
+    for modo in ('cprofile', 'tracemalloc'):
+        with bib.capturar_perfil(modo, f'perfil.{modo}'):
+            sum(range(1000))
+        assert (carpeta / f'perfil.{modo}').stat().st_size > 0
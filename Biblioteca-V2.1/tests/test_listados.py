@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import poblar
+
+
+def historial_fijo(biblioteca, bib, monkeypatch):
+    """
+    Seis préstamos con un día de diferencia (del 1 al 6 de marzo); se
+    devuelven todos menos los dos últimos. Devuelve las claves en orden
+    """
+    reloj = {'ahora': datetime(2024, 3, 1, 10, 0)}
+
+    class Reloj(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return reloj['ahora']
+
+    original = bib.datetime
+    monkeypatch.setattr(bib, 'datetime', Reloj)
+    claves = []
+    for dia, (id_usuario, id_libro) in enumerate([('U1', 'L1'), ('U2', 'L2'), ('U1', 'L3'),
+                                                  ('U3', 'L1'), ('U1', 'L2'), ('U2', 'L3')]):
+        reloj['ahora'] = datetime(2024, 3, 1 + dia, 10, 0)
+        claves.append(biblioteca.prestar_libro(id_usuario, id_libro).clave)
+        if dia < 4:
+            reloj['ahora'] += timedelta(hours=1)
+            biblioteca.devolver_libro(id_libro)
+    monkeypatch.setattr(bib, 'datetime', original)
+    return claves
+
+
+def claves(pagina):
+    return [prestamo.clave for prestamo in pagina.elementos]
+
+
+def test_paginar_listas_y_flujos(bib):
+    numeros = list(range(10))
+    pagina = bib.paginar(numeros, pagina=2, tamano_pagina=4)
+    assert pagina.elementos == [4, 5, 6, 7] and pagina.hay_siguiente
+    assert bib.paginar(numeros, 3, 4, descendente=True).elementos == [1, 0]
+    assert bib.paginar(iter(numeros), 3, 4).elementos == [8, 9]
+    assert not bib.paginar(iter(numeros), 3, 4).hay_siguiente
+    assert bib.paginar(numeros, 1, 3, clave=lambda n: -n).elementos == [9, 8, 7]
+    assert bib.paginar(numeros, 1, 4, total=10).total_paginas == 3
+    with pytest.raises(ValueError):
+        bib.paginar(numeros, 0)
+
+
+@pytest.mark.parametrize('modo', ['normal', 'columnar', 'diferido'])
+def test_listar_prestamos_filtra_igual_en_todos_los_modos(carpeta, bib, monkeypatch, modo):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento()))
+    orden = historial_fijo(biblioteca, bib, monkeypatch)
+    biblioteca.cerrar()
+
+    biblioteca = bib.Biblioteca(bib.crear_almacenamiento(), historial_diferido=modo == 'diferido',
+                                historial_columnar=modo == 'columnar')
+    try:
+        completa = biblioteca.listar_prestamos(tamano_pagina=4)
+        assert claves(completa) == orden[:4] and completa.hay_siguiente
+        assert claves(biblioteca.listar_prestamos(pagina=2, tamano_pagina=4)) == orden[4:]
+        assert claves(biblioteca.listar_prestamos(descendente=True, tamano_pagina=2)) == orden[:-3:-1]
+        assert biblioteca.listar_prestamos(estado='activo').total == 2
+        assert claves(biblioteca.listar_prestamos(estado='devuelto')) == orden[:4]
+        assert claves(biblioteca.listar_prestamos(id_usuario='U1')) == [orden[0], orden[2], orden[4]]
+        assert claves(biblioteca.listar_prestamos(estado='activo', id_usuario='U1')) == [orden[4]]
+        entre = biblioteca.listar_prestamos(desde=datetime(2024, 3, 2), hasta=datetime(2024, 3, 4, 10, 0))
+        assert claves(entre) == orden[1:4]
+        assert claves(biblioteca.listar_prestamos(desde=datetime(2024, 3, 5), estado='devuelto')) == []
+        por_libro = biblioteca.listar_prestamos(orden='libro', id_usuario='U1')
+        assert [p.libro.titulo for p in por_libro.elementos] == ['Ficciones', 'Rayuela', 'Rayuela']
+        with pytest.raises(ValueError):
+            biblioteca.listar_prestamos(estado='perdido')
+    finally:
+        biblioteca.cerrar()
+
+
+def test_el_listado_en_cache_se_renueva_al_prestar(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    assert len(biblioteca.listar_prestamos(orden='usuario').elementos) == 1
+    biblioteca.prestar_libro('U2', 'L2')
+    assert len(biblioteca.listar_prestamos(orden='usuario').elementos) == 2
+
+
+def test_listar_libros_y_usuarios_con_contadores(biblioteca):
+    biblioteca.prestar_libro('U2', 'L1')
+    assert biblioteca.resumen_libros() == (3, 2, 1)
+    disponibles = biblioteca.listar_libros(disponible=True, orden='titulo')
+    assert [libro.id_libro for libro in disponibles.elementos] == ['L3', 'L2'] and disponibles.total == 2
+    assert [u.id_usuario for u in biblioteca.listar_usuarios(con_prestamos=True).elementos] == ['U2']
+    primero = biblioteca.listar_usuarios(orden='prestamos', descendente=True, tamano_pagina=1)
+    assert primero.elementos[0].id_usuario == 'U2' and primero.total_paginas == 4
+    biblioteca.devolver_libro('L1')
+    assert biblioteca.resumen_libros() == (3, 3, 0)
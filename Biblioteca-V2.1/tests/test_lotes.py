@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+
+def estado(biblioteca):
+    """Lo que un lote fallido no debe alterar, en memoria y en disco"""
+    return ({id_libro: libro.disponible for id_libro, libro in biblioteca.libros.items()},
+            sorted(biblioteca.prestamos_activos), biblioteca.total_prestamos, biblioteca.libros_prestados,
+            list(biblioteca._por_vencer), sorted(os.listdir(biblioteca.almacenamiento.carpeta_prestamos)))
+
+
+def test_prestar_lote_aplica_todo(biblioteca):
+    resultado = biblioteca.prestar_lote([('U1', 'L1'), ('U2', 'L3')])
+
+    assert resultado.aplicado
+    assert sorted(biblioteca.prestamos_activos) == ['L1', 'L3']
+    assert biblioteca.total_prestamos == 2
+    assert not biblioteca.libros['L1'].disponible
+
+
+def test_prestar_lote_con_un_item_invalido_no_aplica_nada(biblioteca):
+    antes = estado(biblioteca)
+
+    resultado = biblioteca.prestar_lote([('U1', 'L1'), ('U2', 'L1'), ('U9', 'L3')])
+
+    assert not resultado.aplicado
+    assert resultado.fallidos == 2
+    assert resultado.estado(0).startswith('no aplicado')
+    assert resultado.estado(1).startswith('rechazado')
+    assert estado(biblioteca) == antes
+
+
+def test_prestar_lote_deshace_si_falla_el_almacenamiento(biblioteca, monkeypatch):
+    antes = estado(biblioteca)
+
+    def falla(libro):
+        raise OSError('disco lleno')
+    monkeypatch.setattr(biblioteca.almacenamiento, 'guardar_libro', falla)
+
+    with pytest.raises(OSError):
+        biblioteca.prestar_lote([('U1', 'L1'), ('U2', 'L3')])
+
+    assert estado(biblioteca) == antes
+    assert biblioteca.titulos['9788437604947'].disponibles == 2
+
+
+def test_devolver_lote_deshace_si_falla_el_almacenamiento(biblioteca, monkeypatch):
+    biblioteca.prestar_lote([('U1', 'L1'), ('U2', 'L3')])
+    antes = estado(biblioteca)
+    prestamo = biblioteca.prestamos_activos['L1']
+
+    def falla(libro):
+        raise OSError('disco lleno')
+    monkeypatch.setattr(biblioteca.almacenamiento, 'guardar_libro', falla)
+
+    with pytest.raises(OSError):
+        biblioteca.devolver_lote(['L1', ('L3', 'Buen estado')])
+
+    assert estado(biblioteca) == antes
+    assert prestamo.fecha_devolucion is None and prestamo.estado_devolucion is None
+
+
+def test_devolver_lote_con_un_item_invalido_no_aplica_nada(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    antes = estado(biblioteca)
+
+    resultado = biblioteca.devolver_lote(['L1', 'L2'])
+
+    assert not resultado.aplicado
+    assert estado(biblioteca) == antes
+
+
+def test_lote_aplicado_se_mantiene_al_recargar(biblioteca, bib):
+    biblioteca.prestar_lote([('U1', 'L1'), ('U2', 'L3')])
+    biblioteca.devolver_lote([('L3', 'Buen estado')])
+    biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento())
+    try:
+        assert sorted(recargada.prestamos_activos) == ['L1']
+        assert recargada.total_prestamos == 2
+        assert recargada.libros['L3'].disponible
+    finally:
+        recargada.cerrar()
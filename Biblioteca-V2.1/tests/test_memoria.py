@@ -0,0 +1,36 @@
+from conftest import poblar
+
+
+def test_el_historial_columnar_guarda_los_devueltos_en_arrays(carpeta, bib):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento(), historial_columnar=True))
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L3')
+    biblioteca.devolver_libro('L1', 'Sin daños')
+    try:
+        assert biblioteca.prestamos == []
+        assert [p.libro.id_libro for p in biblioteca.prestamos_en_curso.values()] == ['L3']
+        assert len(biblioteca.historial) == 1
+        assert biblioteca.contar_prestamos() == 2
+        historial = {p.libro.id_libro: p for p in biblioteca.iterar_historial()}
+        assert historial['L1'].estado_devolucion == 'Sin daños'
+        assert historial['L3'] is biblioteca.prestamos_activos['L3']
+    finally:
+        biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento(), historial_columnar=True)
+    try:
+        assert list(recargada.prestamos_en_curso) == [historial['L3'].clave]
+        assert recargada.contar_prestamos() == 2
+        recargada.devolver_libro('L3')
+        assert not recargada.prestamos_en_curso and len(recargada.historial) == 2
+        recargada.eliminar_historial_prestamos()
+        assert recargada.contar_prestamos() == 0
+    finally:
+        recargada.cerrar()
+
+
+def test_medir_memoria_compara_con_registros_con_dict(bib):
+    resultados = bib.medir_memoria(2000)
+    assert sorted(resultados) == ['libro', 'prestamo', 'prestamo_columnar', 'usuario']
+    for con_dict, actual in resultados.values():
+        assert 0 < actual < con_dict
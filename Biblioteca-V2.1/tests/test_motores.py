@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from conftest import poblar
+
+
+def filas(almacenamiento):
+    """Contenido de un motor como filas ordenadas (comparable entre motores)"""
+    return (sorted(almacenamiento.leer_libros()), sorted(almacenamiento.leer_usuarios()),
+            sorted(almacenamiento.leer_prestamos()))
+
+
+def operar(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L3')
+    biblioteca.devolver_libro('L1', 'Bien')
+
+
+@pytest.mark.parametrize('motor', ['texto', 'sqlite', 'instantanea'])
+def test_cada_motor_conserva_los_datos_al_reabrir(carpeta, bib, motor):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento(motor)))
+    operar(biblioteca)
+    antes = filas(biblioteca.almacenamiento)
+    biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento(motor))
+    try:
+        assert sorted(recargada.libros) == ['L1', 'L2', 'L3']
+        assert recargada.libros['L1'].disponible and not recargada.libros['L3'].disponible
+        assert recargada.usuarios['U1'].rut == '1-9'
+        assert sorted(recargada.prestamos_activos) == ['L3']
+        devuelto = next(p for p in recargada.prestamos if p.libro.id_libro == 'L1')
+        assert devuelto.estado_devolucion == 'Bien' and devuelto.fecha_devolucion is not None
+        assert filas(recargada.almacenamiento) == antes
+    finally:
+        recargada.cerrar()
+
+
+@pytest.mark.parametrize('motor', ['sqlite', 'instantanea'])
+def test_la_migracion_copia_todo_el_arbol_de_texto(biblioteca, bib, motor):
+    operar(biblioteca)
+    texto = bib.AlmacenamientoTexto()
+
+    resultado = bib.migrar_desde_texto(bib.crear_almacenamiento(motor))
+
+    assert resultado == (3, 4, 2)
+    destino = bib.crear_almacenamiento(motor)
+    try:
+        assert filas(destino) == filas(texto)
+    finally:
+        destino.cerrar()
+
+
+def test_el_diario_se_reaplica_sin_compactar(carpeta, bib):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento('instantanea')))
+    operar(biblioteca)
+    biblioteca.cerrar()
+    assert not os.path.exists(bib.ARCHIVO_INSTANTANEA)
+
+    motor = bib.AlmacenamientoInstantanea()
+    esperado = filas(motor)
+    assert motor.compactar() == os.path.getsize(bib.ARCHIVO_INSTANTANEA)
+    assert os.path.getsize(bib.ARCHIVO_DIARIO) == 0
+    motor.eliminar_libro('L2')
+    motor.cerrar()
+
+    reabierto = bib.AlmacenamientoInstantanea()
+    try:
+        libros, usuarios, prestamos = filas(reabierto)
+        assert [fila[0] for fila in libros] == ['L1', 'L3']
+        assert (usuarios, prestamos) == esperado[1:]
+    finally:
+        reabierto.cerrar()
+
+
+def test_un_registro_cortado_al_final_del_diario_se_descarta(carpeta, bib):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento('instantanea')))
+    biblioteca.cerrar()
+    largo = os.path.getsize(bib.ARCHIVO_DIARIO)
+    # Caída a mitad de escritura: encabezado de 100 bytes con solo 3 escritos
+    with open(bib.ARCHIVO_DIARIO, 'ab') as diario:
+        diario.write(b'\x64\x00\x00\x00abc')
+
+    reabierto = bib.AlmacenamientoInstantanea()
+    try:
+        assert len(list(reabierto.leer_libros())) == 3
+        assert os.path.getsize(bib.ARCHIVO_DIARIO) == largo
+    finally:
+        reabierto.cerrar()
+
+
+def test_una_instantanea_ajena_se_rechaza(carpeta, bib):
+    with open(bib.ARCHIVO_INSTANTANEA, 'wb') as archivo:
+        archivo.write(b'otra cosa')
+    with pytest.raises(ValueError):
+        bib.AlmacenamientoInstantanea()
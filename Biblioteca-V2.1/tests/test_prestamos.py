@@ -0,0 +1,49 @@
+import pytest
+
+
+def test_prestar_y_devolver_mantienen_los_prestamos_abiertos(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    prestamo = biblioteca.prestamos_activos['L1']
+    assert prestamo.usuario is biblioteca.usuarios['U1']
+    assert biblioteca.usuarios['U1'].prestamos == {prestamo}
+    assert not biblioteca.libros['L1'].disponible
+
+    biblioteca.devolver_libro('L1', 'Tapa rota')
+
+    assert 'L1' not in biblioteca.prestamos_activos
+    assert biblioteca.usuarios['U1'].prestamos == set()
+    assert biblioteca.libros['L1'].disponible
+    assert prestamo.fecha_devolucion is not None and prestamo.estado_devolucion == 'Tapa rota'
+    assert biblioteca.prestamos == [prestamo]
+
+
+def test_un_libro_prestado_no_se_vuelve_a_prestar(biblioteca, bib):
+    biblioteca.prestar_libro('U1', 'L1')
+    with pytest.raises(bib.LibroPrestado):
+        biblioteca.prestar_libro('U2', 'L1')
+    assert biblioteca.prestamos_activos['L1'].usuario.id_usuario == 'U1'
+    assert biblioteca.usuarios['U2'].prestamos == set()
+    assert len(biblioteca.prestamos) == 1
+
+
+def test_devolver_un_libro_prestado_sin_registro_de_prestamo(biblioteca):
+    libro = biblioteca.libros['L3']
+    libro.disponible = False
+    biblioteca.devolver_libro('L3')
+    assert libro.disponible
+
+
+def test_al_cargar_solo_los_abiertos_quedan_indexados(biblioteca, bib):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L2')
+    biblioteca.devolver_libro('L1')
+    biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento())
+    try:
+        assert sorted(recargada.prestamos_activos) == ['L2']
+        assert [p.libro.id_libro for p in recargada.usuarios['U2'].prestamos] == ['L2']
+        assert recargada.usuarios['U1'].prestamos == set()
+        assert len(recargada.prestamos) == 2
+    finally:
+        recargada.cerrar()
@@ -0,0 +1,193 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from conftest import poblar
+
+
+@pytest.fixture
+def vigilada(biblioteca):
+    biblioteca.vigilar_archivos()
+    return biblioteca
+
+
+@pytest.fixture
+def externo(carpeta, bib):
+    """Otro proceso que escribe en las mismas carpetas"""
+    almacenamiento = bib.crear_almacenamiento()
+    yield almacenamiento
+    almacenamiento.cerrar()
+
+
+def test_sin_cambios_externos_no_se_altera_nada(vigilada):
+    vigilada.prestar_libro('U1', 'L1')
+    vigilada.devolver_libro('L1')
+    resultado = vigilada.recargar_cambios()
+    assert not resultado
+    assert str(resultado).startswith('Sin cambios')
+
+
+def test_libros_agregados_editados_y_borrados(vigilada, externo, bib):
+    externo.guardar_libro(bib.Libro('L9', 'Pedro Páramo', 'Rulfo', 'FCE', '1955', '978-968-16-0306-0'))
+    editado = bib.Libro('L3', 'Ficciones (edición crítica)', 'Borges', 'Sur', '1944', '978-84-206-3317-8')
+    externo.guardar_libro(editado)
+    externo.eliminar_libro('L2')
+
+    resultado = vigilada.recargar_cambios()
+
+    assert resultado.cambios['libros', 'agregados'] == 1
+    assert resultado.cambios['libros', 'modificados'] == 1
+    assert resultado.cambios['libros', 'eliminados'] == 1
+    assert vigilada.libros['L9'].titulo == 'Pedro Páramo'
+    assert vigilada.libros['L3'].titulo == 'Ficciones (edición crítica)'
+    assert 'L2' not in vigilada.libros
+    assert vigilada.titulos['9788437604947'].total == 1
+    assert [libro.id_libro for libro in vigilada.buscar_libros_por_titulo('páramo')] == ['L9']
+
+
+def test_usuario_editado(vigilada, externo, bib):
+    usuario = bib.Usuario('U2', 'Usuario Dos', '2-9', 'nuevo@correo.cl', '900000002', 'Calle 1')
+    usuario.fecha_registro = vigilada.usuarios['U2'].fecha_registro
+    externo.guardar_usuario(usuario)
+
+    resultado = vigilada.recargar_cambios()
+
+    assert resultado.cambios['usuarios', 'modificados'] == 1
+    assert vigilada.usuarios['U2'].correo == 'nuevo@correo.cl'
+    assert vigilada.buscar_usuario_por_correo('nuevo@correo.cl') is vigilada.usuarios['U2']
+
+
+def test_prestamo_externo_y_su_devolucion(vigilada, externo, bib):
+    usuario, libro = vigilada.usuarios['U1'], vigilada.libros['L3']
+    prestamo = bib.Prestamo(usuario, libro, datetime(2026, 1, 1, 10, 0))
+    externo.guardar_prestamo(prestamo)
+
+    resultado = vigilada.recargar_cambios()
+
+    assert resultado.cambios['prestamos', 'agregados'] == 1
+    assert vigilada.prestamos_activos['L3'].clave == prestamo.clave
+    assert not libro.disponible
+    assert vigilada.total_prestamos == 1 and vigilada.libros_prestados == 1
+
+    reserva = vigilada.reservar('U2', 'L3')
+    prestamo.fecha_devolucion = datetime(2026, 1, 5, 10, 0)
+    prestamo.estado_devolucion = 'Buen estado'
+    externo.guardar_prestamo(prestamo)
+
+    resultado = vigilada.recargar_cambios()
+
+    assert resultado.cambios['prestamos', 'modificados'] == 1
+    assert 'L3' not in vigilada.prestamos_activos
+    assert vigilada.libros_prestados == 0
+    assert reserva.estado == bib.ASIGNADA and vigilada.apartados['L3'] is reserva
+
+
+def test_cambio_externo_de_isbn_de_un_libro_prestado_se_rechaza(vigilada, externo, bib):
+    vigilada.prestar_libro('U1', 'L1')
+    externo.guardar_libro(bib.Libro('L1', 'Rayuela', 'Cortázar', 'Sudamericana', '1963', '978-0-306-40615-7'))
+
+    resultado = vigilada.recargar_cambios()
+
+    assert len(resultado.conflictos) == 1
+    assert vigilada.libros['L1'].isbn == '978-84-376-0494-7'
+    # El archivo se reescribe con el estado real
+    assert ('L1', 'Rayuela', 'Cortázar', 'Sudamericana', '1963', '978-84-376-0494-7', False) in \
+        list(externo.leer_libros())
+
+
+def test_historial_diferido_cuenta_archivos_ilegibles_una_sola_vez(carpeta, bib):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento(), historial_diferido=True))
+    try:
+        biblioteca.prestar_libro('U1', 'L1')
+        biblioteca.devolver_libro('L1')
+        biblioteca.vigilar_archivos()
+        carpeta_prestamos = biblioteca.almacenamiento.carpeta_prestamos
+        ruta = os.path.join(carpeta_prestamos, 'U2_L3_20260105101000000000' + bib.EXTENSION)
+
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write('a medio escribir\n')
+        biblioteca.recargar_cambios()
+        assert biblioteca.total_prestamos == 1
+
+        externo = bib.crear_almacenamiento()
+        prestamo = bib.Prestamo(biblioteca.usuarios['U2'], biblioteca.libros['L3'],
+                                datetime(2026, 1, 5, 10, 10), 'U2_L3_20260105101000000000')
+        prestamo.fecha_devolucion = datetime(2026, 1, 6, 10, 10)
+        externo.guardar_prestamo(prestamo)
+        externo.cerrar()
+        biblioteca.recargar_cambios()
+        assert biblioteca.total_prestamos == 2
+
+        os.remove(ruta)
+        biblioteca.recargar_cambios()
+        assert biblioteca.total_prestamos == 1 == biblioteca.almacenamiento.contar_prestamos()
+    finally:
+        biblioteca.cerrar()
+
+
+def test_solo_el_motor_de_texto_se_puede_vigilar(carpeta, bib):
+    biblioteca = bib.Biblioteca(bib.crear_almacenamiento('sqlite'))
+    try:
+        with pytest.raises(bib.ErrorAlmacenamiento):
+            biblioteca.vigilar_archivos()
+    finally:
+        biblioteca.cerrar()
+
+
+def test_prestamos_externos_anteriores_quedan_en_orden(vigilada, externo, bib):
+    vigilada.prestar_libro('U1', 'L1')
+    vigilada.devolver_libro('L1')
+    usuario = vigilada.usuarios['U1']
+    devuelto = bib.Prestamo(usuario, vigilada.libros['L2'], datetime(2020, 1, 1, 10, 0))
+    devuelto.fecha_devolucion = datetime(2020, 1, 3, 10, 0)
+    externo.guardar_prestamo(devuelto)
+    externo.guardar_prestamo(bib.Prestamo(usuario, vigilada.libros['L3'], datetime(2020, 1, 2, 10, 0)))
+
+    resultado = vigilada.recargar_cambios()
+
+    assert resultado.cambios['prestamos', 'agregados'] == 2
+    fechas = [prestamo._fecha_prestamo for prestamo in vigilada.prestamos]
+    assert fechas == sorted(fechas) and len(fechas) == 3
+    assert vigilada.prestamos_por_usuario['U1'] == vigilada.prestamos
+    assert vigilada._buscar_prestamo(devuelto.clave)[1].clave == devuelto.clave
+
+
+def test_recarga_con_historial_columnar(carpeta, bib):
+    biblioteca = poblar(bib.Biblioteca(bib.crear_almacenamiento(), historial_columnar=True))
+    externo = bib.crear_almacenamiento()
+    try:
+        biblioteca.vigilar_archivos()
+        usuario, libro = biblioteca.usuarios['U1'], biblioteca.libros['L3']
+        prestamo = bib.Prestamo(usuario, libro, datetime(2026, 1, 1, 10, 0))
+        externo.guardar_prestamo(prestamo)
+        devuelto = bib.Prestamo(biblioteca.usuarios['U2'], biblioteca.libros['L2'], datetime(2025, 12, 1, 10, 0))
+        devuelto.fecha_devolucion = datetime(2025, 12, 3, 10, 0)
+        externo.guardar_prestamo(devuelto)
+
+        resultado = biblioteca.recargar_cambios()
+
+        assert resultado.cambios['prestamos', 'agregados'] == 2
+        assert biblioteca.prestamos_en_curso[prestamo.clave] is biblioteca.prestamos_activos['L3']
+        assert len(biblioteca.historial) == 1 and biblioteca.total_prestamos == 2
+
+        prestamo.fecha_devolucion = datetime(2026, 1, 5, 10, 0)
+        externo.guardar_prestamo(prestamo)
+        resultado = biblioteca.recargar_cambios()
+
+        assert resultado.cambios['prestamos', 'modificados'] == 1
+        assert not biblioteca.prestamos_en_curso and 'L3' not in biblioteca.prestamos_activos
+        assert len(biblioteca.historial) == 2 and libro.disponible
+
+        biblioteca.prestar_libro('U1', 'L1')
+        clave = biblioteca.prestamos_activos['L1'].clave
+        biblioteca.recargar_cambios()
+        os.remove(os.path.join(biblioteca.almacenamiento.carpeta_prestamos, clave + bib.EXTENSION))
+        resultado = biblioteca.recargar_cambios()
+
+        assert resultado.cambios['prestamos', 'eliminados'] == 1
+        assert clave not in biblioteca.prestamos_en_curso and biblioteca.libros['L1'].disponible
+        assert biblioteca.total_prestamos == 2
+    finally:
+        externo.cerrar()
+        biblioteca.cerrar()
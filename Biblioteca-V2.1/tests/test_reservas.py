@@ -0,0 +1,119 @@
+import pytest
+
+ISBN_RAYUELA = '9788437604947'
+
+
+def prestar_ejemplares(biblioteca):
+    biblioteca.prestar_libro('U1', 'L1')
+    biblioteca.prestar_libro('U2', 'L2')
+
+
+def test_reservar_con_ejemplares_libres_se_rechaza(biblioteca, bib):
+    with pytest.raises(bib.ReservaInvalida):
+        biblioteca.reservar('U3', 'L1')
+
+
+def test_devolucion_aparta_el_ejemplar_al_primero_de_la_lista(biblioteca, bib):
+    prestar_ejemplares(biblioteca)
+    primera = biblioteca.reservar('U3', ISBN_RAYUELA)
+    segunda = biblioteca.reservar('U4', 'L2')
+    assert biblioteca.posicion_en_espera(segunda) == 2
+
+    biblioteca.devolver_libro('L1')
+
+    assert primera.estado == bib.ASIGNADA
+    assert primera.libro is biblioteca.libros['L1']
+    assert biblioteca.apartados['L1'] is primera
+    assert biblioteca.titulos[ISBN_RAYUELA].disponibles == 0
+    assert biblioteca.posicion_en_espera(segunda) == 1
+    with pytest.raises(bib.LibroPrestado):
+        biblioteca.prestar_libro('U4', 'L1')
+
+    biblioteca.prestar_libro('U3', 'L1')
+    assert primera.estado == bib.CUMPLIDA
+    assert 'L1' not in biblioteca.apartados
+    assert biblioteca.reservas_de_usuario('U3') == []
+
+
+def test_mayor_prioridad_se_atiende_antes(biblioteca, bib):
+    prestar_ejemplares(biblioteca)
+    normal = biblioteca.reservar('U3', ISBN_RAYUELA)
+    urgente = biblioteca.reservar('U4', ISBN_RAYUELA, prioridad=1)
+
+    biblioteca.devolver_libro('L2')
+
+    assert urgente.estado == bib.ASIGNADA
+    assert normal.estado == bib.EN_ESPERA
+
+
+def test_apartado_vencido_pasa_al_siguiente(biblioteca, bib):
+    prestar_ejemplares(biblioteca)
+    primera = biblioteca.reservar('U3', ISBN_RAYUELA)
+    segunda = biblioteca.reservar('U4', ISBN_RAYUELA)
+    biblioteca.devolver_libro('L1')
+
+    assert biblioteca.procesar_vencimientos(ahora=primera.vence - 1) == []
+    assert biblioteca.procesar_vencimientos(ahora=primera.vence) == [primera]
+
+    assert primera.estado == bib.VENCIDA
+    assert segunda.estado == bib.ASIGNADA
+    assert biblioteca.apartados['L1'] is segunda
+    assert segunda.vence == primera.vence + bib.DIAS_RETENCION_RESERVA * 24 * 3600
+
+
+def test_apartado_vencido_sin_lista_vuelve_a_libres(biblioteca, bib):
+    prestar_ejemplares(biblioteca)
+    reserva = biblioteca.reservar('U3', ISBN_RAYUELA)
+    biblioteca.devolver_libro('L1')
+
+    biblioteca.procesar_vencimientos(ahora=reserva.vence)
+
+    assert reserva.estado == bib.VENCIDA
+    assert 'L1' not in biblioteca.apartados
+    assert biblioteca.titulos[ISBN_RAYUELA].disponibles == 1
+    biblioteca.prestar_libro('U4', 'L1')
+
+
+def test_cancelar_reserva_asignada_pasa_al_siguiente(biblioteca, bib):
+    prestar_ejemplares(biblioteca)
+    primera = biblioteca.reservar('U3', ISBN_RAYUELA)
+    segunda = biblioteca.reservar('U4', ISBN_RAYUELA)
+    biblioteca.devolver_libro('L1')
+
+    biblioteca.cancelar_reserva(primera.clave)
+
+    assert primera.estado == bib.CANCELADA
+    assert biblioteca.apartados['L1'] is segunda
+
+
+def test_reservas_sobreviven_a_la_recarga(biblioteca, bib):
+    prestar_ejemplares(biblioteca)
+    asignada = biblioteca.reservar('U3', ISBN_RAYUELA)
+    en_espera = biblioteca.reservar('U4', ISBN_RAYUELA)
+    biblioteca.devolver_libro('L1')
+    biblioteca.cerrar()
+
+    recargada = bib.Biblioteca(bib.crear_almacenamiento())
+    try:
+        assert recargada.apartados['L1'].clave == asignada.clave
+        assert recargada.apartados['L1'].vence == asignada.vence
+        assert [r.clave for r in recargada.reservas_de_usuario('U4')] == [en_espera.clave]
+    finally:
+        recargada.cerrar()
+
+
+@pytest.mark.parametrize('preparar', [
+    lambda b: b.prestar_libro('U1', 'L1'),
+    lambda b: (prestar_ejemplares(b), b.reservar('U3', ISBN_RAYUELA), b.devolver_libro('L1')),
+], ids=['prestado', 'apartado'])
+def test_no_se_cambia_el_isbn_de_un_ejemplar_comprometido(biblioteca, bib, preparar):
+    preparar(biblioteca)
+    with pytest.raises(bib.LibroPrestado):
+        biblioteca.editar_libro('L1', isbn='978-0-306-40615-7')
+    assert biblioteca.libros['L1'].isbn == '978-84-376-0494-7'
+
+
+def test_cambio_de_isbn_libre_mueve_el_ejemplar_de_titulo(biblioteca):
+    biblioteca.editar_libro('L1', isbn='978-0-306-40615-7')
+    assert biblioteca.titulos[ISBN_RAYUELA].total == 1
+    assert biblioteca.titulos['9780306406157'].total == 1
@@ -0,0 +1,72 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def servidor(biblioteca, bib):
+    servidor = bib.crear_servidor(biblioteca, '127.0.0.1', 0)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def pedir(servidor, metodo, ruta, datos=None):
+    conexion = http.client.HTTPConnection(*servidor.server_address)
+    try:
+        cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else None
+        conexion.request(metodo, ruta, cuerpo, {'Content-Type': 'application/json'})
+        respuesta = conexion.getresponse()
+        return respuesta.status, json.loads(respuesta.read())
+    finally:
+        conexion.close()
+
+
+def test_busquedas_del_catalogo(servidor):
+    estado, libros = pedir(servidor, 'GET', '/libros?titulo=rayuela')
+    assert estado == 200 and [libro['id_libro'] for libro in libros] == ['L1', 'L2']
+    assert pedir(servidor, 'GET', '/libros/L3')[1]['titulo'] == 'Ficciones'
+    assert pedir(servidor, 'GET', '/libros/X9')[0] == 404
+    assert len(pedir(servidor, 'GET', '/usuarios')[1]) == 4
+    assert pedir(servidor, 'GET', '/reservas')[0] == 404
+
+
+def test_prestamo_conflicto_y_devolucion(servidor, biblioteca):
+    estado, prestamo = pedir(servidor, 'POST', '/prestamos', {'id_usuario': 'U1', 'id_libro': 'L1'})
+    assert estado == 201 and prestamo['id_libro'] == 'L1' and prestamo['fecha_devolucion'] is None
+    assert pedir(servidor, 'POST', '/prestamos', {'id_usuario': 'U2', 'id_libro': 'L1'})[0] == 409
+    assert pedir(servidor, 'POST', '/prestamos', {'id_usuario': 'U2'})[0] == 400
+    assert [l['id_libro'] for l in pedir(servidor, 'GET', '/libros?titulo=rayuela&disponibles=1')[1]] == ['L2']
+
+    estado, devuelto = pedir(servidor, 'POST', '/devoluciones', {'id_libro': 'L1', 'estado_devolucion': 'Bien'})
+    assert estado == 200 and devuelto['estado_devolucion'] == 'Bien'
+    assert biblioteca.libros['L1'].disponible
+
+
+def test_muchos_mostradores_no_prestan_dos_veces_el_mismo_libro(servidor, biblioteca):
+    resultados = []
+
+    def mostrador(id_usuario):
+        resultados.append(pedir(servidor, 'POST', '/prestamos', {'id_usuario': id_usuario, 'id_libro': 'L3'})[0])
+
+    hilos = [threading.Thread(target=mostrador, args=(f'U{numero}',)) for numero in range(1, 5)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert sorted(resultados) == [201, 409, 409, 409]
+    assert len(biblioteca.prestamos) == 1
+
+
+def test_el_generador_de_carga_mide_prestamos_y_latencias(servidor, biblioteca, bib):
+    informe = bib.generar_carga(*servidor.server_address, clientes=2, operaciones=10, semilla=1)
+    assert informe['prestamos'] + informe['conflictos'] == 20
+    assert informe['p99_ms'] >= informe['p50_ms'] > 0
+    # Todo lo prestado se devolvió
+    assert biblioteca.prestamos_activos == {}
+    assert len(biblioteca.prestamos) == informe['prestamos']
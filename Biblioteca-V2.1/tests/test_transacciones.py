@@ -0,0 +1,113 @@
+import json
+import os
+
+import pytest
+
+
+def libro(bib, id_libro):
+    return bib.Libro(id_libro, f'Título {id_libro}', 'Autor', 'Editorial', '2000', f'isbn-{id_libro}')
+
+
+def ids_libros(almacenamiento):
+    return sorted(fila[0] for fila in almacenamiento.leer_libros())
+
+
+def temporales(carpeta):
+    return [nombre for _, _, nombres in os.walk(carpeta) for nombre in nombres if nombre.endswith('.tmp')]
+
+
+@pytest.mark.parametrize('motor', ['texto', 'sqlite', 'instantanea'])
+def test_una_transaccion_fallida_no_deja_rastro(carpeta, bib, motor):
+    almacenamiento = bib.crear_almacenamiento(motor)
+    almacenamiento.guardar_libro(libro(bib, 'L1'))
+    with pytest.raises(RuntimeError):
+        with almacenamiento.transaccion():
+            almacenamiento.guardar_libro(libro(bib, 'L2'))
+            almacenamiento.eliminar_libro('L1')
+            raise RuntimeError('caída de la operación')
+    almacenamiento.cerrar()
+
+    reabierto = bib.crear_almacenamiento(motor)
+    try:
+        assert ids_libros(reabierto) == ['L1']
+    finally:
+        reabierto.cerrar()
+    assert temporales(carpeta) == []
+
+
+@pytest.mark.parametrize('motor', ['texto', 'sqlite', 'instantanea'])
+def test_una_transaccion_confirmada_aplica_todo(carpeta, bib, motor):
+    almacenamiento = bib.crear_almacenamiento(motor)
+    almacenamiento.guardar_libro(libro(bib, 'L1'))
+    with almacenamiento.transaccion():
+        almacenamiento.guardar_libro(libro(bib, 'L2'))
+        with almacenamiento.transaccion():
+            almacenamiento.eliminar_libro('L1')
+    almacenamiento.cerrar()
+
+    reabierto = bib.crear_almacenamiento(motor)
+    try:
+        assert ids_libros(reabierto) == ['L2']
+    finally:
+        reabierto.cerrar()
+    assert not os.path.exists(bib.ARCHIVO_TRANSACCION)
+    assert temporales(carpeta) == []
+
+
+def test_una_caida_durante_el_commit_se_rehace_al_abrir(carpeta, bib, monkeypatch):
+    almacenamiento = bib.AlmacenamientoTexto(durabilidad='completa')
+    almacenamiento.guardar_libro(libro(bib, 'L1'))
+
+    # El segundo rename del commit falla: queda el manifiesto con FIN y un temporal
+    renombrar = os.replace
+    llamadas = []
+
+    def caer(origen, destino):
+        llamadas.append(destino)
+        if len(llamadas) == 2:
+            raise OSError('corte de energía')
+        renombrar(origen, destino)
+
+    monkeypatch.setattr(os, 'replace', caer)
+    with pytest.raises(OSError):
+        with almacenamiento.transaccion():
+            almacenamiento.guardar_libro(libro(bib, 'L2'))
+            almacenamiento.guardar_libro(libro(bib, 'L3'))
+            almacenamiento.eliminar_libro('L1')
+    monkeypatch.setattr(os, 'replace', renombrar)
+    assert os.path.exists(bib.ARCHIVO_TRANSACCION)
+    assert ids_libros(almacenamiento) == ['L1', 'L2']
+
+    recuperado = bib.AlmacenamientoTexto()
+    assert ids_libros(recuperado) == ['L2', 'L3']
+    assert not os.path.exists(bib.ARCHIVO_TRANSACCION)
+    assert temporales(carpeta) == []
+
+
+def test_un_manifiesto_incompleto_se_descarta(carpeta, bib):
+    almacenamiento = bib.AlmacenamientoTexto()
+    almacenamiento.guardar_libro(libro(bib, 'L1'))
+    ruta = bib.CARPETA_LIBROS + 'L1' + bib.EXTENSION
+    # Caída mientras se escribía el manifiesto: falta la línea FIN
+    with open(bib.ARCHIVO_TRANSACCION, 'w', encoding='utf-8') as archivo:
+        archivo.write(json.dumps([['eliminar', None, ruta]]) + '\n')
+
+    recuperado = bib.AlmacenamientoTexto()
+    assert ids_libros(recuperado) == ['L1']
+    assert not os.path.exists(bib.ARCHIVO_TRANSACCION)
+
+
+def test_prestar_confirma_prestamo_y_libro_juntos(biblioteca, bib, monkeypatch):
+    guardar_libro = bib.AlmacenamientoTexto.guardar_libro
+
+    def fallar(self, libro):
+        raise OSError('disco lleno')
+
+    monkeypatch.setattr(bib.AlmacenamientoTexto, 'guardar_libro', fallar)
+    with pytest.raises(OSError):
+        biblioteca.prestar_libro('U1', 'L1')
+    monkeypatch.setattr(bib.AlmacenamientoTexto, 'guardar_libro', guardar_libro)
+
+    # Ni el préstamo ni el cambio de disponibilidad llegaron al disco
+    assert list(biblioteca.almacenamiento.leer_prestamos()) == []
+    assert all(fila[6] for fila in biblioteca.almacenamiento.leer_libros())
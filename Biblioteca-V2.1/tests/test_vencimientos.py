@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pytest
+
+from conftest import poblar
+
+
+@pytest.fixture
+def biblioteca(carpeta, bib):
+    """Plazo de 7 días; L1 y L3 prestados a U1 y L2 a U2"""
+    b = poblar(bib.Biblioteca(bib.crear_almacenamiento(), dias_prestamo=7))
+    for id_usuario, id_libro in (('U1', 'L1'), ('U2', 'L2'), ('U1', 'L3')):
+        b.prestar_libro(id_usuario, id_libro)
+    yield b
+    b.cerrar()
+
+
+def ids(prestamos):
+    return sorted(prestamo.libro.id_libro for prestamo in prestamos)
+
+
+def test_dias_de_atraso_cuenta_el_dia_empezado(bib):
+    dia = bib.SEGUNDOS_POR_DIA
+    assert bib.dias_de_atraso(1000, 1000) == 0
+    assert bib.dias_de_atraso(1000, 500) == 0
+    assert bib.dias_de_atraso(1000, 1001) == 1
+    assert bib.dias_de_atraso(1000, 1000 + 2 * dia + 1) == 3
+
+
+def test_vencidos_y_por_vencer(biblioteca):
+    vence = biblioteca.prestamos_activos['L1'].fecha_vencimiento
+    assert vence.date() == (biblioteca.prestamos_activos['L1'].fecha_prestamo + timedelta(days=7)).date()
+    assert biblioteca.prestamos_vencidos() == []
+    assert ids(biblioteca.prestamos_por_vencer(dias=8)) == ['L1', 'L2', 'L3']
+    assert biblioteca.prestamos_por_vencer(dias=3) == []
+    assert ids(biblioteca.prestamos_vencidos(vence + timedelta(minutes=1))) == ['L1', 'L2', 'L3']
+
+    biblioteca.devolver_libro('L2')
+    assert ids(biblioteca.prestamos_vencidos(vence + timedelta(minutes=1))) == ['L1', 'L3']
+
+
+def test_multas_por_prestamo_y_por_usuario(biblioteca, bib):
+    prestamo = biblioteca.prestamos_activos['L1']
+    tres_dias_tarde = prestamo.fecha_vencimiento + timedelta(days=2, hours=1)
+    assert biblioteca.multa(prestamo, tres_dias_tarde) == (3, 3 * bib.MULTA_POR_DIA)
+
+    multas, por_usuario = biblioteca.calcular_multas(tres_dias_tarde)
+    assert len(multas) == 3 and all(atraso == 3 for _, atraso, _ in multas)
+    assert por_usuario == {'U1': 6 * bib.MULTA_POR_DIA, 'U2': 3 * bib.MULTA_POR_DIA}
+
+
+def test_la_multa_de_un_devuelto_se_cuenta_hasta_su_devolucion(biblioteca):
+    prestamo = biblioteca.devolver_libro('L3')
+    assert biblioteca.multa(prestamo) == (0, 0)
+    assert biblioteca.multa(prestamo, prestamo.fecha_vencimiento + timedelta(days=30))[0] == 30
+
+
+@pytest.mark.parametrize('modo', [{}, {'historial_diferido': True}, {'historial_columnar': True}])
+def test_el_indice_de_vencimientos_se_rehace_al_cargar(biblioteca, bib, modo):
+    vence = biblioteca.prestamos_activos['L1'].fecha_vencimiento
+    biblioteca.devolver_libro('L2')
+    biblioteca.cerrar()
+    recargada = bib.Biblioteca(bib.crear_almacenamiento(), dias_prestamo=7, **modo)
+    try:
+        assert ids(recargada.prestamos_vencidos(vence + timedelta(days=1))) == ['L1', 'L3']
+    finally:
+        recargada.cerrar()
+
+
+def test_eliminar_el_historial_vacia_los_vencimientos(biblioteca):
+    vence = biblioteca.prestamos_activos['L1'].fecha_vencimiento
+    biblioteca.eliminar_historial_prestamos()
+    assert biblioteca.prestamos_vencidos(vence + timedelta(days=1)) == []